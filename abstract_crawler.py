@@ -1,18 +1,272 @@
+import base64
+import filecmp
+import hashlib
+import json
+import mimetypes
+import mmap
 import os
 import re
+import shutil
+import struct
+import threading
+import time
+import xml.etree.ElementTree as element_tree
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
 
 import cv2
+import lxml.html
+import numpy
 import requests
 import urllib3
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import storage
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 from abstract_event import AbstractEvent
+from crawl_archive import ARCHIVE_REPLAY, RecordingAdapter, ReplayAdapter, configure_archive, get_archive, \
+    get_archive_settings
+from crawl_metrics import get_metrics, reset_metrics, write_metrics
+from crawl_state import CrawlState, get_event_hash
+from rewrite_engine import RewriteEngine, literal_rule, regex_rule
+from workspace_store import WorkspaceStore, configure_store, get_store, get_store_settings
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Maximum number of parallel requests sent to a single host
+DOWNLOAD_WORKERS_PER_HOST = 4
+
+# Timeouts in seconds for establishing a connection and for reading a response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Number of retries of a failed request and the backoff factor between them
+RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+
+# Number of processes generating images and number of images that may wait for one of them, crawlers running in
+# parallel are configured to share the processors
+IMAGE_WORKERS = os.cpu_count() or 1
+IMAGE_QUEUE_SIZE = 2 * IMAGE_WORKERS
+
+# Number of detail pages downloaded ahead of the one being parsed
+DOWNLOAD_AHEAD = 8
+
+# Maximum number of pages of a listing that are downloaded
+LISTING_MAX_PAGES = 20
+
+# Time in seconds after which cached listing pages, detail pages and images are revalidated
+CACHE_TTL_LISTING = 60 * 60
+CACHE_TTL_DETAIL = 7 * 24 * 60 * 60
+CACHE_TTL_IMAGE = 30 * 24 * 60 * 60
+
+# Number of files uploaded to a bucket in parallel
+UPLOAD_WORKERS = 8
+
+# Suffix of the file next to an uploads directory that lists the MD5 hashes of the files in the bucket
+BUCKET_MANIFEST_SUFFIX = ".manifest.json"
+
+# Directories within the workspace that keep downloaded images and images encoded from them
+IMAGE_SOURCE_DIRECTORY = "images"
+IMAGE_ENCODED_DIRECTORY = os.path.join("images", "encoded")
+
+# Largest image in bytes and in pixels that is decoded, larger JPEG images are decoded at a reduced resolution
+IMAGE_MAX_BYTES = 25 * 1024 * 1024
+IMAGE_MAX_PIXELS = 24 * 1000 * 1000
+
+# Flags decoding a JPEG image at a reduced resolution by factor, which ignore the EXIF orientation like
+# cv2.IMREAD_UNCHANGED does, so that images are oriented the same no matter their size and match their header
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+# Name of the file in the workspace that stores the index of content files
+CONTENT_INDEX_FILE_NAME = "content-index.json"
+
+# Name of the database in the workspace that stores the state of previous runs
+CRAWL_STATE_FILE_NAME = "crawl-state.sqlite"
+
+# Suffix of the files that store the cache validators of a downloaded file
+CACHE_METADATA_SUFFIX = ".cache.json"
+
+# Results of a cached download
+CACHE_HIT = "hit"
+CACHE_REVALIDATED = "revalidated"
+CACHE_MISS = "miss"
+
+# Whether transformed xml is written into the workspace for debugging
+PERSIST_XML = False
+
+# Characters str.splitlines splits lines at
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+# Parsing backends turning downloaded html into a tree of elements
+PARSER_ETREE = "etree"
+PARSER_LXML = "lxml"
+
+# Rules that turn html into well-formed xml, applied in the given order
+WELL_FORM_RULES = [
+    regex_rule(r'<br(.*?)>', ""),
+    regex_rule(r'<img(.*?)/*>', r'<img \1></img>'),
+    literal_rule('&hellip;', ""),
+    regex_rule(r'<input(.*?)>', ""),
+    regex_rule(r'<meta(.*?)>', ""),
+    literal_rule('data-drupal-messages-fallback', ""),
+    literal_rule('xml:lang="EN-US"', ""),
+    literal_rule('&nbsp;–', ""),
+    literal_rule('&copy;', ""),
+    literal_rule('&nbsp;', ""),
+    literal_rule('<hr>', ""),
+    literal_rule('&', ""),
+
+    regex_rule(r'<script(.*?)/script>', "", flags=re.IGNORECASE),
+    regex_rule(r'<iframe(.*?)/iframe>', "", flags=re.IGNORECASE),
+
+    literal_rule('download>', ">"),
+    literal_rule('<?xml version="1.0" encoding="UTF-8"?>', ""),
+    literal_rule('data-lazyload', ""),
+    literal_rule('xlink:', ""),
+    regex_rule(r'itemscope(.*?)>', ">"),
+    literal_rule('<BR>', ""),
+    literal_rule('<STRONG>', ""),
+    literal_rule('</STRONG>', ""),
+    literal_rule('<P>', ""),
+    literal_rule('</P>', ""),
+    literal_rule('SECTION', 'section'),
+    literal_rule('DIV', 'div'),
+    literal_rule("slider__header", "\"slider__header\""),
+    literal_rule("media>", "\"media\">"),
+    literal_rule("slider__body", "\"slider__body\""),
+    literal_rule("class=media__text", ""),
+    literal_rule("id=c57278", ""),
+    literal_rule('<span id="page45R_mcid5" class="markedContent">', '<span id="page45R_mcid5" class="markedContent"/>'),
+    literal_rule("class=infobox", ""),
+]
+
+WELL_FORM_ENGINE = RewriteEngine(WELL_FORM_RULES)
+
+_session = None
+_session_pid = None
+_session_archive = None
+_session_lock = threading.Lock()
+
+_storage_clients = {}
+_storage_clients_lock = threading.Lock()
+
+
+def configure_http(connect_timeout=None, read_timeout=None, retries=None, retry_backoff_factor=None):
+    """
+    Configures timeouts and retries of the shared HTTP session
+    :param connect_timeout: timeout in seconds for establishing a connection
+    :param read_timeout: timeout in seconds for reading a response
+    :param retries: number of retries of a failed request
+    :param retry_backoff_factor: backoff factor between retries
+    :return:
+    """
+    global CONNECT_TIMEOUT, READ_TIMEOUT, RETRIES, RETRY_BACKOFF_FACTOR, _session
+
+    with _session_lock:
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            READ_TIMEOUT = read_timeout
+        if retries is not None:
+            RETRIES = retries
+        if retry_backoff_factor is not None:
+            RETRY_BACKOFF_FACTOR = retry_backoff_factor
+
+        # Make sure the next request builds a session with the new settings
+        _session = None
 
-def download_site(logger, results_path, url, file_name, clean, quiet):
+
+def configure_images(max_bytes=None, max_pixels=None, workers=None):
+    """
+    Configures the budget of images that are decoded and the processes decoding them
+    :param max_bytes: largest image in bytes
+    :param max_pixels: largest image in pixels
+    :param workers: number of processes generating images
+    :return:
+    """
+    global IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS, IMAGE_WORKERS, IMAGE_QUEUE_SIZE
+
+    if max_bytes is not None:
+        IMAGE_MAX_BYTES = max_bytes
+    if max_pixels is not None:
+        IMAGE_MAX_PIXELS = max_pixels
+    if workers is not None:
+        IMAGE_WORKERS = workers
+        IMAGE_QUEUE_SIZE = 2 * workers
+
+
+def configure_debug(persist_xml=None):
+    """
+    Configures debug output
+    :param persist_xml: whether to write transformed xml into the workspace
+    :return:
+    """
+    global PERSIST_XML
+
+    if persist_xml is not None:
+        PERSIST_XML = persist_xml
+
+
+def get_session():
+    """
+    Returns the HTTP session shared by all downloads of the current process
+    :return:
+    """
+    global _session, _session_pid, _session_archive
+
+    archive = get_archive()
+
+    with _session_lock:
+        # Forked processes must not share connections with their parent
+        if _session is None or _session_pid != os.getpid() or _session_archive is not archive:
+            retry = Retry(total=RETRIES, backoff_factor=RETRY_BACKOFF_FACTOR,
+                          status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET", "HEAD"])
+
+            # Responses are recorded into an archive or replayed from it instead of being sent
+            if archive is None:
+                adapter = HTTPAdapter(pool_maxsize=DOWNLOAD_WORKERS_PER_HOST, max_retries=retry)
+            elif archive.mode == ARCHIVE_REPLAY:
+                adapter = ReplayAdapter(archive)
+            else:
+                adapter = RecordingAdapter(archive, pool_maxsize=DOWNLOAD_WORKERS_PER_HOST, max_retries=retry)
+
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = False
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+            _session = session
+            _session_pid = os.getpid()
+            _session_archive = archive
+
+        return _session
+
+
+def http_get(url, headers=None):
+    """
+    Sends a GET request using the shared HTTP session
+    :param url:
+    :param headers: additional request headers
+    :return:
+    """
+    return get_session().get(url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+
+def download_site(logger, results_path, url, file_name, clean, quiet, ttl=CACHE_TTL_DETAIL):
     """
     Download a website into a given file
     :param logger:
@@ -21,6 +275,7 @@ def download_site(logger, results_path, url, file_name, clean, quiet):
     :param file_name:
     :param clean:
     :param quiet:
+    :param ttl: time in seconds after which an existing file is revalidated
     :return:
     """
 
@@ -28,384 +283,1090 @@ def download_site(logger, results_path, url, file_name, clean, quiet):
     file_path = os.path.join(results_path, file_name)
 
     # Check if result needs to be generated
-    if clean or not os.path.exists(file_path):
+    result = download_cached(logger, file_path, url, ttl, clean)
+
+    if result == CACHE_HIT:
+        logger.log_line(f"✓ Already exists {file_path}")
+    elif not quiet and result == CACHE_REVALIDATED:
+        logger.log_line(f"✓ Not modified {file_path}")
+    elif not quiet:
+        logger.log_line(f"✓ Download {file_path}")
+
+
+def download_ahead(logger, results_path, entries, get_site, clean, quiet, workers_per_host=DOWNLOAD_WORKERS_PER_HOST,
+                   ahead=DOWNLOAD_AHEAD, ttl=CACHE_TTL_DETAIL):
+    """
+    Downloads the sites of entries concurrently and yields each entry as soon as its site is downloaded
+
+    Entries are yielded in their given order. Downloads stay a limited number of entries ahead of the caller, so that
+    sites are not downloaded much faster than they are parsed.
+    :param logger:
+    :param results_path:
+    :param entries:
+    :param get_site: function returning the (url, file_name) tuple of an entry
+    :param clean:
+    :param quiet:
+    :param workers_per_host: maximum number of parallel requests per host
+    :param ahead: maximum number of entries whose sites are downloaded before the caller asks for them
+    :param ttl: time in seconds after which an existing file is revalidated
+    :return: entries
+    """
+    entries = list(entries)
+    sites = [get_site(entry) for entry in entries]
+
+    if len(sites) == 0:
+        return
+
+    hosts = {urlparse(url).netloc for url, _ in sites}
+    host_semaphores = {host: threading.BoundedSemaphore(workers_per_host) for host in hosts}
 
-        download_file(
-            logger=logger,
-            file_path=file_path,
-            url=url
-        )
+    def download(url, file_name):
+        with host_semaphores[urlparse(url).netloc]:
+            download_site(logger, results_path, url, file_name, clean, quiet, ttl)
 
-        if not quiet:
-            logger.log_line(f"✓ Download {file_path}")
+    with ThreadPoolExecutor(max_workers=workers_per_host * len(hosts)) as executor:
+        # Sites that are listed more than once are downloaded once
+        futures = {}
+
+        def submit(index):
+            url, file_name = sites[index]
+            if file_name not in futures:
+                futures[file_name] = executor.submit(download, url, file_name)
+
+        for index in range(min(ahead, len(sites))):
+            submit(index)
+
+        for index, entry in enumerate(entries):
+            if index + ahead < len(sites):
+                submit(index + ahead)
+
+            futures[sites[index][1]].result()
+            yield entry
+
+
+def download_cached(logger, file_path, url, ttl, clean=False):
+    """
+    Downloads value of a given URL into a file unless a cached copy is still valid
+    :param logger:
+    :param file_path:
+    :param url:
+    :param ttl: time in seconds after which an existing file is revalidated
+    :param clean: whether to ignore any cached copy
+    :return: CACHE_HIT, CACHE_REVALIDATED or CACHE_MISS
+    """
+    # Recording and replaying need every response to pass through the archive
+    clean = clean or get_archive() is not None
+
+    if not clean:
+        restore_file(file_path)
+
+    if not clean and is_cache_fresh(file_path, url, ttl):
+        result = CACHE_HIT
     else:
-        logger.log_line(f"✓ Already exists {file_path}")
+        data = download_file(logger, file_path, url, revalidate=not clean)
+        result = CACHE_REVALIDATED if data is not None and data.status_code == 304 else CACHE_MISS
 
+    get_metrics().count("cache_results", host=urlparse(url).netloc, result=result)
+    return result
 
-def download_file(logger, file_path, url):
+
+def download_file(logger, file_path, url, revalidate=False):
     """
     Downloads value of a given URL into a file
     :param logger:
     :param file_path:
     :param url:
-    :return:
+    :param revalidate: whether to send a conditional request based on the validators of an existing file
+    :return: response
     """
+    metrics = get_metrics()
+    host = urlparse(url).netloc
+
     try:
-        data = requests.get(url, verify=False)
-        with open(file_path, 'wb') as file:
-            file.write(data.content)
+        with metrics.stage("download", host=host):
+            metadata = read_cache_metadata(file_path, url) if revalidate and os.path.exists(file_path) else None
+
+            headers = {}
+            if metadata is not None and metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata is not None and metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+            data = http_get(url, headers=headers)
+
+            # Error pages never replace a page downloaded before
+            if data.status_code not in (200, 304) and os.path.exists(file_path):
+                logger.log_line(f"✗️ HTTP {data.status_code}, keeping {file_path}")
+            else:
+                if data.status_code != 304:
+                    write_file_atomic(file_path, data.content)
+
+                write_cache_metadata(file_path, url, data, metadata)
+
+        metrics.count("downloaded_bytes", len(data.content), host=host)
+        return data
     except Exception as e:
         logger.log_line(f"✗️ Exception: {str(e)}")
         return None
 
 
-def well_form(value):
+def write_file_atomic(file_path, value):
     """
-    Well-form html value
-    :param value: value
+    Writes bytes into a file so that readers in other processes never see a partially written file
+    :param file_path:
+    :param value:
     :return:
     """
+    temporary_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
 
-    value = re.sub(r'<br(.*?)>', "", value)
-    value = re.sub(r'<img(.*?)/*>', r'<img \1></img>', value)
-    value = re.sub(r'&hellip;', "", value)
-    value = re.sub(r'<input(.*?)>', "", value)
-    value = re.sub(r'<meta(.*?)>', "", value)
-    value = re.sub(r'data-drupal-messages-fallback', "", value)
-    value = re.sub(r'xml:lang="EN-US"', "", value)
-    value = re.sub(r'&nbsp;–', "", value)
-    value = re.sub(r'&copy;', "", value)
-    value = re.sub(r'&nbsp;', "", value)
-    value = re.sub(r'<hr>', "", value)
-    value = re.sub(r'&', "", value)
-
-    value = re.sub(r'<script(.*?)/script>', "", value, flags=re.IGNORECASE)
-    value = re.sub(r'<iframe(.*?)/iframe>', "", value, flags=re.IGNORECASE)
-
-    value = re.sub(r'download>', ">", value)
-    value = re.sub(r'<\?xml version="1.0" encoding="UTF-8"\?>', "", value)
-    value = re.sub(r'data-lazyload', "", value)
-    value = re.sub(r'xlink:', "", value)
-    value = re.sub(r'itemscope(.*?)>', ">", value)
-    value = re.sub(r'<BR>', "", value)
-    value = re.sub(r'<STRONG>', "", value)
-    value = re.sub(r'</STRONG>', "", value)
-    value = re.sub(r'<P>', "", value)
-    value = re.sub(r'</P>', "", value)
-    value = re.sub('SECTION', 'section', value)
-    value = re.sub('DIV', 'div', value)
-    value = value.replace("slider__header", "\"slider__header\"")
-    value = value.replace("media>", "\"media\">")
-    value = value.replace("slider__body", "\"slider__body\"")
-    value = value.replace("class=media__text", "")
-    value = value.replace("id=c57278", "")
-    value = re.sub(r'\<span id\=\"page45R_mcid5\" class\=\"markedContent\"\>',
-                   "<span id=\"page45R_mcid5\" class=\"markedContent\"/>", value)
-    value = value.replace("class=infobox", "")
-
-    return value
+    with open(temporary_file_path, 'wb') as file:
+        file.write(value)
 
+    os.replace(temporary_file_path, file_path)
 
-def format_title(title):
-    return title.strip().replace("quot;", "\"")
 
+def read_cache_metadata(file_path, url):
+    """
+    Reads the cache metadata stored next to a downloaded file
+    :param file_path:
+    :param url:
+    :return: metadata or None if there is none for the given URL
+    """
+    try:
+        with open(file_path + CACHE_METADATA_SUFFIX, 'r') as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    return metadata if metadata.get("url") == url else None
 
-def format_identifier(identifier):
-    identifier = identifier.lower() \
-        .replace(' // ', ' ') \
-        .replace(".", "").replace("!", "").replace("&", "").replace(":", "") \
-        .replace("\"", "").replace("„", "").replace("“", "").replace("\"", "") \
-        .replace(" ", "-").replace("--", "-").replace("--", "-") \
-        .replace("-–-", "-").replace("---", "-") \
-        .replace("save-date-", "").replace("save-the-date-", "")
-    return re.sub(r'\?chash=.*', "", identifier)
 
+def write_cache_metadata(file_path, url, data, metadata=None):
+    """
+    Stores the validators of a response next to the downloaded file
+    :param file_path:
+    :param url:
+    :param data: response
+    :param metadata: previous metadata of the file
+    :return:
+    """
+    metadata = dict(metadata) if metadata is not None and data.status_code == 304 else {}
+    metadata["url"] = url
 
-def format_date(date):
-    date_parts = date.split(" ")
+    # Error pages are kept for the crawler to look at but are fetched again next time
+    metadata["fetched_at"] = time.time() if data.status_code in (200, 304) else 0.0
 
-    year = date_parts[3]
-    month = format_month(date_parts[2])
-    day = format_day(date_parts[1].replace(".", ""))
+    if data.headers.get("ETag"):
+        metadata["etag"] = data.headers["ETag"]
+    if data.headers.get("Last-Modified"):
+        metadata["last_modified"] = data.headers["Last-Modified"]
 
-    return f"{year}-{month}-{day}"
+    # Only successful responses may be revalidated later on
+    if data.status_code not in (200, 304):
+        metadata.pop("etag", None)
+        metadata.pop("last_modified", None)
 
+    write_file_atomic(file_path + CACHE_METADATA_SUFFIX, json.dumps(metadata).encode())
 
-def format_date_split(year, month, day):
-    return f"{year}-{format_month(month)}-{day}"
 
+def restore_file(file_path):
+    """
+    Restores a downloaded file that has been packed into the store of the workspace, so its cache can be checked
+    :param file_path:
+    :return: whether the file exists
+    """
+    store = get_store()
 
-def format_date_time(date, time):
-    date_parts = date.split(" ")
-    time_parts = time.split(".")
+    if store is not None and not os.path.exists(file_path):
+        return store.restore(file_path)
 
-    year = date_parts[3]
-    month = format_month(date_parts[2])
-    day = format_day(date_parts[1].replace(".", ""))
-    hours = time_parts[0]
-    minutes = time_parts[1]
+    return os.path.exists(file_path)
 
-    return f"{year}-{month}-{day}T{hours}:{minutes}:00.000"
 
+def pack_workspace(store, workspace_path, crawler):
+    """
+    Moves downloaded pages and images of a workspace into its store
+
+    Only files with cache metadata are downloads. Other files like pages rendered by a browser or xml written for
+    debugging stay where they are.
+    :param store:
+    :param workspace_path:
+    :param crawler: name of the crawler the files are stored for
+    :return: number of files and their size in bytes
+    """
+    files = 0
+    size = 0
 
-def format_date_times(date_time):
-    date_time = re.sub(' +', ' ', date_time)
-    date_time_parts = date_time.strip().split(" ")
-    time_parts = date_time_parts[4].split(".")
+    for directory_path in (workspace_path, os.path.join(workspace_path, IMAGE_SOURCE_DIRECTORY)):
+        if not os.path.isdir(directory_path):
+            continue
 
-    year = date_time_parts[3].replace(",", "")
-    month = format_month(date_time_parts[2])
-    day = format_day(date_time_parts[1].replace(".", ""))
-    hours = time_parts[0]
-    minutes = time_parts[1]
+        for entry in os.scandir(directory_path):
+            if not entry.is_file() or entry.name.endswith((CACHE_METADATA_SUFFIX, ".tmp")):
+                continue
 
-    return f"{year}-{month}-{day}T{hours}:{minutes}:00.000"
+            try:
+                with open(entry.path + CACHE_METADATA_SUFFIX, 'r') as file:
+                    url = json.load(file).get("url")
+            except (OSError, ValueError):
+                continue
 
+            with open(entry.path, 'rb') as file:
+                content = file.read()
 
-def format_date_time_start(year, month, day, time, delimiter=":"):
-    time_parts = time.replace("Uhr", "").split("-")
+            store.put(os.path.relpath(entry.path, workspace_path), crawler, url, content)
+            os.remove(entry.path)
+            files += 1
+            size += len(content)
 
-    start_time = time_parts[0].strip()
-    start_time_parts = start_time.split(delimiter)
-    hours = start_time_parts[0].strip()
-    minutes = start_time_parts[1].strip()
+    return files, size
 
-    return f"{year}-{format_month(month)}-{day}T{hours}:{minutes}:00.000"
 
+def is_cache_fresh(file_path, url, ttl):
+    """
+    Checks if a downloaded file is younger than a given time to live
+    :param file_path:
+    :param url: URL the file has been downloaded from, or None to skip the check
+    :param ttl: time in seconds
+    :return:
+    """
+    if not os.path.exists(file_path):
+        return False
 
-def format_date_time_end(year, month, day, time, delimiter=":"):
-    time_parts = time.replace("Uhr", "").split("-")
+    metadata = read_cache_metadata(file_path, url) if url is not None else None
 
-    if len(time_parts) == 2:
-        # There is an actual end time
-        end_time = time_parts[1].strip()
+    if metadata is not None:
+        fetched_at = metadata["fetched_at"]
+    elif url is not None and os.path.exists(file_path + CACHE_METADATA_SUFFIX):
+        # File has been downloaded from a different URL
+        return False
     else:
-        # As a fallback use start time
-        end_time = time_parts[0].strip()
-
-    end_time_parts = end_time.split(delimiter)
-    hours = end_time_parts[0].strip()
-    minutes = end_time_parts[1].strip()
-
-    return f"{year}-{format_month(month)}-{day}T{hours}:{minutes}:00.000"
-
-
-def format_month(month):
-    if month == "Januar" or month == "Jan" or month == "01":
-        return "01"
-    if month == "Februar" or month == "Feb" or month == "02":
-        return "02"
-    if month == "März" or month == "Mär" or month == "03":
-        return "03"
-    if month == "April" or month == "Apr" or month == "04":
-        return "04"
-    if month == "Mai" or month == "Mai" or month == "05":
-        return "05"
-    if month == "Juni" or month == "Jun" or month == "06":
-        return "06"
-    if month == "Juli" or month == "Jul" or month == "07":
-        return "07"
-    if month == "August" or month == "Aug" or month == "08":
-        return "08"
-    if month == "September" or month == "Sep" or month == "09":
-        return "09"
-    if month == "Oktober" or month == "Okt" or month == "10":
-        return "10"
-    if month == "November" or month == "Nov" or month == "11":
-        return "11"
-    if month == "Dezember" or month == "Dez" or month == "12":
-        return "12"
-
-
-def format_day(day: str):
-    if int(day) < 10:
-        return f"0{int(day)}"
-    else:
-        return f"{int(day)}"
+        # Files without metadata have been downloaded before the cache existed
+        fetched_at = os.path.getmtime(file_path)
 
+    return time.time() - fetched_at < ttl
 
-def generate_content(logger, content_path, event: AbstractEvent):
-    file_name = f"{event.identifier}.md"
-    file_path = os.path.join(content_path, file_name)
 
-    updated = False
+def find_next_link(file_path, url):
+    """
+    Finds the link to the next page of a listing
+    :param file_path: downloaded page
+    :param url: URL of the page, which relative links are resolved against
+    :return: URL of the next page or None if it is the last page
+    """
+    try:
+        links = lxml.html.parse(file_path).xpath('//a[@rel="next"]/@href | //link[@rel="next"]/@href')
+    except (OSError, ValueError):
+        return None
+
+    return urljoin(url, links[0].strip()) if links and links[0].strip() else None
 
-    values = {}
-    values_contact = {}
-    values_location = {}
 
-    languages = []
+def read_section(file_path, start_marker=None, end_marker=None, keep_end=True):
+    """
+    Reads the section of a file between two markers and joins its lines with spaces, which gives the same result as
+    joining all lines and cutting the section with re.sub(r'.*<start>', ...) and re.sub(r'<end>.*', ...)
+    :param file_path:
+    :param start_marker: marker whose last occurrence starts the section
+    :param end_marker: marker whose first occurrence after the start ends the section
+    :param keep_end: whether the end marker is part of the section
+    :return:
+    """
+    with get_metrics().stage("transform"), open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return ""
 
-    if os.path.exists(file_path):
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = max(data.rfind(start_marker.encode()), 0) if start_marker is not None else 0
+            end = data.find(end_marker.encode(), start) if end_marker is not None else -1
 
-        # Read existing file
-        with open(file_path, 'r') as file:
-            for line in file.readlines():
-                if "=" in line:
-                    key = line.split("=")[0].strip().replace("\"", "").replace("'", "")
-                    value = "=".join(line.split("=")[1:]).strip().replace("\"", "").replace("'", "").replace("amp;",
-                                                                                                             "&")
-                    value = str(value)
-
-                    if key == "contact_person" or key == "contact_phone" or key == "contact_mail":
-                        values_contact[key] = value
-                    elif key == "location_street" or key == "location_city":
-                        values_location[key] = value
-                    elif key == "languages":
-                        languages_list = value
-                        languages_list = re.sub(r'^\'', "", languages_list)
-                        languages_list = re.sub(r'\'$', "", languages_list)
-                        languages_list = re.sub(r'\[', "", languages_list)
-                        languages_list = re.sub(r']', "", languages_list)
-                        if len(languages_list) > 0:
-                            languages = languages_list.split(",")
-                        pass
-                    else:
-                        values[key] = value
+            if end == -1:
+                section = data[start:].decode()
+            elif keep_end:
+                section = data[start:end + len(end_marker.encode())].decode()
+            else:
+                section = data[start:end].decode()
+
+    content = " ".join(section.splitlines())
+
+    # A line break right before the end marker is followed by more content, so it is joined into a space
+    if end != -1 and not keep_end and section and section[-1] in LINE_BREAKS:
+        content += " "
+
+    return content
+
+
+def parse_xml(workspace_path, content, xml_file_name=None):
+    """
+    Parses well-formed xml content, which is written into the workspace as well if persisting xml is enabled
+    :param workspace_path:
+    :param content: well-formed xml content
+    :param xml_file_name: name of the xml file to write if persisting xml is enabled
+    :return: root element
+    """
+    if PERSIST_XML and xml_file_name is not None:
+        with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
+            xml_file.write(content)
+
+    with get_metrics().stage("parse"):
+        return element_tree.fromstring(content)
+
+
+def parse_content(workspace_path, content, rewrite, xml_file_name=None, parser=PARSER_ETREE):
+    """
+    Parses html content with a given parsing backend
+    :param workspace_path:
+    :param content: html content
+    :param rewrite: function turning the content into well-formed xml, which the lxml backend does not need
+    :param xml_file_name: name of the xml file to write if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
+    """
+    if parser == PARSER_LXML:
+        # The html parser of lxml copes with malformed html itself
+        with get_metrics().stage("parse"):
+            return lxml.html.fromstring(content)
+
+    with get_metrics().stage("transform"):
+        content = rewrite(content)
+
+    return parse_xml(workspace_path, content, xml_file_name)
+
+
+def well_form(value):
+    """
+    Well-form html value
+    :param value: value
+    :return:
+    """
+    return WELL_FORM_ENGINE.rewrite(value)
+
+
+def format_title(title):
+    return title.strip().replace("quot;", "\"")
+
+
+def format_identifier(identifier):
+    identifier = identifier.lower() \
+        .replace(' // ', ' ') \
+        .replace(".", "").replace("!", "").replace("&", "").replace(":", "") \
+        .replace("\"", "").replace("„", "").replace("“", "").replace("\"", "") \
+        .replace(" ", "-").replace("--", "-").replace("--", "-") \
+        .replace("-–-", "-").replace("---", "-") \
+        .replace("save-date-", "").replace("save-the-date-", "")
+    return re.sub(r'\?chash=.*', "", identifier)
+
+
+def generate_content(logger, content_path, event: AbstractEvent, content_index=None):
+    """
+    Generates the content file of an event unless nothing but the update time would change
+    :param logger:
+    :param content_path:
+    :param event:
+    :param content_index: index of existing content files, which are read one by one if None
+    :return: whether the file has been written
+    """
+    file_name = f"{event.identifier}.md"
+    file_path = os.path.join(content_path, file_name)
+
+    if content_index is not None:
+        entry = content_index.get(event.identifier)
+    else:
+        entry = read_content_file(file_path) if os.path.exists(file_path) else None
+
+    values = dict(entry["values"]) if entry is not None else {}
+    values_contact = dict(entry["contact"]) if entry is not None else {}
+    values_location = dict(entry["location"]) if entry is not None else {}
+
+    languages = list(entry["languages"]) if entry is not None else []
 
     # Update values
     if needs_update("identifier", event.identifier, values):
         values["identifier"] = event.identifier
-        updated = True
     if needs_update("source", event.source, values):
         values["source"] = event.source
-        updated = True
     if needs_update("url", event.url, values):
         values["url"] = event.url
-        updated = True
     if needs_update("type", event.type, values):
         values["type"] = event.type
-        updated = True
     if needs_update("title", event.title, values):
         values["title"] = event.title
-        updated = True
     if needs_update("subtitle", event.subtitle, values):
         values["subtitle"] = event.subtitle
-        updated = True
     if needs_update("description", event.description, values):
         values["description"] = event.description
-        updated = True
     if needs_update("image", event.image, values):
         values["image"] = event.image
-        updated = True
     if needs_update("image_bucket", event.image_bucket, values):
         values["image_bucket"] = event.image_bucket
-        updated = True
     if needs_update("start_date", event.start_date, values):
         values["start_date"] = event.start_date
-        updated = True
     if needs_update("end_date", event.end_date, values):
         values["end_date"] = event.end_date
-        updated = True
     if needs_update("category", event.category, values):
         values["category"] = event.category
-        updated = True
     if needs_update("organizer", event.organizer, values):
         values["organizer"] = event.organizer
-        updated = True
     if needs_update("fees", event.fees, values):
         values["fees"] = event.fees
-        updated = True
 
     if len(event.languages) > 0:
         for language in event.languages:
             languages.append(language)
             languages = list(dict.fromkeys(languages))
 
-    if needs_update("contact_person", event.contact_person, values):
+    if needs_update("contact_person", event.contact_person, values_contact):
         values_contact["contact_person"] = event.contact_person
-        updated = True
-    if needs_update("contact_phone", event.contact_phone, values):
+    if needs_update("contact_phone", event.contact_phone, values_contact):
         values_contact["contact_phone"] = event.contact_phone
-        updated = True
-    if needs_update("contact_mail", event.contact_mail, values):
+    if needs_update("contact_mail", event.contact_mail, values_contact):
         values_contact["contact_mail"] = event.contact_mail
-        updated = True
 
-    if needs_update("location_street", event.location_street, values):
-        values_contact["location_street"] = event.location_street
-        updated = True
-    if needs_update("location_city", event.location_city, values):
-        values_contact["location_city"] = event.location_city
-        updated = True
+    if needs_update("location_street", event.location_street, values_location):
+        values_location["location_street"] = event.location_street
+    if needs_update("location_city", event.location_city, values_location):
+        values_location["location_city"] = event.location_city
+
+    # Keep the update time of the existing file if nothing else changed
+    content = render_content(values, languages, values_contact, values_location)
 
-    if len(event.updated) > 0 and updated:
+    if entry is not None and get_text_hash(content) == entry["hash"]:
+        return False
+
+    if len(event.updated) > 0:
         values["updated"] = event.updated
+        content = render_content(values, languages, values_contact, values_location)
+
+    write_file_atomic(file_path, content.encode())
+    logger.log_line(f"✓ Generate {file_name}")
+
+    if content_index is not None:
+        content_index.put(event.identifier, file_path, content)
+
+    return True
 
-    # Assemble content
-    content = "+++"
-    for key, value in values.items():
-        content += f"\n{key} = \"{value}\""
 
-    content += f"\nlanguages = ["
-    for language in languages:
-        if len(language) > 0:
-            content += f"\"{language.replace('_', ' ')}\","
-    content += "]"
+def render_content(values, languages, values_contact, values_location):
+    """
+    Renders the front matter of a content file
+    :param values:
+    :param languages:
+    :param values_contact:
+    :param values_location:
+    :return:
+    """
+    languages = dict.fromkeys(language.replace('_', ' ') for language in languages if len(language) > 0)
+
+    lines = ["+++"]
+    lines += [f"{key} = {format_toml_string(value)}" for key, value in values.items()]
+    lines.append("languages = [" + "".join(f"{format_toml_string(language)}," for language in languages) + "]")
 
-    content += "\n[contact]"
-    for key, value in values_contact.items():
-        content += f"\n{key} = \"{value}\""
+    lines.append("[contact]")
+    lines += [f"{key} = {format_toml_string(value)}" for key, value in values_contact.items()]
 
-    content += "\n[location]"
-    for key, value in values_location.items():
-        content += f"\n{key} = \"{value}\""
+    lines.append("[location]")
+    lines += [f"{key} = {format_toml_string(value)}" for key, value in values_location.items()]
 
-    content += "\n+++"
+    lines.append("+++")
 
     # Clean up
-    content = content.replace(",]", "]").replace("amp;", "&")
+    return "\n".join(lines).replace(",]", "]").replace("amp;", "&")
+
+
+def format_toml_string(value):
+    """
+    Formats a value as a TOML string, escaping quotes, backslashes and line breaks
+    :param value:
+    :return:
+    """
+    # JSON escapes are a subset of the escapes of TOML basic strings
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def read_content_file(file_path):
+    """
+    Reads the front matter of a content file
+    :param file_path:
+    :return: entry with values, languages, contact and location values and the hash of the file
+    """
+    with open(file_path, 'r') as file:
+        content = file.read()
+
+    entry = parse_front_matter(content)
+    entry["hash"] = get_text_hash(content)
+    return entry
+
+
+def parse_front_matter(content):
+    """
+    Parses the TOML front matter of a content file, falling back to reading it line by line if it is not valid TOML
+    :param content:
+    :return: entry with values, languages, contact and location values
+    """
+    try:
+        front_matter = tomllib.loads(content.strip().strip("+").strip())
+
+        return {
+            "values": {key: str(value) for key, value in front_matter.items()
+                       if key not in ("languages", "contact", "location")},
+            "languages": [str(language) for language in front_matter.get("languages", [])],
+            "contact": {key: str(value) for key, value in front_matter.get("contact", {}).items()},
+            "location": {key: str(value) for key, value in front_matter.get("location", {}).items()},
+        }
+    except (tomllib.TOMLDecodeError, AttributeError, TypeError):
+        pass
+
+    # Files written before values were escaped are not always valid TOML
+    entry = {"values": {}, "languages": [], "contact": {}, "location": {}}
+
+    for line in content.splitlines():
+        if "=" in line:
+            key = line.split("=")[0].strip().replace("\"", "").replace("'", "")
+            value = "=".join(line.split("=")[1:]).strip().replace("\"", "").replace("'", "").replace("amp;", "&")
+            value = str(value)
+
+            if key == "contact_person" or key == "contact_phone" or key == "contact_mail":
+                entry["contact"][key] = value
+            elif key == "location_street" or key == "location_city":
+                entry["location"][key] = value
+            elif key == "languages":
+                languages_list = value
+                languages_list = re.sub(r'^\'', "", languages_list)
+                languages_list = re.sub(r'\'$', "", languages_list)
+                languages_list = re.sub(r'\[', "", languages_list)
+                languages_list = re.sub(r']', "", languages_list)
+                if len(languages_list) > 0:
+                    entry["languages"] = languages_list.split(",")
+            else:
+                entry["values"][key] = value
+
+    return entry
+
+
+def get_text_hash(value):
+    """
+    Returns the hash of a text
+    :param value:
+    :return:
+    """
+    return hashlib.sha1(value.encode()).hexdigest()
+
 
-    with open(file_path, 'w') as file:
-        logger.log_line(f"✓ Generate {file_name}")
-        file.write(content)
+class ContentIndex:
+    """
+    Keeps the front matter of all content files in memory so that they are read once per run rather than per event
+
+    The index can be stored in a file. When it is loaded again only files whose size or modification time changed in
+    the meantime are read.
+    """
+
+    def __init__(self, content_path, index_file_path=None):
+        self.content_path = content_path
+        self.index_file_path = index_file_path
+        self.entries = {}
+        self.changed = False
+
+    def load(self):
+        """
+        Scans the content path, reusing entries of the stored index for unchanged files
+        :return: number of files read
+        """
+        stored_entries = {}
+
+        if self.index_file_path is not None:
+            try:
+                with open(self.index_file_path, 'r') as file:
+                    stored_entries = json.load(file)
+            except (OSError, ValueError):
+                stored_entries = {}
+
+        files = 0
+        self.entries = {}
+
+        if not os.path.isdir(self.content_path):
+            return files
+
+        with os.scandir(self.content_path) as directory_entries:
+            for directory_entry in directory_entries:
+                if not directory_entry.name.endswith(".md") or not directory_entry.is_file():
+                    continue
+
+                identifier = directory_entry.name[:-len(".md")]
+                stat = directory_entry.stat()
+                entry = stored_entries.get(identifier)
+
+                if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                    entry = read_content_file(directory_entry.path)
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    entry["size"] = stat.st_size
+                    files += 1
+
+                self.entries[identifier] = entry
+
+        self.changed = files > 0 or len(self.entries) != len(stored_entries)
+        return files
+
+    def get(self, identifier):
+        """
+        Returns the entry of a content file
+        :param identifier:
+        :return: entry or None if there is no such file
+        """
+        return self.entries.get(identifier)
+
+    def put(self, identifier, file_path, content):
+        """
+        Updates the entry of a content file that has just been written
+        :param identifier:
+        :param file_path:
+        :param content:
+        :return:
+        """
+        stat = os.stat(file_path)
+
+        entry = parse_front_matter(content)
+        entry["hash"] = get_text_hash(content)
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+
+        self.entries[identifier] = entry
+        self.changed = True
+
+    def save(self):
+        """
+        Stores the index if it changed
+        :return:
+        """
+        if self.index_file_path is not None and self.changed:
+            write_file_atomic(self.index_file_path, json.dumps(self.entries, ensure_ascii=False).encode())
+            self.changed = False
 
 
 def generate_image(logger, workspace_path, upload_path, event: AbstractEvent, target_width=480):
+    """
+    Generates the image of an event unless it is up to date
+
+    Downloaded images are cached by URL and encoded images by the hash of the downloaded bytes and the target width, so
+    an image is only encoded once no matter how many events share it.
+    :param logger:
+    :param workspace_path:
+    :param upload_path:
+    :param event:
+    :param target_width:
+    :return: whether the image of the event exists
+    """
     if event.image != "":
         # Download original image
-        original_file_name = event.image
-        original_file_name = re.sub(r'\?.*', '', original_file_name)
-        original_file_name = re.sub(r'.*/', '', original_file_name)
-        original_file_path = os.path.join(workspace_path, "images", original_file_name)
-        os.makedirs(os.path.join(os.path.join(workspace_path, "images")), exist_ok=True)
-        download_file(logger, original_file_path, event.image)
-
-        # Resize image
-        original_img = cv2.imread(original_file_path, cv2.IMREAD_UNCHANGED)
-        original_width = int(original_img.shape[1])
-        original_height = int(original_img.shape[0])
-        ratio = original_height / original_width
+        original_file_path = get_image_source_path(workspace_path, event.image)
+        os.makedirs(os.path.join(workspace_path, IMAGE_SOURCE_DIRECTORY), exist_ok=True)
+        download_cached(logger, original_file_path, event.image, CACHE_TTL_IMAGE)
+
+        # Encode image unless an image with the same content has been encoded before
+        content_hash = get_content_hash(original_file_path, event.image)
+        encoded_file_path = os.path.join(workspace_path, IMAGE_ENCODED_DIRECTORY, f"{content_hash}-{target_width}.webp")
+
+        if not os.path.exists(encoded_file_path):
+            os.makedirs(os.path.join(workspace_path, IMAGE_ENCODED_DIRECTORY), exist_ok=True)
+
+            # Resize image
+            target_img = decode_image(original_file_path, target_width)
+
+            if target_img is None:
+                logger.log_line(f"✗️ Cannot decode {event.image}")
+                return False
+
+            success, encoded_img = cv2.imencode(".webp", target_img)
+
+            if not success:
+                return False
+
+            write_file_atomic(encoded_file_path, encoded_img.tobytes())
 
         target_file_name = f"{event.identifier}.webp"
         target_file_path = os.path.join(upload_path, target_file_name)
-        target_img = cv2.resize(original_img, (target_width, int(target_width * ratio)))
-        cv2.imwrite(target_file_path, target_img)
+        link_file(encoded_file_path, target_file_path)
+        return True
+
+    return False
+
+
+def decode_image(file_path, target_width):
+    """
+    Decodes an image and scales it to a given width, decoding large JPEG images at a reduced resolution
+    :param file_path:
+    :param target_width:
+    :return: image or None if it cannot be decoded or exceeds the budget
+    """
+    if os.path.getsize(file_path) > IMAGE_MAX_BYTES:
+        return None
+
+    with open(file_path, 'rb') as file:
+        value = file.read()
+
+    size = get_image_size(value)
+    flags = cv2.IMREAD_UNCHANGED
+
+    if size is not None:
+        image_format, width, height = size
+        factor = 1
+
+        # Choose the largest factor that keeps the image at least as wide as the target
+        while factor < 8 and width // (factor * 2) >= target_width:
+            factor *= 2
+
+        # Make the image fit into the budget even if it ends up narrower than the target
+        while factor < 8 and (width // factor) * (height // factor) > IMAGE_MAX_PIXELS:
+            factor *= 2
+
+        if (width // factor) * (height // factor) > IMAGE_MAX_PIXELS or factor > 1 and image_format != "jpeg":
+            # Only JPEG images can be decoded at a reduced resolution
+            if width * height > IMAGE_MAX_PIXELS:
+                return None
+        elif factor > 1:
+            flags = REDUCED_DECODE_FLAGS[factor]
+
+    original_img = cv2.imdecode(numpy.frombuffer(value, numpy.uint8), flags)
+
+    if original_img is None:
+        return None
+
+    original_width = int(original_img.shape[1])
+    original_height = int(original_img.shape[0])
+
+    # Reduced images are rounded down, so the ratio is taken from the header where possible
+    ratio = size[2] / size[1] if size is not None and size[1] > 0 else original_height / original_width
+
+    # Area interpolation avoids moiré when shrinking, other interpolations look better when enlarging
+    interpolation = cv2.INTER_AREA if original_width > target_width else cv2.INTER_LINEAR
+    return cv2.resize(original_img, (target_width, max(int(target_width * ratio), 1)), interpolation=interpolation)
+
+
+def get_image_size(value):
+    """
+    Reads format, width and height from the header of a JPEG, PNG, GIF or WebP image without decoding it
+    :param value: bytes of the image
+    :return: format, width and height, or None if the header cannot be read
+    """
+    try:
+        if value.startswith(b"\x89PNG\r\n\x1a\n"):
+            width, height = struct.unpack(">II", value[16:24])
+            return "png", width, height
+        if value[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", value[6:10])
+            return "gif", width, height
+        if value[:4] == b"RIFF" and value[8:12] == b"WEBP":
+            chunk = value[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", value[26:30])
+                return "webp", width & 0x3fff, height & 0x3fff
+            if chunk == b"VP8L":
+                bits = int.from_bytes(value[21:25], "little")
+                return "webp", (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b"VP8X":
+                return "webp", int.from_bytes(value[24:27], "little") + 1, int.from_bytes(value[27:30], "little") + 1
+        if value[:2] == b"\xff\xd8":
+            offset = 2
+
+            # Walk the segments until a start of frame
+            while offset + 9 <= len(value):
+                if value[offset] != 0xff:
+                    return None
+
+                marker = value[offset + 1]
+
+                if marker == 0xff:
+                    offset += 1
+                    continue
+
+                length = struct.unpack(">H", value[offset + 2:offset + 4])[0]
+
+                if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                    height, width = struct.unpack(">HH", value[offset + 5:offset + 9])
+                    return "jpeg", width, height
+
+                offset += 2 + length
+    except struct.error:
+        return None
+
+    return None
+
+
+def get_image_source_path(workspace_path, url):
+    """
+    Returns the path a downloaded image is cached at
+    :param workspace_path:
+    :param url:
+    :return:
+    """
+    # Images are named after their URL since different images often share a file name
+    extension = os.path.splitext(urlparse(url).path)[1]
+    return os.path.join(workspace_path, IMAGE_SOURCE_DIRECTORY, hashlib.sha1(url.encode()).hexdigest() + extension)
+
+
+def get_content_hash(file_path, url):
+    """
+    Returns the hash of a downloaded file, which is kept in its cache metadata until the file is downloaded again
+    :param file_path:
+    :param url:
+    :return:
+    """
+    metadata = read_cache_metadata(file_path, url)
+
+    if metadata is not None and metadata.get("sha256"):
+        return metadata["sha256"]
+
+    content_hash = hashlib.sha256()
+
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            content_hash.update(chunk)
+
+    if metadata is not None:
+        metadata["sha256"] = content_hash.hexdigest()
+        write_file_atomic(file_path + CACHE_METADATA_SUFFIX, json.dumps(metadata).encode())
+
+    return content_hash.hexdigest()
+
+
+def link_file(source_file_path, target_file_path):
+    """
+    Makes a file available at another path, preferably as a hard link
+    :param source_file_path:
+    :param target_file_path:
+    :return: whether the target has been changed
+    """
+    if os.path.exists(target_file_path) and (os.path.samefile(source_file_path, target_file_path) or
+                                             filecmp.cmp(source_file_path, target_file_path, shallow=False)):
+        return False
+
+    temporary_file_path = f"{target_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        os.link(source_file_path, temporary_file_path)
+    except OSError:
+        # File systems without hard links get a copy
+        shutil.copyfile(source_file_path, temporary_file_path)
+
+    os.replace(temporary_file_path, target_file_path)
+    return True
+
+
+def generate_image_job(workspace_path, upload_path, event: AbstractEvent):
+    """
+    Generates the image of an event, which is meant to be called in a worker process of an image processor
+    :param workspace_path:
+    :param upload_path:
+    :param event:
+    :return: reason of a failure or None, log lines, duration in seconds and metrics of the image
+    """
+    logger = BufferedLogger()
+    # Worker processes run many jobs, so each job returns only its own metrics
+    metrics = reset_metrics()
+    start = time.perf_counter()
+
+    try:
+        with metrics.stage("image", host=urlparse(event.image).netloc or None):
+            error = None if generate_image(logger, workspace_path, upload_path, event) else "image not written"
+    except Exception as e:
+        error = str(e)
+
+    return error, logger.lines, time.perf_counter() - start, metrics.to_dict()
+
+
+def configure_image_worker(archive_settings, store_settings):
+    """
+    Configures a worker process of an image processor like the process that started it
+    :param archive_settings: settings returned by get_archive_settings
+    :param store_settings: settings returned by get_store_settings
+    :return:
+    """
+    configure_archive(*archive_settings)
+    configure_store(*store_settings)
+
+
+class BufferedLogger:
+    """
+    Keeps log lines in memory so that they can be passed on later
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def log_line(self, message):
+        self.lines.append(message)
+
+
+class ImageProcessor:
+    """
+    Generates images of events in a pool of processes while the caller carries on
+
+    Submitting blocks as soon as a given number of images waits for a process, so a fast crawler does not pile up
+    events in memory. Closing the processor waits for all images and logs their timing and failures.
+    """
+
+    def __init__(self, logger, workspace_path, upload_path, quiet=False, workers=None, queue_size=None):
+        # Read the configured settings now rather than when the module is imported
+        workers = workers or IMAGE_WORKERS
+        queue_size = queue_size if queue_size is not None else IMAGE_QUEUE_SIZE
+
+        self.logger = logger
+        self.workspace_path = workspace_path
+        self.upload_path = upload_path
+        self.quiet = quiet
+        # Workers record into or replay from the same archive and restore from the same store as the crawler
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=configure_image_worker,
+                                            initargs=(get_archive_settings(), get_store_settings()))
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.failures = {}
+        self.files = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, event: AbstractEvent):
+        """
+        Queues the image of an event
+        :param event:
+        :return: whether an image is generated for the event
+        """
+        if event.image == "":
+            return False
+
+        self.slots.acquire()
+
+        try:
+            future = self.executor.submit(generate_image_job, self.workspace_path, self.upload_path, event)
+        except Exception:
+            self.slots.release()
+            raise
+
+        future.add_done_callback(lambda done: self.complete(event.identifier, done))
+        return True
+
+    def complete(self, identifier, future):
+        """
+        Records the result of an image
+        :param identifier:
+        :param future:
+        :return:
+        """
+        try:
+            error, lines, seconds, values = future.result()
+        except Exception as e:
+            error, lines, seconds, values = str(e), [], 0.0, None
+        finally:
+            self.slots.release()
+
+        metrics = get_metrics()
+
+        if values is not None:
+            metrics.merge(values)
+
+        metrics.count("files", stage="image", result="written" if error is None else "failed")
+
+        with self.lock:
+            for line in lines:
+                self.logger.log_line(line)
+
+            if error is None:
+                self.files += 1
+                self.timings[identifier] = seconds
+            else:
+                self.failures[identifier] = error
+
+    def close(self):
+        """
+        Waits for all queued images and logs a report
+        :return: number of images written
+        """
+        self.executor.shutdown(wait=True)
+
+        for line in self.report():
+            self.logger.log_line(line)
+
+        return self.files
+
+    def report(self):
+        """
+        Returns one line per image, slowest images first, and one line per failure
+        :return:
+        """
+        lines = []
+
+        if self.timings:
+            lines.append(f"✓ Generated {len(self.timings)} images in {sum(self.timings.values()):.2f} s")
+
+        if not self.quiet:
+            for identifier in sorted(self.timings, key=self.timings.get, reverse=True):
+                lines.append(f"{self.timings[identifier] * 1000:10.2f} ms  {identifier}.webp")
+
+        for identifier, reason in self.failures.items():
+            lines.append(f"✗️ Image of {identifier} failed: {reason}")
+
+        return lines
 
 
 def needs_update(name, value, values):
     return value is not None and len(value) > 0 and (name not in values or name in values and value != values[name])
 
 
-def upload_file(logger, gcp_token_file, upload_file_path, project_id, bucket_name, quiet=False):
+def get_storage_client(logger, gcp_token_file, project_id, api_endpoint=None):
     """
+    Returns a Google Cloud Storage client that is shared by all uploads of the current process
+
     See https://cloud.google.com/storage/docs/creating-buckets#storage-create-bucket-python
+    :param logger:
+    :param gcp_token_file: service account file relative to this script, ignored if an endpoint is given
+    :param project_id:
+    :param api_endpoint: URL of a storage endpoint like a local emulator, which is accessed without credentials
+    :return: client or None if there is no config file
     """
+    key = (os.getpid(), gcp_token_file, project_id, api_endpoint)
 
-    # Set script path
-    file_path = os.path.realpath(__file__)
-    script_path = os.path.dirname(file_path)
-    config_file_path = os.path.join(script_path, gcp_token_file)
+    with _storage_clients_lock:
+        if key not in _storage_clients:
+            if api_endpoint is not None:
+                _storage_clients[key] = storage.Client(project=project_id, credentials=AnonymousCredentials(),
+                                                       client_options={"api_endpoint": api_endpoint})
+            else:
+                # Set script path
+                file_path = os.path.realpath(__file__)
+                script_path = os.path.dirname(file_path)
+                config_file_path = os.path.join(script_path, gcp_token_file)
 
-    # Check for config file
-    if not Path(config_file_path).exists():
-        logger.log_line(f"✗️ Google Cloud config not found {config_file_path}")
-        return
+                # Check for config file
+                if not Path(config_file_path).exists():
+                    logger.log_line(f"✗️ Google Cloud config not found {config_file_path}")
+                    return None
+
+                # Define storage client
+                _storage_clients[key] = storage.Client.from_service_account_json(
+                    config_file_path, project=project_id
+                )
+
+        return _storage_clients[key]
 
-    # Define storage client
-    client = storage.Client.from_service_account_json(
-        config_file_path, project=project_id
-    )
+
+def upload_file(logger, gcp_token_file, upload_file_path, project_id, bucket_name, quiet=False):
+    """
+    Uploads a single file into a bucket
+    :param logger:
+    :param gcp_token_file:
+    :param upload_file_path:
+    :param project_id:
+    :param bucket_name:
+    :param quiet:
+    :return:
+    """
+    client = get_storage_client(logger, gcp_token_file, project_id)
+
+    if client is None:
+        return
 
     bucket = client.bucket(bucket_name=bucket_name)
     bucket.storage_class = "STANDARD"
@@ -417,22 +1378,332 @@ def upload_file(logger, gcp_token_file, upload_file_path, project_id, bucket_nam
         logger.log_line(f"✓️ Uploading {os.path.basename(upload_file_path)}")
 
 
+def sync_uploads(logger, gcp_token_file, uploads_path, project_id, bucket_name, quiet=False, refresh=False,
+                 workers=UPLOAD_WORKERS, api_endpoint=None):
+    """
+    Uploads all files of a directory that the bucket does not hold yet or holds with different content
+
+    The MD5 hashes of the files in the bucket are kept in a manifest next to the directory, so that unchanged files
+    neither need to be uploaded nor looked up. Without a manifest, or when refreshing it, the bucket is listed once.
+    :param logger:
+    :param gcp_token_file:
+    :param uploads_path:
+    :param project_id:
+    :param bucket_name:
+    :param quiet:
+    :param refresh: whether to list the bucket instead of trusting the manifest
+    :param workers: number of parallel uploads
+    :param api_endpoint: URL of a storage endpoint like a local emulator
+    :return: summary with the number of uploaded, unchanged and failed files
+    """
+    summary = {"uploaded": 0, "unchanged": 0, "failed": 0}
+    client = get_storage_client(logger, gcp_token_file, project_id, api_endpoint)
+
+    if client is None:
+        return summary
+
+    bucket = client.bucket(bucket_name=bucket_name)
+    bucket.storage_class = "STANDARD"
+
+    manifest_file_path = os.path.normpath(uploads_path) + BUCKET_MANIFEST_SUFFIX
+    manifest = None if refresh else read_bucket_manifest(manifest_file_path, bucket_name)
+
+    if manifest is None:
+        manifest = {blob.name: blob.md5_hash for blob in client.list_blobs(bucket)}
+
+    # Compare the hashes of local files with those in the bucket
+    uploads = []
+    for file_name in sorted(os.listdir(uploads_path)):
+        file_path = os.path.join(uploads_path, file_name)
+
+        if not os.path.isfile(file_path) or file_name.endswith(".tmp"):
+            continue
+
+        md5_hash = get_md5_hash(file_path)
+
+        if manifest.get(file_name) == md5_hash:
+            summary["unchanged"] += 1
+        else:
+            uploads.append((file_name, file_path, md5_hash))
+
+    def upload(file_name, file_path, md5_hash):
+        blob = bucket.blob(file_name)
+        # Let the bucket reject files that got corrupted on their way
+        blob.md5_hash = md5_hash
+        blob.upload_from_filename(file_path, content_type=mimetypes.guess_type(file_name)[0])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, *entry): entry for entry in uploads}
+
+        for future, (file_name, _, md5_hash) in futures.items():
+            try:
+                future.result()
+                manifest[file_name] = md5_hash
+                summary["uploaded"] += 1
+
+                if not quiet:
+                    logger.log_line(f"✓️ Uploading {file_name}")
+            except Exception as e:
+                summary["failed"] += 1
+                logger.log_line(f"✗️ Exception: {str(e)}")
+
+    write_file_atomic(manifest_file_path, json.dumps({"bucket": bucket_name, "files": manifest}).encode())
+
+    logger.log_line(f"✓️ Synced {bucket_name}: {summary['uploaded']} uploaded, {summary['unchanged']} unchanged, "
+                    f"{summary['failed']} failed")
+    return summary
+
+
+def read_bucket_manifest(file_path, bucket_name):
+    """
+    Reads the MD5 hashes of the files in a bucket from a manifest
+    :param file_path:
+    :param bucket_name:
+    :return: hashes by file name or None if there is no manifest for the bucket
+    """
+    try:
+        with open(file_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    return manifest["files"] if manifest.get("bucket") == bucket_name else None
+
+
+def get_md5_hash(file_path):
+    """
+    Returns the MD5 hash of a file encoded like the hashes of blobs in a bucket
+    :param file_path:
+    :return:
+    """
+    md5_hash = hashlib.md5()
+
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            md5_hash.update(chunk)
+
+    return base64.b64encode(md5_hash.digest()).decode()
+
+
 class AbstractCrawler:
+    # Name of the crawler used to select it on the command line
+    name = None
+
+    # Parsing backend of the crawler
+    parser = PARSER_ETREE
+
+    # Whether the crawler needs a browser to fetch its pages
+    uses_browser = False
+
+    # State of previous runs, which is available while the crawler runs
+    state = None
 
     def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
         """
         Runs crawler
+
+        Events stream through stages that run at the same time: listing pages and detail pages are downloaded by
+        threads ahead of the parser, images are generated by processes and content files are written here. Every stage
+        only runs a limited amount of work ahead of the next one, so memory does not grow with the number of events.
         :param logger:
         :param workspace_path:
         :param content_path:
         :param uploads_path:
         :param clean:
         :param quiet:
-        :return:
+        :return: summary with the number of events, the number of files written, the duration in seconds and metrics
         """
+        start = time.perf_counter()
+        metrics = reset_metrics()
+
         # Make workspace path
         os.makedirs(os.path.join(workspace_path), exist_ok=True)
 
         # Make results paths
         os.makedirs(os.path.join(content_path), exist_ok=True)
         os.makedirs(os.path.join(uploads_path), exist_ok=True)
+
+        summary = {"events": 0, "files": 0, "seconds": 0.0}
+        event_urls = set()
+
+        # Downloads packed into the store by previous runs are restored when they are needed again
+        configure_store(workspace_path)
+
+        try:
+            # Read existing content files once rather than per event
+            content_index = ContentIndex(content_path, os.path.join(workspace_path, CONTENT_INDEX_FILE_NAME))
+            content_index.load()
+
+            # Images are generated in other processes while events are processed here
+            with CrawlState(os.path.join(workspace_path, CRAWL_STATE_FILE_NAME)) as self.state, \
+                    ImageProcessor(logger, workspace_path, uploads_path, quiet) as images:
+                for event in self.crawl(logger, workspace_path, clean, quiet):
+                    summary["events"] += 1
+                    summary["files"] += self.process_event(logger, content_path, content_index, images, event, clean)
+                    event_urls.update((event.url, event.image))
+
+            content_index.save()
+
+            # Keep downloads compressed between runs and remember which of them events reference
+            store = get_store()
+            packed_files, packed_bytes = pack_workspace(store, workspace_path, self.name)
+            store.set_event_urls(self.name, event_urls)
+        finally:
+            self.state = None
+            configure_store(None)
+
+        logger.log_line(f"✓ Packed {packed_files} files of {packed_bytes / 1024:.0f} KiB into the store")
+
+        summary["files"] += images.files
+        summary["images"] = images.files
+        summary["image_failures"] = len(images.failures)
+        summary["seconds"] = time.perf_counter() - start
+        summary["metrics"] = metrics.to_dict()
+
+        # Write timings and counters of the stages of this run
+        json_file_path, _ = write_metrics(workspace_path, [({"crawler": self.name}, summary["metrics"])])
+        logger.log_line(f"✓ Metrics {json_file_path}")
+        return summary
+
+    def collect_garbage(self, logger, workspace_path):
+        """
+        Drops downloads of the crawler that no current event references, which are meant to be kept in the store by then
+        :param logger:
+        :param workspace_path:
+        :return: number of dropped files and number of bytes freed
+        """
+        with WorkspaceStore(workspace_path) as store:
+            file_names, blobs, freed_bytes = store.collect_garbage(self.name)
+            blob_hashes = store.get_blob_hashes()
+
+        for file_name in file_names:
+            for file_path in (os.path.join(workspace_path, file_name),
+                              os.path.join(workspace_path, file_name) + CACHE_METADATA_SUFFIX):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+        # Encoded images are named after the hash of their source, which is the hash of its blob
+        encoded_path = os.path.join(workspace_path, IMAGE_ENCODED_DIRECTORY)
+
+        for entry in os.scandir(encoded_path) if os.path.isdir(encoded_path) else []:
+            if entry.is_file() and entry.name.rsplit("-", 1)[0] not in blob_hashes:
+                freed_bytes += entry.stat().st_size
+                os.remove(entry.path)
+
+        logger.log_line(f"✓ Collected garbage: {len(file_names)} files, {blobs} blobs, "
+                        f"{freed_bytes / 1024:.0f} KiB freed")
+        return len(file_names), freed_bytes
+
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
+        """
+        Downloads and parses the sites of the crawler
+        :param logger:
+        :param workspace_path:
+        :param clean:
+        :param quiet:
+        :return: events
+        """
+        raise NotImplementedError
+
+    def paginate(self, logger, workspace_path, url, file_name_format, clean=False, quiet=False, page_urls=None,
+                 workers=DOWNLOAD_WORKERS_PER_HOST, max_pages=LISTING_MAX_PAGES):
+        """
+        Downloads the pages of a listing and yields their file names as soon as they are downloaded
+
+        The first page is downloaded on its own. If the URLs of all other pages can be derived from it, e.g. from the
+        number of results, they are downloaded concurrently and yielded in the order of the pages, so that events are
+        yielded in the same order in every run. Otherwise next links are followed one page after another. Pages that
+        cannot be downloaded are skipped, and no further next links can be followed from them.
+        :param logger:
+        :param workspace_path:
+        :param url: URL of the first page
+        :param file_name_format: format of the file names, which is given the number of the page starting at 0
+        :param clean:
+        :param quiet:
+        :param page_urls: function returning the URLs of all following pages given the file path of the first page
+        :param workers: maximum number of pages downloaded at the same time
+        :param max_pages: maximum number of pages including the first one
+        :return: file names
+        """
+        def is_downloaded(page_file_name):
+            return os.path.exists(os.path.join(workspace_path, page_file_name))
+
+        file_name = file_name_format.format(0)
+        download_site(logger, workspace_path, url, file_name, clean, quiet, CACHE_TTL_LISTING)
+
+        if not is_downloaded(file_name):
+            return
+
+        if page_urls is None:
+            yield file_name
+
+            for page in range(1, max_pages):
+                url = find_next_link(os.path.join(workspace_path, file_name), url)
+
+                if url is None:
+                    break
+
+                file_name = file_name_format.format(page)
+                download_site(logger, workspace_path, url, file_name, clean, quiet, CACHE_TTL_LISTING)
+
+                if not is_downloaded(file_name):
+                    break
+
+                yield file_name
+
+            return
+
+        urls = page_urls(os.path.join(workspace_path, file_name))[:max_pages - 1]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Following pages are downloaded while the first one is being parsed
+            futures = [(executor.submit(download_site, logger, workspace_path, page_url, file_name_format.format(page),
+                                        clean, quiet, CACHE_TTL_LISTING), file_name_format.format(page))
+                       for page, page_url in enumerate(urls, start=1)]
+
+            yield file_name
+
+            for future, page_file_name in futures:
+                future.result()
+
+                if is_downloaded(page_file_name):
+                    yield page_file_name
+
+    def process_event(self, logger, content_path, content_index, images, event, clean=False):
+        """
+        Queues the image and generates the content of an event unless it has not changed since the last run
+        :param logger:
+        :param content_path:
+        :param content_index: index of existing content files
+        :param images: image processor generating the image
+        :param event:
+        :param clean: whether to process the event even if it has not changed
+        :return: number of content files written
+        """
+        files = 0
+        event_hash = get_event_hash(event)
+
+        # Skip events whose image and content have been generated from the same fields before
+        if not clean and self.state is not None and self.state.is_written(event.identifier, event_hash) and \
+                os.path.exists(os.path.join(content_path, f"{event.identifier}.md")) and \
+                (event.image == "" or os.path.exists(os.path.join(images.upload_path, f"{event.identifier}.webp"))):
+            get_metrics().count("files", stage="content", result="skipped")
+            return files
+
+        # Queue image for event and add image bucket URL
+        if images.submit(event):
+            event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
+
+        # Generate content for event
+        with get_metrics().stage("content"):
+            written = generate_content(logger, content_path, event, content_index)
+
+        get_metrics().count("files", stage="content", result="written" if written else "unchanged")
+
+        if written:
+            files += 1
+
+        if self.state is not None:
+            self.state.record_write(event.identifier, event.url, event_hash)
+
+        return files
@@ -1,18 +1,42 @@
+import json
+import sys
 from datetime import datetime
 
+# Fields of an event in the order they are stored
+FIELDS = ("identifier", "source", "url", "type", "title", "subtitle", "description", "image", "image_bucket",
+          "start_date", "end_date", "category", "languages", "organizer", "fees", "contact_person", "contact_phone",
+          "contact_mail", "location_street", "location_city", "updated")
+
+# Fields that change without the event changing, which are left out when comparing events
+VOLATILE_FIELDS = ("image_bucket", "updated")
+
+# Fields that make up the key events are compared and hashed by
+KEY_FIELDS = tuple(field for field in FIELDS if field not in VOLATILE_FIELDS)
+
+# Fields whose values recur across many events and are therefore shared between them
+INTERNED_FIELDS = ("source", "type", "category", "organizer", "location_city")
+
 
 class AbstractEvent:
     """
     Represents an event
+
+    Events keep their fields in slots rather than in a dictionary per instance. Two events are equal if all fields
+    apart from the volatile ones are, which makes them usable for change detection.
     """
 
-    def __init__(self, identifier, source, url, title, subtitle, description, image, image_bucket, start_date, end_date,
-                 category, languages, organizer, fees, contact_person, contact_phone, contact_mail,
-                 location_street, location_city):
+    __slots__ = FIELDS
+
+    # Values of fields that are the same for all events of a source, used for fields not passed to the constructor
+    defaults = {}
+
+    def __init__(self, identifier, source=None, url="", title="", subtitle="", description="", image="",
+                 image_bucket=None, start_date="", end_date="", category="", languages=None, organizer=None, fees="",
+                 contact_person="", contact_phone="", contact_mail="", location_street=None, location_city=None):
         self.type = "event"
 
         self.identifier = identifier.replace("amp;", "").replace("--", "-")
-        self.source = source
+        self.source = source if source is not None else self.defaults.get("source", "")
         self.url = url
 
         self.title = title.replace("amp;", "&")
@@ -23,15 +47,110 @@ class AbstractEvent:
         self.start_date = start_date
         self.end_date = end_date
         self.category = category
-        self.languages = languages
-        self.organizer = organizer
+        self.languages = languages if languages is not None else []
+        self.organizer = organizer if organizer is not None else self.defaults.get("organizer", "")
         self.fees = fees
 
         self.contact_person = contact_person
         self.contact_phone = contact_phone
         self.contact_mail = contact_mail
 
-        self.location_street = location_street
-        self.location_city = location_city
+        self.location_street = location_street if location_street is not None else \
+            self.defaults.get("location_street", "")
+        self.location_city = location_city if location_city is not None else self.defaults.get("location_city", "")
+
+        self.touch()
 
+        intern_fields(self)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.identifier!r})"
+
+    def key(self):
+        """
+        Returns all fields apart from the volatile ones
+        :return:
+        """
+        return tuple(freeze_value(getattr(self, field)) for field in KEY_FIELDS)
+
+    def touch(self):
+        """
+        Sets the time the event has been updated to now, e.g. when an event parsed in an earlier run is crawled again
+        :return:
+        """
         self.updated = datetime.today().strftime('%Y-%m-%dT%H:%M:%S.000')
+
+    def to_dict(self):
+        """
+        Returns the fields of the event
+        :return:
+        """
+        values = {field: getattr(self, field) for field in FIELDS}
+        values["languages"] = list(values["languages"])
+        return values
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Creates an event from fields returned by to_dict, which are taken as they are
+        :param values:
+        :return:
+        """
+        event = cls.__new__(cls)
+
+        for field in FIELDS:
+            setattr(event, field, values.get(field))
+
+        event.languages = list(event.languages or [])
+        intern_fields(event)
+        return event
+
+    def to_json(self):
+        """
+        Encodes the event as JSON
+        :return:
+        """
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, value):
+        """
+        Decodes an event encoded by to_json
+        :param value:
+        :return:
+        """
+        return cls.from_dict(json.loads(value))
+
+
+def freeze_value(value):
+    """
+    Turns lists like the languages or fees of an event into tuples so that the key of the event can be hashed
+    :param value:
+    :return:
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(item) for item in value)
+
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze_value(item)) for key, item in value.items()))
+
+    return value
+
+
+def intern_fields(event):
+    """
+    Shares the values of fields that recur across many events
+    :param event:
+    :return:
+    """
+    for field in INTERNED_FIELDS:
+        value = getattr(event, field)
+
+        if type(value) is str:
+            setattr(event, field, sys.intern(value))
@@ -0,0 +1,542 @@
+import argparse
+import datetime
+import glob
+import importlib.util
+import json
+import mimetypes
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as element_tree
+
+import cv2
+import numpy
+import requests
+from requests.adapters import BaseAdapter
+
+from abstract_crawler import BufferedLogger, CACHE_METADATA_SUFFIX, PARSER_ETREE, configure_debug, configure_http, \
+    generate_content, generate_image, get_session
+from abstract_event import AbstractEvent
+from crawl_archive import ARCHIVE_REPLAY, URL_DATE, ReplayAdapter, configure_archive, get_archive
+from runner import CRAWLERS, ConsoleLogger, load_crawler
+
+# Pages of every crawler, each in a directory named like the crawler with a routes.json file mapping URL patterns to
+# the files answering them. The pages in the repository are synthetic, modelled on the markup of the sites, until they
+# are replaced with the pages of a recorded run by record_fixtures
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Host that sample images are served from
+IMAGE_URL = "https://fixtures.invalid/images/"
+
+# Sample images by file name with their width and height
+SAMPLE_IMAGES = {
+    "large.jpg": (4000, 3000),
+    "medium.jpg": (1200, 800),
+    "medium.png": (1200, 800),
+}
+
+# Number of times every stage is run
+ROUNDS = 5
+
+# Relative slowdown of a stage compared to the baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.25
+
+# Slowdown in seconds a stage needs to exceed as well, so that stages taking microseconds do not fail on noise
+REGRESSION_MIN_SECONDS = 0.001
+
+
+class FixtureAdapter(BaseAdapter):
+    """
+    Answers requests with fixture files instead of sending them, so that crawlers run offline
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.routes = []
+        self.misses = []
+
+    def add_route(self, pattern, file_path):
+        """
+        Answers requests for URLs fully matching a pattern with a file
+        :param pattern: regular expression
+        :param file_path:
+        :return:
+        """
+        self.routes.append((re.compile(pattern), file_path))
+
+    def add_routes(self, fixtures_path):
+        """
+        Answers requests with the files of a fixtures directory as listed in its routes.json file
+        :param fixtures_path:
+        :return:
+        """
+        with open(os.path.join(fixtures_path, "routes.json"), "r") as file:
+            for pattern, file_name in json.load(file):
+                self.add_route(pattern, os.path.join(fixtures_path, file_name))
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+
+        for pattern, file_path in self.routes:
+            if pattern.fullmatch(request.url):
+                with open(file_path, "rb") as file:
+                    response._content = file.read()
+
+                response.status_code = 200
+                response.reason = "OK"
+                response.headers["Content-Type"] = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+                return response
+
+        self.misses.append(request.url)
+        response._content = b""
+        response.status_code = 404
+        response.reason = "Not Found"
+        return response
+
+    def close(self):
+        pass
+
+
+class FixtureRecorder(ReplayAdapter):
+    """
+    Answers requests with the responses recorded in an archive and keeps those that succeeded
+    """
+
+    def __init__(self, archive):
+        super().__init__(archive)
+        self.responses = {}
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 200:
+            self.responses.setdefault(request.url, response)
+
+        return response
+
+
+def browser_available():
+    """
+    Checks if the browser library crawlers fall back to is installed
+    :return:
+    """
+    return importlib.util.find_spec("selenium") is not None
+
+
+def get_url_pattern(url):
+    """
+    Returns a pattern matching a recorded URL and the same URL with other dates
+    :param url:
+    :return: regular expression
+    """
+    return URL_DATE.pattern.join(re.escape(part) for part in URL_DATE.split(url))
+
+
+def record_fixtures(logger, archive_path, name, fixtures_path=FIXTURES_PATH):
+    """
+    Replaces the fixtures of a crawler with the responses it fetches when replaying an archive recorded by the runner
+
+    Pages are named after their role: detail pages of events, listing pages the crawler downloads and parses, and
+    other pages it only looks into, like search forms. Pages a browser rendered cannot be served to crawlers, so
+    crawlers need to fetch everything over HTTP for their fixtures to be complete.
+    :param logger:
+    :param archive_path: directory of the archive
+    :param name: name of the crawler
+    :param fixtures_path: directory of the fixtures of all crawlers
+    :return: number of recorded pages
+    """
+    configure_archive(archive_path, ARCHIVE_REPLAY)
+
+    try:
+        recorder = FixtureRecorder(get_archive())
+        session = get_session()
+        session.mount("http://", recorder)
+        session.mount("https://", recorder)
+
+        with tempfile.TemporaryDirectory(prefix=f"{name}-fixtures-") as workspace_path:
+            crawler_logger = BufferedLogger()
+            events = list(load_crawler(name).crawl(crawler_logger, workspace_path, clean=True, quiet=True))
+            check_log_lines(crawler_logger)
+
+            # Listing pages are the files the crawler downloaded apart from the detail pages
+            listing_urls = set()
+            for file_path in glob.glob(os.path.join(workspace_path, f"*{CACHE_METADATA_SUFFIX}")):
+                with open(file_path, "r") as file:
+                    listing_urls.add(json.load(file).get("url"))
+    finally:
+        configure_archive(None)
+        configure_http()
+
+    if not events:
+        raise RuntimeError(f"no events parsed from {archive_path}")
+
+    event_urls = {event.url for event in events}
+    crawler_fixtures_path = os.path.join(fixtures_path, name)
+    shutil.rmtree(crawler_fixtures_path, ignore_errors=True)
+    os.makedirs(crawler_fixtures_path)
+
+    # Detail pages are downloaded concurrently, so they are numbered in the order of their events
+    urls = [url for url in recorder.responses if url not in event_urls] + \
+        list(dict.fromkeys(event.url for event in events if event.url in recorder.responses))
+
+    routes = []
+    counts = {}
+    for url in urls:
+        response = recorder.responses[url]
+        role = "detail" if url in event_urls else "listing" if url in listing_urls else "page"
+        extension = mimetypes.guess_extension(response.headers.get("Content-Type", "").split(";")[0].strip())
+        file_name = f"{role}-{counts.get(role, 0)}{extension or '.html'}"
+        counts[role] = counts.get(role, 0) + 1
+
+        with open(os.path.join(crawler_fixtures_path, file_name), "wb") as file:
+            file.write(response.content)
+
+        routes.append([get_url_pattern(url), file_name])
+
+    with open(os.path.join(crawler_fixtures_path, "routes.json"), "w") as file:
+        json.dump(routes, file, indent=2)
+
+    logger.log_line(f"✓ Recorded {len(routes)} pages of {name} into {crawler_fixtures_path}")
+    return len(routes)
+
+
+def measure(function, rounds, setup=None):
+    """
+    Runs a function several times and measures how long each run takes
+    :param function: function given the value returned by setup
+    :param rounds:
+    :param setup: function preparing a run, which is not measured
+    :return: summary of the durations in seconds and the value returned by the last run
+    """
+    durations = []
+    value = None
+
+    for _ in range(rounds):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        value = function(argument)
+        durations.append(time.perf_counter() - start)
+
+    return {"median": statistics.median(durations), "min": min(durations), "rounds": rounds}, value
+
+
+def check_log_lines(logger):
+    """
+    Raises an exception if any failure has been logged
+    :param logger: buffered logger
+    :return:
+    """
+    failures = [line for line in logger.lines if line.startswith("✗")]
+
+    if failures:
+        raise RuntimeError(failures[0])
+
+
+def create_sample_images(images_path):
+    """
+    Creates sample images with structure and noise, which encode to sizes similar to photos
+    :param images_path:
+    :return: file paths by file name
+    """
+    random = numpy.random.default_rng(0)
+    file_paths = {}
+
+    for file_name, (width, height) in SAMPLE_IMAGES.items():
+        x = numpy.linspace(0, 8 * numpy.pi, width, dtype=numpy.float32)
+        y = numpy.linspace(0, 6 * numpy.pi, height, dtype=numpy.float32)[:, None]
+        pattern = numpy.stack([numpy.sin(x + y), numpy.cos(x * 0.5 - y), numpy.sin(x * y / 40)], axis=-1)
+        noise = random.normal(0, 0.15, (height, width, 3)).astype(numpy.float32)
+        image = numpy.clip((pattern + noise + 1) * 127.5, 0, 255).astype(numpy.uint8)
+
+        file_path = os.path.join(images_path, file_name)
+        cv2.imwrite(file_path, image)
+        file_paths[file_name] = file_path
+
+    return file_paths
+
+
+def benchmark_crawler(name, adapter, temporary_path, rounds):
+    """
+    Measures the stages of a crawler on its fixture pages
+    :param name:
+    :param adapter: fixture adapter answering the requests of the crawler
+    :param temporary_path:
+    :param rounds:
+    :return: summaries by stage
+    """
+    fixtures_path = os.path.join(FIXTURES_PATH, name)
+    adapter.add_routes(fixtures_path)
+
+    crawler = load_crawler(name)
+    module = sys.modules[type(crawler).__module__]
+    results = {}
+    logger = BufferedLogger()
+
+    def new_path(prefix):
+        return tempfile.mkdtemp(prefix=f"{name}-{prefix}-", dir=temporary_path)
+
+    # Parse end to end, with listing and detail pages downloaded from the fixtures
+    results["parse_html"], events = measure(
+        lambda workspace_path: list(crawler.crawl(logger, workspace_path, clean=True, quiet=True)), rounds,
+        lambda: new_path("workspace"))
+    results["parse_html"]["items"] = len(events)
+    check_log_lines(logger)
+
+    if not events:
+        raise RuntimeError("no events parsed")
+
+    # Transform listing pages on their own
+    workspace_path = new_path("listing")
+    listing_file_names = []
+    for file_path in sorted(glob.glob(os.path.join(fixtures_path, "listing*.html"))):
+        shutil.copy(file_path, workspace_path)
+        listing_file_names.append(os.path.basename(file_path))
+
+    def transform(_):
+        return [module.transform_html(workspace_path, file_name, file_name.replace(".html", ".xml"), PARSER_ETREE)
+                for file_name in listing_file_names]
+
+    results["transform_html"], _ = measure(transform, rounds)
+    results["transform_html"]["items"] = len(listing_file_names)
+
+    # Transform detail pages on their own, with the function the crawler uses for them, unless it reads all events
+    # from its listing pages like lfr
+    detail_file_names = []
+    for file_path in sorted(glob.glob(os.path.join(fixtures_path, "detail*.html"))):
+        shutil.copy(file_path, workspace_path)
+        detail_file_names.append(os.path.basename(file_path))
+
+    if detail_file_names:
+        transform_detail_html = getattr(module, "transform_sub_page_html", module.transform_html)
+
+        results["transform_detail_html"], _ = measure(
+            lambda _: [transform_detail_html(workspace_path, file_name, file_name.replace(".html", ".xml"),
+                                             PARSER_ETREE) for file_name in detail_file_names], rounds)
+        results["transform_detail_html"]["items"] = len(detail_file_names)
+
+    # Parse the transformed listing pages into trees of elements without transforming them again
+    configure_debug(persist_xml=True)
+    try:
+        transform(None)
+    finally:
+        configure_debug(persist_xml=False)
+
+    contents = []
+    for file_name in listing_file_names:
+        with open(os.path.join(workspace_path, file_name.replace(".html", ".xml")), "r") as file:
+            contents.append(file.read())
+
+    results["tree_parse"], _ = measure(lambda _: [element_tree.fromstring(content) for content in contents], rounds)
+    results["tree_parse"]["items"] = len(contents)
+
+    # Generate content files of all parsed events into an empty directory
+    results["generate_content"], _ = measure(
+        lambda content_path: [generate_content(logger, content_path, event) for event in events], rounds,
+        lambda: new_path("content"))
+    results["generate_content"]["items"] = len(events)
+    check_log_lines(logger)
+
+    return results
+
+
+def benchmark_images(adapter, temporary_path, rounds):
+    """
+    Measures generating images of events from sample images
+    :param adapter: fixture adapter the sample images are served by
+    :param temporary_path:
+    :param rounds:
+    :return: summaries by stage
+    """
+    images_path = tempfile.mkdtemp(prefix="images-", dir=temporary_path)
+    events = []
+
+    for file_name, file_path in create_sample_images(images_path).items():
+        adapter.add_route(re.escape(IMAGE_URL + file_name), file_path)
+        events.append(AbstractEvent(identifier=f"sample-{file_name.replace('.', '-')}", image=IMAGE_URL + file_name))
+
+    logger = BufferedLogger()
+
+    def setup():
+        return tempfile.mkdtemp(prefix="image-workspace-", dir=temporary_path), \
+            tempfile.mkdtemp(prefix="image-uploads-", dir=temporary_path)
+
+    def generate(paths):
+        workspace_path, upload_path = paths
+        return [generate_image(logger, workspace_path, upload_path, event) for event in events]
+
+    summary, written = measure(generate, rounds, setup)
+    summary["items"] = len(events)
+    check_log_lines(logger)
+
+    if not all(written):
+        raise RuntimeError("not all sample images were generated")
+
+    return {"generate_image": summary}
+
+
+def run_benchmarks(logger, names, rounds=ROUNDS):
+    """
+    Measures the stages of crawlers on their fixture pages and image generation on sample images, all offline
+    :param logger:
+    :param names: names of the crawlers to measure
+    :param rounds: number of times every stage is run
+    :return: results with summaries by stage and errors by crawler
+    """
+    adapter = FixtureAdapter()
+    session = get_session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    results = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rounds": rounds,
+        "stages": {},
+        "errors": {},
+        "skipped": {},
+    }
+
+    # Crawlers that need a browser cannot be measured without one
+    if not browser_available():
+        for name in names:
+            if load_crawler(name).uses_browser:
+                logger.log_line(f"✗️ Skipping {name}, which needs a browser")
+                results["skipped"][name] = "selenium is not installed"
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as temporary_path:
+        groups = [(name, lambda name=name: benchmark_crawler(name, adapter, temporary_path, rounds))
+                  for name in names if name not in results["skipped"]]
+        groups.append(("images", lambda: benchmark_images(adapter, temporary_path, rounds)))
+
+        for group, function in groups:
+            logger.log_line(f"Benchmarking {group}")
+
+            try:
+                for stage, summary in function().items():
+                    results["stages"][f"{group}.{stage}"] = summary
+            except Exception as e:
+                logger.log_line(f"✗️ Exception: {str(e)}")
+                results["errors"][group] = str(e)
+
+    if adapter.misses:
+        results["errors"]["fixtures"] = f"no fixture for {', '.join(sorted(set(adapter.misses)))}"
+
+    return results
+
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD, min_seconds=REGRESSION_MIN_SECONDS):
+    """
+    Compares results with a baseline
+    :param results:
+    :param baseline: results of an earlier run
+    :param threshold: relative slowdown of the median duration that counts as a regression
+    :param min_seconds: slowdown in seconds that has to be exceeded as well
+    :return: lines describing the stages that regressed
+    """
+    regressions = []
+
+    for stage, summary in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+
+        if previous is None:
+            continue
+
+        slowdown = summary["median"] - previous["median"]
+
+        if slowdown > previous["median"] * threshold and slowdown > min_seconds:
+            regressions.append(f"{stage} took {summary['median'] * 1000:.2f} ms instead of "
+                               f"{previous['median'] * 1000:.2f} ms (+{slowdown / previous['median']:.0%})")
+
+    return regressions
+
+
+def format_results(results, baseline=None):
+    """
+    Formats results as a table
+    :param results:
+    :param baseline: results of an earlier run, which are shown next to the results if given
+    :return: lines
+    """
+    lines = [f"{'stage':<28} {'items':>6} {'median ms':>10} {'min ms':>10} {'baseline ms':>12}"]
+
+    for stage, summary in results["stages"].items():
+        previous = (baseline or {}).get("stages", {}).get(stage)
+        previous = f"{previous['median'] * 1000:>12.2f}" if previous is not None else f"{'':>12}"
+        lines.append(f"{stage:<28} {summary.get('items', ''):>6} {summary['median'] * 1000:>10.2f} "
+                     f"{summary['min'] * 1000:>10.2f} {previous}")
+
+    return lines
+
+
+def main(args=None):
+    """
+    Runs benchmarks selected on the command line, writes their results and compares them with a baseline
+    :param args: command line arguments, those of the process if None
+    :return: exit code, which is not 0 if a benchmark failed or regressed
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks crawlers offline on fixture pages")
+    parser.add_argument("crawlers", nargs="*", metavar="crawler",
+                        help=f"crawlers to benchmark, all of them if none are given ({', '.join(CRAWLERS)})")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="number of times every stage is run")
+    parser.add_argument("--output", default="benchmark-results.json", help="path of the results")
+    parser.add_argument("--baseline", default=None, help="path of earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown that counts as a regression")
+    parser.add_argument("--record-fixtures", metavar="ARCHIVE",
+                        help="replace the fixtures of the crawlers with the pages in an archive recorded by the runner "
+                             "instead of benchmarking")
+    arguments = parser.parse_args(args)
+
+    for name in arguments.crawlers:
+        if name not in CRAWLERS:
+            parser.error(f"unknown crawler {name}")
+
+    logger = ConsoleLogger()
+    names = list(dict.fromkeys(arguments.crawlers)) or list(CRAWLERS)
+
+    if arguments.record_fixtures is not None:
+        failed = False
+
+        for name in names:
+            try:
+                record_fixtures(logger, arguments.record_fixtures, name)
+            except Exception as e:
+                logger.log_line(f"✗️ Recording fixtures of {name} failed: {str(e)}")
+                failed = True
+
+        return 1 if failed else 0
+
+    baseline = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline, "r") as file:
+            baseline = json.load(file)
+
+    results = run_benchmarks(logger, names, arguments.rounds)
+
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for line in format_results(results, baseline):
+        logger.log_line(line)
+
+    regressions = find_regressions(results, baseline, arguments.threshold) if baseline is not None else []
+
+    for line in regressions:
+        logger.log_line(f"✗️ Regression: {line}")
+
+    for group, error in results["errors"].items():
+        logger.log_line(f"✗️ {group} failed: {error}")
+
+    return 1 if regressions or results["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
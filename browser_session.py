@@ -0,0 +1,123 @@
+import atexit
+import os
+import threading
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Seconds to wait for an element before giving up
+WAIT_TIMEOUT = 20
+
+# Requests a browser does not need to fill in forms
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*matomo*", "*piwik*", "*etracker*",
+]
+
+_driver_path = None
+_browser = None
+_browser_pid = None
+_browser_lock = threading.Lock()
+
+
+def get_driver_path():
+    """
+    Returns the path of the chrome driver, which is only looked up once per process
+    :return:
+    """
+    global _driver_path
+
+    if _driver_path is None:
+        _driver_path = ChromeDriverManager().install()
+
+    return _driver_path
+
+
+def get_browser():
+    """
+    Returns a headless browser that is shared by all callers within a process
+    :return:
+    """
+    global _browser, _browser_pid
+
+    with _browser_lock:
+        if _browser is None or _browser_pid != os.getpid():
+            options = webdriver.ChromeOptions()
+            options.add_argument("headless")
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+            _browser = webdriver.Chrome(service=ChromeService(get_driver_path()), options=options)
+            _browser_pid = os.getpid()
+
+            # Skip images, fonts and analytics
+            _browser.execute_cdp_cmd("Network.enable", {})
+            _browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+
+        return _browser
+
+
+def close_browser():
+    """
+    Quits the shared browser of this process if there is one
+    :return:
+    """
+    global _browser
+
+    with _browser_lock:
+        if _browser is not None and _browser_pid == os.getpid():
+            _browser.quit()
+
+        _browser = None
+
+
+def click(browser, locator):
+    """
+    Clicks an element as soon as it can be clicked
+    :param browser:
+    :param locator: tuple of a By strategy and a selector
+    :return: element
+    """
+    element = WebDriverWait(browser, WAIT_TIMEOUT).until(expected_conditions.element_to_be_clickable(locator))
+    element.click()
+    return element
+
+
+def type_text(browser, locator, text):
+    """
+    Types text into an element as soon as it can be clicked
+    :param browser:
+    :param locator: tuple of a By strategy and a selector
+    :param text:
+    :return: element
+    """
+    element = click(browser, locator)
+    element.send_keys(text)
+    return element
+
+
+def wait_for_replacement(browser, element, locator):
+    """
+    Waits until an element has been replaced, e.g. after submitting a form
+    :param browser:
+    :param element: element that is replaced, or None if it did not exist
+    :param locator: tuple of a By strategy and a selector of the new element
+    :return: whether the new element is present
+    """
+    wait = WebDriverWait(browser, WAIT_TIMEOUT)
+
+    try:
+        if element is not None:
+            wait.until(expected_conditions.staleness_of(element))
+
+        wait.until(expected_conditions.presence_of_element_located(locator))
+        return True
+    except TimeoutException:
+        return False
+
+
+atexit.register(close_browser)
@@ -0,0 +1,280 @@
+import datetime
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Modes of an archive
+ARCHIVE_RECORD = "record"
+ARCHIVE_REPLAY = "replay"
+
+# Suffix of the files of an archive, of which every process appends to one of its own
+ARCHIVE_FILE_SUFFIX = ".records.gz"
+
+# Method of records holding the source of a page rendered by a browser rather than an HTTP response
+METHOD_BROWSER = "BROWSER"
+
+# Headers describing how a response has been transferred, which do not apply to the decoded content that is stored
+TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# Dates within the query of URLs, like the range of days crawlers search from the day they run, which are left out
+# when looking up a recorded response so that an archive can be replayed on later days
+URL_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# Size of the chunks archive files are decompressed in
+READ_CHUNK_SIZE = 64 * 1024
+
+# Directory of the archive and its mode, or None if nothing is recorded or replayed
+ARCHIVE_PATH = None
+ARCHIVE_MODE = None
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+class CrawlArchive:
+    """
+    Records every response a crawl fetches and replays them without network access
+
+    An archive is a directory of files, each a sequence of gzip members. Every member is one record, which consists of
+    a JSON line with the method, URL, status, headers, duration and time of the response, followed by its content.
+    Replaying serves the latest record of each URL, preferring full responses over those that only revalidated a
+    cached copy. Dates within the query of a URL are ignored, so a URL recorded on one day is replayed on any other.
+    """
+
+    def __init__(self, directory_path, mode):
+        self.directory_path = directory_path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.file = None
+        self.index = None
+
+    def record(self, method, url, status_code, reason, headers, content, seconds):
+        """
+        Appends a response to the file of the current process
+        :param method: HTTP method or METHOD_BROWSER
+        :param url:
+        :param status_code:
+        :param reason:
+        :param headers:
+        :param content: decoded content
+        :param seconds: time it took to fetch the response
+        :return:
+        """
+        header = {"method": method, "url": url, "status": status_code, "reason": reason,
+                  "headers": {name: value for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS},
+                  "seconds": seconds, "recorded_at": time.time(), "length": len(content)}
+        member = gzip.compress(json.dumps(header).encode() + b"\n" + content)
+
+        with self.lock:
+            if self.file is None:
+                os.makedirs(self.directory_path, exist_ok=True)
+                self.file = open(os.path.join(self.directory_path, f"{os.getpid()}-{int(time.time())}"
+                                                                   f"{ARCHIVE_FILE_SUFFIX}"), "ab")
+
+            # Records are written in one piece, so a crash leaves at most the last one incomplete
+            self.file.write(member)
+            self.file.flush()
+
+    def find(self, method, url):
+        """
+        Returns the recorded response of a URL
+        :param method: HTTP method or METHOD_BROWSER
+        :param url:
+        :return: header and content of the record, or None and None if the URL has not been recorded
+        """
+        with self.lock:
+            if self.index is None:
+                self.index = self.load_index()
+
+            location = self.index.get((method, get_url_key(url)))
+
+        if location is None:
+            return None, None
+
+        file_path, offset, _ = location
+
+        with open(file_path, "rb") as file:
+            file.seek(offset)
+            return next(read_records(file))[1:]
+
+    def load_index(self):
+        """
+        Reads where the latest record of every URL is found in the files of the archive
+        :return: file path, offset and status by method and URL
+        """
+        index = {}
+        records = []
+
+        for file_name in os.listdir(self.directory_path) if os.path.isdir(self.directory_path) else []:
+            if file_name.endswith(ARCHIVE_FILE_SUFFIX):
+                file_path = os.path.join(self.directory_path, file_name)
+
+                with open(file_path, "rb") as file:
+                    records += [(header["recorded_at"], header, file_path, offset)
+                                for offset, header, _ in read_records(file)]
+
+        for _, header, file_path, offset in sorted(records, key=lambda record: record[0]):
+            key = (header["method"], get_url_key(header["url"]))
+
+            # Responses without content are only used if there is no full response
+            if header["status"] != 304 or key not in index or index[key][2] == 304:
+                index[key] = (file_path, offset, header["status"])
+
+        return index
+
+    def close(self):
+        """
+        Closes the file records are appended to
+        :return:
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests like the default adapter and records their responses in an archive
+    """
+
+    def __init__(self, archive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.archive.record(request.method, request.url, response.status_code, response.reason, response.headers,
+                            response.content, response.elapsed.total_seconds())
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests with the responses recorded in an archive instead of sending them
+    """
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        header, content = self.archive.find(request.method, request.url)
+
+        if header is None:
+            raise requests.ConnectionError(f"{request.url} has not been recorded", request=request)
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = header["status"]
+        response.reason = header["reason"]
+        response.headers = CaseInsensitiveDict(header["headers"])
+        response.headers["Content-Length"] = str(len(content))
+        response.elapsed = datetime.timedelta(seconds=header["seconds"])
+        response._content = content
+        return response
+
+    def close(self):
+        pass
+
+
+def get_url_key(url):
+    """
+    Returns the key recorded responses of a URL are looked up by, in which dates within the query are replaced
+    :param url:
+    :return:
+    """
+    path, separator, query = url.partition("?")
+    return path + separator + URL_DATE.sub("{date}", query)
+
+
+def read_records(file):
+    """
+    Reads the records of an archive file from its current position
+    :param file: file opened in binary mode
+    :return: offsets, headers and contents of the records, up to a record that has not been written completely
+    """
+    offset = file.tell()
+
+    while True:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        chunks = []
+        consumed = 0
+
+        while not decompressor.eof:
+            chunk = file.read(READ_CHUNK_SIZE)
+
+            if not chunk:
+                return
+
+            consumed += len(chunk)
+            chunks.append(decompressor.decompress(chunk))
+
+        # Data after the end of the record belongs to the next one
+        consumed -= len(decompressor.unused_data)
+        file.seek(offset + consumed)
+
+        data = b"".join(chunks)
+        header_end = data.index(b"\n")
+        header = json.loads(data[:header_end])
+        yield offset, header, data[header_end + 1:header_end + 1 + header["length"]]
+
+        offset += consumed
+
+
+def configure_archive(path=None, mode=None):
+    """
+    Configures recording responses into an archive or replaying them from it
+    :param path: directory of the archive, or None to neither record nor replay
+    :param mode: ARCHIVE_RECORD or ARCHIVE_REPLAY
+    :return:
+    """
+    global ARCHIVE_PATH, ARCHIVE_MODE, _archive
+
+    if path is not None and mode not in (ARCHIVE_RECORD, ARCHIVE_REPLAY):
+        raise ValueError(f"unknown archive mode {mode}")
+
+    with _archive_lock:
+        ARCHIVE_PATH = path
+        ARCHIVE_MODE = mode if path is not None else None
+
+        if _archive is not None:
+            _archive.close()
+
+        _archive = None
+
+
+def get_archive_settings():
+    """
+    Returns the settings of the archive, e.g. to configure the same archive in another process
+    :return: path and mode
+    """
+    return ARCHIVE_PATH, ARCHIVE_MODE
+
+
+def get_archive():
+    """
+    Returns the archive of the current process
+    :return: archive or None if nothing is recorded or replayed
+    """
+    global _archive
+
+    with _archive_lock:
+        if ARCHIVE_PATH is None:
+            return None
+
+        # Forked processes must not write into the file of their parent
+        if _archive is None or _archive.pid != os.getpid():
+            _archive = CrawlArchive(ARCHIVE_PATH, ARCHIVE_MODE)
+
+        return _archive
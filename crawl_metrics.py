@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Metrics with their Prometheus type and help text
+METRICS = {
+    "stage_seconds": ("counter", "Wall time spent in a stage in seconds"),
+    "stage_cpu_seconds": ("counter", "CPU time of the thread running a stage in seconds"),
+    "stage_calls": ("counter", "Number of times a stage has run"),
+    "downloaded_bytes": ("counter", "Number of bytes downloaded"),
+    "cache_results": ("counter", "Number of cached downloads by whether they were fresh, revalidated or downloaded"),
+    "files": ("counter", "Number of files by whether they were written or skipped"),
+    "exceptions": ("counter", "Number of exceptions caught in a stage"),
+}
+
+# Prefix of the names of all metrics in the Prometheus text format
+PROMETHEUS_PREFIX = "crawler_"
+
+# Names of the files metrics are written to at the end of a run
+METRICS_JSON_FILE_NAME = "metrics.json"
+METRICS_PROMETHEUS_FILE_NAME = "metrics.prom"
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class CrawlMetrics:
+    """
+    Counts what a crawler does and measures how long each stage takes
+
+    Every value is a counter of one of the METRICS that is broken down by labels like the stage or the host. Stages
+    run in many threads at once, so their wall times add up to more than the duration of a run.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def count(self, name, value=1, **labels):
+        """
+        Adds a value to a counter
+        :param name: name of one of the METRICS
+        :param value:
+        :param labels: labels of the counter, those that are None are left out
+        :return:
+        """
+        key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items()
+                                  if label_value is not None)))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """
+        Measures the wall and CPU time of the code within a with statement as a stage
+        :param name: name of the stage, e.g. download, transform, parse, image or content
+        :param labels: further labels like the host
+        :return:
+        """
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+
+        try:
+            yield
+        except Exception:
+            self.count("exceptions", stage=name, **labels)
+            raise
+        finally:
+            self.add_stage(name, time.perf_counter() - start, time.thread_time() - start_cpu, **labels)
+
+    def add_stage(self, name, seconds, cpu_seconds, **labels):
+        """
+        Records a stage that has been measured elsewhere, e.g. in another process
+        :param name:
+        :param seconds: wall time
+        :param cpu_seconds:
+        :param labels:
+        :return:
+        """
+        self.count("stage_seconds", seconds, stage=name, **labels)
+        self.count("stage_cpu_seconds", cpu_seconds, stage=name, **labels)
+        self.count("stage_calls", 1, stage=name, **labels)
+
+    def merge(self, values):
+        """
+        Adds the counters of metrics returned by to_dict, e.g. those of another process
+        :param values:
+        :return:
+        """
+        for counter in values["counters"]:
+            self.count(counter["name"], counter["value"], **counter["labels"])
+
+    def to_dict(self):
+        """
+        Returns all counters
+        :return:
+        """
+        with self.lock:
+            items = sorted(self.counters.items())
+
+        return {"counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in items]}
+
+
+def write_metrics(directory_path, runs):
+    """
+    Writes the counters of several runs as JSON and in the Prometheus text format
+    :param directory_path:
+    :param runs: list of tuples of the labels of a run, e.g. the crawler, and its metrics returned by to_dict
+    :return: paths of the files written
+    """
+    json_file_path = os.path.join(directory_path, METRICS_JSON_FILE_NAME)
+    prometheus_file_path = os.path.join(directory_path, METRICS_PROMETHEUS_FILE_NAME)
+
+    with open(json_file_path, "w") as file:
+        json.dump({"runs": [{"labels": labels, **values} for labels, values in runs]}, file, indent=2)
+
+    with open(prometheus_file_path, "w") as file:
+        file.write(format_prometheus(runs))
+
+    return json_file_path, prometheus_file_path
+
+
+def format_prometheus(runs):
+    """
+    Formats the counters of several runs in the Prometheus text format
+    :param runs: list of tuples of the labels of a run, e.g. the crawler, and its metrics returned by to_dict
+    :return:
+    """
+    samples = {}
+
+    for run_labels, values in runs:
+        for counter in values["counters"]:
+            labels = {**run_labels, **counter["labels"]}
+            label_text = ",".join(f'{label}="{format_label_value(value)}"' for label, value in labels.items())
+            samples.setdefault(counter["name"], []).append(f"{PROMETHEUS_PREFIX}{counter['name']}_total"
+                                                           f"{{{label_text}}} {counter['value']}")
+
+    lines = []
+
+    for name, (metric_type, help_text) in METRICS.items():
+        if name in samples:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}{name}_total {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name}_total {metric_type}")
+            lines += samples[name]
+
+    return "\n".join(lines) + "\n"
+
+
+def format_label_value(value):
+    """
+    Escapes a label value for the Prometheus text format
+    :param value:
+    :return:
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def get_metrics():
+    """
+    Returns the metrics of the current process, which shared helpers record into
+    :return:
+    """
+    global _metrics
+
+    with _metrics_lock:
+        # Forked processes must not count into the metrics of their parent
+        if _metrics is None or _metrics.pid != os.getpid():
+            _metrics = CrawlMetrics()
+
+        return _metrics
+
+
+def reset_metrics():
+    """
+    Replaces the metrics of the current process with empty ones, e.g. at the start of a run
+    :return: new metrics
+    """
+    global _metrics
+
+    with _metrics_lock:
+        _metrics = CrawlMetrics()
+        return _metrics
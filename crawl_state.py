@@ -0,0 +1,171 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from abstract_event import FIELDS, VOLATILE_FIELDS
+
+# Version of the layout of the database and the encoding of events, which is increased whenever either changes, so
+# that databases of other versions are started afresh
+STATE_SCHEMA_VERSION = 2
+
+
+class CrawlState:
+    """
+    Remembers what a crawler fetched, parsed and wrote in previous runs
+
+    Every event is stored as JSON by its identifier together with the hash of the html it has been parsed from, the
+    hash of its fields and the times it has last been fetched, parsed and written. Crawlers use it to skip parsing pages
+    that did not change and to skip writing events that did not change. Events whose fields depend on the current date
+    expire, so they are parsed again.
+    """
+
+    def __init__(self, file_path):
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        with self.lock, self.connection:
+            # Events are a cache of parsed pages, so a database of another version is simply dropped
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] != STATE_SCHEMA_VERSION:
+                self.connection.execute("DROP TABLE IF EXISTS events")
+                self.connection.execute(f"PRAGMA user_version = {STATE_SCHEMA_VERSION}")
+
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    identifier TEXT PRIMARY KEY,
+                    url TEXT,
+                    html_hash TEXT,
+                    event_hash TEXT,
+                    event TEXT,
+                    expires_at REAL,
+                    written_hash TEXT,
+                    fetched_at REAL,
+                    parsed_at REAL,
+                    written_at REAL
+                )
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stores all changes and closes the database
+        :return:
+        """
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def get_event(self, identifier, html_hash, event_class):
+        """
+        Returns the event parsed from the same html in a previous run
+        :param identifier:
+        :param html_hash: hash of the html the event would be parsed from
+        :param event_class: class of the event
+        :return: event or None if the html changed, the event expired or has never been parsed
+        """
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute("SELECT html_hash, event, expires_at FROM events WHERE identifier = ?",
+                                          (identifier,)).fetchone()
+
+            if row is None or row[0] != html_hash or row[1] is None or row[2] is not None and row[2] <= now:
+                return None
+
+            self.connection.execute("UPDATE events SET fetched_at = ? WHERE identifier = ?", (now, identifier))
+
+        values = json.loads(row[1])
+
+        # Events stored with other fields are parsed again
+        if set(values) != set(FIELDS):
+            return None
+
+        event = event_class.from_dict(values)
+        event.touch()
+        return event
+
+    def put_event(self, identifier, url, html_hash, event, expires_at=None):
+        """
+        Stores an event that has just been parsed
+        :param identifier:
+        :param url:
+        :param html_hash: hash of the html the event has been parsed from
+        :param event:
+        :param expires_at: time after which the event needs to be parsed again, e.g. because some of its fields have
+        been derived from the current date, or None if it only changes with the html
+        :return:
+        """
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute("""
+                INSERT INTO events (identifier, url, html_hash, event_hash, event, expires_at, fetched_at, parsed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (identifier) DO UPDATE SET url = excluded.url, html_hash = excluded.html_hash,
+                    event_hash = excluded.event_hash, event = excluded.event, expires_at = excluded.expires_at,
+                    fetched_at = excluded.fetched_at, parsed_at = excluded.parsed_at
+            """, (identifier, url, html_hash, get_event_hash(event), event.to_json(), expires_at, now, now))
+
+    def is_written(self, identifier, event_hash):
+        """
+        Checks if an event with the same fields has been written before
+        :param identifier:
+        :param event_hash:
+        :return:
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT written_hash FROM events WHERE identifier = ?",
+                                          (identifier,)).fetchone()
+
+        return row is not None and row[0] == event_hash
+
+    def record_write(self, identifier, url, event_hash):
+        """
+        Records that the image and content of an event have been generated
+        :param identifier:
+        :param url:
+        :param event_hash:
+        :return:
+        """
+        with self.lock:
+            self.connection.execute("""
+                INSERT INTO events (identifier, url, written_hash, written_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (identifier) DO UPDATE SET url = excluded.url, written_hash = excluded.written_hash,
+                    written_at = excluded.written_at
+            """, (identifier, url, event_hash, time.time()))
+
+
+def get_event_hash(event):
+    """
+    Returns the hash of the fields of an event, leaving out those that change without the event changing
+    :param event:
+    :return:
+    """
+    fields = {key: value for key, value in event.to_dict().items() if key not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_source_hash(file_path, *elements):
+    """
+    Returns the hash of a downloaded page and of listing entries an event is parsed from
+    :param file_path:
+    :param elements: elements of a listing page, whose tags, attributes and texts are hashed
+    :return:
+    """
+    source_hash = hashlib.sha1()
+
+    with open(file_path, 'rb') as file:
+        source_hash.update(file.read())
+
+    for element in elements:
+        for node in element.iter():
+            source_hash.update(json.dumps([str(node.tag), sorted(node.attrib.items()), node.text, node.tail])
+                               .encode())
+
+    return source_hash.hexdigest()
@@ -0,0 +1,272 @@
+import datetime
+import re
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+# Start and end of an event, each a datetime, a date if the time is unknown, or None if the range is open
+DateRange = namedtuple("DateRange", ["start", "end"])
+
+# Number of distinct values whose parsed ranges are kept, which is far more than a single listing contains
+DATE_CACHE_SIZE = 4096
+
+# Months by their lower case German names, abbreviations and numbers
+MONTHS = {
+    "januar": 1, "jan": 1, "jänner": 1,
+    "februar": 2, "feb": 2,
+    "märz": 3, "mär": 3, "maerz": 3, "mrz": 3,
+    "april": 4, "apr": 4,
+    "mai": 5,
+    "juni": 6, "jun": 6,
+    "juli": 7, "jul": 7,
+    "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9,
+    "oktober": 10, "okt": 10,
+    "november": 11, "nov": 11,
+    "dezember": 12, "dez": 12,
+}
+MONTHS.update({f"{number:02d}": number for number in range(1, 13)})
+MONTHS.update({str(number): number for number in range(1, 13)})
+
+# Labels in front of dates, which are ignored
+LABEL = re.compile(r'^(?:Laufzeit|Datum|Termin)\s*:?\s*', re.IGNORECASE)
+
+# Optional name of a weekday like "Di, ", "Di. " or "Dienstag, ", which is any word apart from those opening a range
+WEEKDAY = r'(?:(?!(?:bis|seit)\b)[^\W\d_]{2,}\.?,?\s+)?'
+
+# Words and dashes between the start and end of a range
+SEPARATOR = r'\s*(?:-|–|—|bis)\s*'
+
+
+def date_pattern(prefix):
+    """
+    Returns a pattern matching dates like "12.03.2024", "12. März 2024" or "Di, 12. Mär. 2024"
+    :param prefix: prefix of the group names
+    :return:
+    """
+    return rf'{WEEKDAY}(?P<{prefix}_day>\d{{1,2}})\.?\s*(?P<{prefix}_month>\d{{1,2}}\.?|[^\W\d_]+\.?)\s*' \
+           rf'(?P<{prefix}_year>\d{{4}})'
+
+
+def time_pattern(prefix):
+    """
+    Returns a pattern matching times like "19:00", "19.00 Uhr", "um 19:00 Uhr" or "19 Uhr"
+    :param prefix: prefix of the group names
+    :return:
+    """
+    return rf'(?:um\s+)?(?P<{prefix}_hour>\d{{1,2}})(?:[:.](?P<{prefix}_minute>\d{{2}})(?:\s*Uhr)?|\s*Uhr)'
+
+
+# Date formats found on the crawled sites as name, pattern and whether the range has no end, tried in order. Each
+# pattern matches the start of a value, so that notes following the dates like "(Einlass 17:30)" are ignored, which
+# is why longer formats come before those matching a part of them
+DATE_PATTERNS = [
+    # "Di, 12.03.2024 bis Fr, 15.03.2024" (berlin.de), "Di. 12. März 2024, 19.00 Uhr - Mi. 13. März 2024, 10.00 Uhr"
+    # (Böll), "12.03.2024, 19:00 - 13.03.2024, 12:00" (Rosalux)
+    ("date range", rf'{date_pattern("start")}(?:,?\s*{time_pattern("start")})?{SEPARATOR}'
+                   rf'{date_pattern("end")}(?:,?\s*{time_pattern("end")})?', False),
+    # "12.03.2024, 19:00 - 21:00" (Rosalux), "12. Mär 2024, 19:00 - 21:00 Uhr" (LFR), "Di. 12. März 2024 19.00 21.00"
+    # (Böll)
+    ("time range", rf'{date_pattern("start")},?\s*{time_pattern("start")}(?:{SEPARATOR}|\s+){time_pattern("end")}',
+     False),
+    # "Di, 12. März 2024, 19:00 Uhr" (berlin.de), "12. März 2024 um 19:00 Uhr" (FFBIZ)
+    ("date time", rf'{date_pattern("start")},?\s*{time_pattern("start")}', False),
+    # "Di. 12. März 2024" (Böll), "12. März 2024" (FFBIZ, LFR)
+    ("date", date_pattern("start"), False),
+    # "bis Fr, 15.03.2024" (berlin.de)
+    ("until", rf'bis\s+{date_pattern("end")}', False),
+    # "seit 12.03.2024" (berlin.de)
+    ("since", rf'seit\s+{date_pattern("start")}', True),
+    # "seit März 2020" (berlin.de)
+    ("since month", r'seit\s+(?P<start_month>[^\W\d_]+\.?)\s*(?P<start_year>\d{4})', True),
+]
+
+# A match must not end within a number, e.g. within the year of an end that does not match
+DATE_PARSERS = [(name, re.compile(rf'(?:{pattern})(?!\d)', re.IGNORECASE), open_end)
+                for name, pattern, open_end in DATE_PATTERNS]
+
+# Examples of every date format for the benchmark by the name of the pattern they are parsed by
+DATE_SAMPLES = {
+    "date range": ["Di, 12.03.2024 bis Fr, 15.03.2024", "Laufzeit: Mo, 01.04.2024 bis So, 30.06.2024",
+                   "Di. 12. März 2024, 19.00 Uhr - Mi. 13. März 2024, 10.00 Uhr",
+                   "12.03.2024, 19:00 - 13.03.2024, 12:00"],
+    "time range": ["12.03.2024, 19:00 - 21:00", "12. Mär 2024, 19:00 - 21:00 Uhr", "Di. 12. März 2024 19.00 21.00"],
+    "date time": ["Di, 12. März 2024, 19:00 Uhr", "12. März 2024 um 19:00 Uhr", "5. 03 2024, 18:30 Uhr",
+                  "Sa. 12.03.2022, 18 Uhr (Einlass 17:30)"],
+    "date": ["Di. 12. März 2024", "12. März 2024", "5. Dez 2024"],
+    "until": ["bis Fr, 15.03.2024"],
+    "since": ["Laufzeit: seit 12.03.2024"],
+    "since month": ["Laufzeit: seit März 2020"],
+}
+
+
+def parse_date_range(value):
+    """
+    Parses a date, a date and time or a range of them in any of the formats found on the crawled sites
+    :param value:
+    :return: range, or None if the value does not match any format
+    """
+    return parse_date_range_cached(value)[1] if value is not None else None
+
+
+def parse_date_ranges(values):
+    """
+    Parses many values at once, each distinct value only once
+    :param values:
+    :return: ranges in the order of the values
+    """
+    date_ranges = {value: parse_date_range(value) for value in set(values)}
+    return [date_ranges[value] for value in values]
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_range_cached(value):
+    """
+    Parses a value, remembering the result as the same dates are listed for many events
+    :param value:
+    :return: name of the matching pattern and range, or None and None
+    """
+    value = LABEL.sub("", " ".join(value.split()))
+
+    for name, parser, open_end in DATE_PARSERS:
+        match = parser.match(value)
+
+        if match is not None:
+            try:
+                return name, build_date_range(match.groupdict(), open_end)
+            except (KeyError, ValueError):
+                # Unknown month names and impossible dates like the 31st of February
+                return None, None
+
+    return None, None
+
+
+def build_date_range(groups, open_end):
+    """
+    Creates a range from the groups of a matching pattern, filling in parts of the end that are left out
+    :param groups:
+    :param open_end: whether a range without an end lasts indefinitely rather than only as long as its start
+    :return:
+    """
+    start_date = get_date(groups, "start")
+    start = combine_date_time(start_date, get_time(groups, "start"))
+    end_date = get_date(groups, "end")
+    end_time = get_time(groups, "end")
+
+    if end_date is None and end_time is None:
+        end = None if open_end else start
+    else:
+        end = combine_date_time(end_date or start_date, end_time)
+
+    return DateRange(start, end)
+
+
+def get_date(groups, prefix):
+    """
+    Returns the date of the groups with a prefix, the first of the month if the day is left out
+    :param groups:
+    :param prefix:
+    :return: date or None
+    """
+    year = groups.get(f"{prefix}_year")
+
+    if year is None:
+        return None
+
+    month = MONTHS[groups[f"{prefix}_month"].rstrip(".").lower()]
+    return datetime.date(int(year), month, int(groups.get(f"{prefix}_day") or 1))
+
+
+def get_time(groups, prefix):
+    """
+    Returns the time of the groups with a prefix
+    :param groups:
+    :param prefix:
+    :return: time or None
+    """
+    hour = groups.get(f"{prefix}_hour")
+    return datetime.time(int(hour), int(groups[f"{prefix}_minute"] or 0)) if hour is not None else None
+
+
+def combine_date_time(date, time_of_day):
+    """
+    Combines a date and a time, keeping only the date if the time is unknown
+    :param date:
+    :param time_of_day:
+    :return:
+    """
+    if date is None or time_of_day is None:
+        return date
+
+    return datetime.datetime.combine(date, time_of_day)
+
+
+def format_date_value(value, midnight=False):
+    """
+    Formats a date or datetime like it is stored in events
+    :param value:
+    :param midnight: whether dates without a time are stored as the datetime of their midnight
+    :return:
+    """
+    if value is None:
+        return ""
+
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S.000')
+
+    if midnight:
+        return value.strftime('%Y-%m-%dT00:00:00.000')
+
+    return value.isoformat()
+
+
+def format_date_range(date_range, midnight=False):
+    """
+    Formats the start and end of a range like they are stored in events
+    :param date_range:
+    :param midnight: whether dates without a time are stored as the datetime of their midnight
+    :return: start and end, which are empty if the range is None
+    """
+    if date_range is None:
+        return "", ""
+
+    return format_date_value(date_range.start, midnight), format_date_value(date_range.end, midnight)
+
+
+def benchmark(samples=None, rounds=10000):
+    """
+    Measures how long parsing takes for each date format, both for new values and for values parsed before
+    :param samples: lists of values by the name of the pattern they are expected to match, DATE_SAMPLES if None
+    :param rounds: number of times each value is parsed
+    :return: lines of a table with microseconds per value
+    """
+    samples = samples if samples is not None else DATE_SAMPLES
+    lines = [f"{'pattern':<12} {'values':>6} {'uncached':>10} {'cached':>10}"]
+
+    for name, values in samples.items():
+        for value in values:
+            matched_name = parse_date_range_cached(value)[0]
+
+            if matched_name != name:
+                raise ValueError(f"{value!r} is parsed by {matched_name} rather than {name}")
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            parse_date_range_cached.cache_clear()
+            parse_date_ranges(values)
+        uncached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            parse_date_ranges(values)
+        cached = time.perf_counter() - start
+
+        lines.append(f"{name:<12} {len(values):>6} {uncached / rounds / len(values) * 1e6:>10.2f} "
+                     f"{cached / rounds / len(values) * 1e6:>10.2f}")
+
+    return lines
+
+
+if __name__ == "__main__":
+    for line in benchmark():
+        print(line)
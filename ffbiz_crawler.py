@@ -1,13 +1,14 @@
 import os
 import re
-import xml.etree.ElementTree as element_tree
-from typing import List
+from typing import Iterator
 
 import urllib3
 
-from abstract_crawler import AbstractCrawler, download_site, well_form, format_identifier, format_title, \
-    generate_content, generate_image, format_date_time, format_date
+from abstract_crawler import AbstractCrawler, CACHE_TTL_LISTING, download_site, download_ahead, well_form, \
+    format_identifier, PARSER_ETREE, parse_content, read_section
 from abstract_event import AbstractEvent
+from crawl_state import get_source_hash
+from date_parser import format_date_range, parse_date_range
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -16,80 +17,88 @@ class FfbizEvent(AbstractEvent):
     """
     Represents an event posted on https://ffbiz.de/
     """
+    __slots__ = ()
 
-    def __init__(self, identifier, url, title, subtitle, description, image, image_bucket, start_date, end_date,
-                 category, languages, fees, contact_person, contact_phone, contact_mail):
-        source = "Das feministische Archiv FFBIZ"
-        organizer = "Das feministische Archiv FFBIZ"
-        location_street = "Eldenaer Straße 35"
-        location_city = "10247 Berlin"
+    defaults = {
+        "source": "Das feministische Archiv FFBIZ",
+        "organizer": "Das feministische Archiv FFBIZ",
+        "location_street": "Eldenaer Straße 35",
+        "location_city": "10247 Berlin",
+    }
 
-        super().__init__(identifier, source, url, title, subtitle, description, image, image_bucket, start_date,
-                         end_date, category, languages, organizer, fees, contact_person, contact_phone,
-                         contact_mail, location_street, location_city)
 
-
-def transform_html(workspace_path, html_file_name, xml_file_name):
+def transform_html(workspace_path, html_file_name, xml_file_name, parser=PARSER_ETREE):
     """
-    Transforms an html file into a well-formed xml file by removing tags and attributes
+    Transforms an html file into a tree of elements
     :param workspace_path:
     :param html_file_name:
-    :param xml_file_name:
-    :return:
+    :param xml_file_name: name of the xml file written if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
     """
-    with open(os.path.join(workspace_path, html_file_name), "r") as html_file:
-        content = " ".join(html_file.read().splitlines())
-        content = re.sub(r'.*<main', "<main", content)
-        content = re.sub(r'main>.*', "main>", content)
+    content = read_section(os.path.join(workspace_path, html_file_name), "<main", "main>")
+
+    return parse_content(workspace_path, content, well_form, xml_file_name, parser)
 
-        content = well_form(content)
 
-    with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
-        xml_file.write(content)
+def transform_sub_page_html(workspace_path, html_file_name, xml_file_name, parser=PARSER_ETREE):
+    """
+    Transforms the html file of a detail page into a tree of elements
+    :param workspace_path:
+    :param html_file_name:
+    :param xml_file_name: name of the xml file written if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
+    """
+    content = read_section(os.path.join(workspace_path, html_file_name), "<article>", "/article>")
+
+    return parse_content(workspace_path, content, well_form, xml_file_name, parser)
 
 
-def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[FfbizEvent]:
+def parse_html(logger, workspace_path, html_file_name, clean, quiet, parser=PARSER_ETREE,
+               state=None) -> Iterator[FfbizEvent]:
     """
-    Parses html file into a list of events
+    Parses html file into events, which are yielded as soon as they are parsed
     :param logger:
     :param workspace_path:
     :param html_file_name:
     :param clean:
     :param quiet:
+    :param parser: parsing backend
+    :param state: state of previous runs, used to skip parsing pages that did not change
     :return:
     """
     xml_file_name = re.sub('.html$', ".xml", html_file_name)
-    transform_html(workspace_path, html_file_name, xml_file_name)
-
-    root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
-
-    events = []
+    root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
 
-    # Parse page
+    # Collect detail pages
+    entries = []
     for event in root.find('.//ul[@class="events"]'):
         link = event.find('.//a').attrib['href']
         identifier = format_identifier(re.sub(r'.*/', "", link))
+        entries.append((event, link, identifier))
+
+    # Parse page while detail pages are downloaded concurrently
+    for event, link, identifier in download_ahead(logger, workspace_path, entries,
+                                                  lambda entry: (entry[1], entry[2] + ".html"), clean, quiet):
         html_file_name = identifier + ".html"
         xml_file_name = identifier + ".xml"
+
+        # Reuse the event parsed in a previous run if neither the listing entry nor the detail page changed
+        html_hash = get_source_hash(os.path.join(workspace_path, html_file_name), event)
+        cached_event = state.get_event(identifier, html_hash, FfbizEvent) if state is not None and not clean else None
+        if cached_event is not None:
+            yield cached_event
+            continue
+
         date = event.find('.//div[@class="date"]')
-        time_raw = event.find('.//div[@class="time"]')
-        time = "" if time_raw is None else time_raw.text.replace("um ", "").replace(" Uhr", "")
-        field_date_time_with_day = format_date(("00 " + date.text.replace(".", ""))) if time == "" else \
-            (format_date_time(("00 " + date.text.replace(".", "")), time.replace(":", ".")))
+        field_time = event.find('.//div[@class="time"]')
+        date_range = parse_date_range(
+            date.text if field_time is None or field_time.text is None else f"{date.text} {field_time.text}")
         image_url = "" if event.find('.//img') is None else event.find('.//img').attrib['data-src']
         category = event.find('.//div[@class="tags"]')
-        download_site(logger, workspace_path, link, html_file_name, clean, quiet)
-        with open(os.path.join(workspace_path, html_file_name), "r") as html_file:
-            content = " ".join(html_file.read().splitlines())
-            content = re.sub(r'.*<article>', "<article>", content)
-            content = re.sub(r'/article>.*', "/article>", content)
-
-            content = well_form(content)
-
-        with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
-            xml_file.write(content)
 
-        root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
+        root = transform_sub_page_html(workspace_path, html_file_name, xml_file_name, parser)
         field_title = root.find('.//h1').text
         field_title = re.sub(r'#(\d+);', lambda m: chr(int(m.group(1))), field_title)  # convert unicode characters
         field_image = image_url #root.find('.//img').attrib['data-src']
@@ -105,10 +114,7 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Ffb
         subtitle = ""
         description = field_content.strip() if field_content is not None else ""
         image = field_image if field_image is not None else ""
-        start_date = field_date_time_with_day \
-            if field_date_time_with_day is not None and field_date_time_with_day is not None else ""
-        end_date = field_date_time_with_day \
-            if field_date_time_with_day is not None and field_date_time_with_day is not None else ""
+        start_date, end_date = format_date_range(date_range)
         category = category.text.strip() if category is not None and category.text is not None else ""
         languages = []
         fees = ""
@@ -137,44 +143,32 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Ffb
             contact_mail=contact_mail
         )
 
-        events.append(event)
+        if state is not None:
+            state.put_event(identifier, url, html_hash, event)
 
-    return events
+        yield event
 
 
 class FfbizCrawler(AbstractCrawler):
     """
     Crawls events posted on https://www.urania.de/
     """
+    name = "ffbiz"
 
     url = f"https://ffbiz.de/aktivitaeten/veranstaltungen"
 
-    def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
         """
-        Runs crawler
+        Downloads and parses the sites of the crawler
         :param logger:
         :param workspace_path:
-        :param content_path:
-        :param uploads_path:
         :param clean:
         :param quiet:
-        :return:
+        :return: events
         """
 
-        super().run(logger, workspace_path, content_path, uploads_path, clean, quiet)
-
         # Download overview site
-        download_site(logger, workspace_path, self.url, "ffbiz.html", clean, quiet)
-
-        # Parse overview site and iterate over events
-        for event in parse_html(logger, workspace_path, "ffbiz.html", clean, quiet):
-            # Generate image for event
-            generate_image(logger, workspace_path, uploads_path, event)
-
-            # Add image bucket URL
-            if event.image != "":
-                event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
-
-            # Generate content for event
-            generate_content(logger, content_path, event)
+        download_site(logger, workspace_path, self.url, "ffbiz.html", clean, quiet, CACHE_TTL_LISTING)
 
+        # Parse overview site
+        yield from parse_html(logger, workspace_path, "ffbiz.html", clean, quiet, self.parser, self.state)
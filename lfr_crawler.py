@@ -1,13 +1,13 @@
 import os
 import re
-import xml.etree.ElementTree as element_tree
-from typing import List
+from typing import Iterator
 
 import urllib3
 
-from abstract_crawler import AbstractCrawler, download_site, well_form, format_title, format_identifier, \
-    format_date_split, format_date_time_start, format_date_time_end, generate_content, generate_image
+from abstract_crawler import AbstractCrawler, CACHE_TTL_LISTING, download_site, well_form, format_title, \
+    format_identifier, PARSER_ETREE, parse_content, read_section
 from abstract_event import AbstractEvent
+from date_parser import format_date_range, parse_date_range
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -16,52 +16,38 @@ class LfrEvent(AbstractEvent):
     """
     Represents an event posted on https://www.landesfrauenrat-berlin.de/veranstaltungen-in-berlin/
     """
+    __slots__ = ()
 
-    def __init__(self, identifier, url, title, subtitle, description, image, image_bucket, start_date, end_date,
-                 category, languages, organizer, fees, contact_person, contact_phone, contact_mail, location_street,
-                 location_city):
-        source = "Landesfrauenrat Berlin"
+    defaults = {"source": "Landesfrauenrat Berlin"}
 
-        super().__init__(identifier, source, url, title, subtitle, description, image, image_bucket, start_date,
-                         end_date, category, languages, organizer, fees, contact_person, contact_phone, contact_mail,
-                         location_street, location_city)
 
-
-def transform_html(workspace_path, html_file_name, xml_file_name):
+def transform_html(workspace_path, html_file_name, xml_file_name, parser=PARSER_ETREE):
     """
-    Transforms an html file into a well-formed xml file by removing tags and attributes
+    Transforms an html file into a tree of elements
     :param workspace_path:
     :param html_file_name:
-    :param xml_file_name:
-    :return:
+    :param xml_file_name: name of the xml file written if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
     """
-    with open(os.path.join(workspace_path, html_file_name), "r") as html_file:
-        content = " ".join(html_file.read().splitlines())
-        content = re.sub(r'.*<body', "<body", content)
-        content = re.sub(r'body>.*', "body>", content)
-
-        content = well_form(content)
+    content = read_section(os.path.join(workspace_path, html_file_name), "<body", "body>")
 
-    with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
-        xml_file.write(content)
+    return parse_content(workspace_path, content, well_form, xml_file_name, parser)
 
 
-def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[AbstractEvent]:
+def parse_html(logger, workspace_path, html_file_name, clean, quiet, parser=PARSER_ETREE) -> Iterator[AbstractEvent]:
     """
-    Parses html file into a list of events
+    Parses html file into events, which are yielded as soon as they are parsed
     :param logger:
     :param workspace_path:
     :param html_file_name:
     :param clean:
     :param quiet:
+    :param parser: parsing backend
     :return:
     """
     xml_file_name = re.sub('.html$', ".xml", html_file_name)
-    transform_html(workspace_path, html_file_name, xml_file_name)
-
-    root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
-
-    events = []
+    root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
 
     # Parse page
     event_views = root.findall('.//ul[@class="event-list-view"]')
@@ -91,19 +77,15 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Abs
             image = ""
 
             if field_year is not None and field_year.text is not None and \
-                    field_month is not None and field_month.text is not None and \
-                    field_day is not None and field_day.text is not None and \
-                    field_time is not None and field_time.text is not None:
-                start_date = format_date_time_start(field_year.text, field_month.text, field_day.text, field_time.text)
-                end_date = format_date_time_end(field_year.text, field_month.text, field_day.text, field_time.text)
-            elif field_year is not None and field_year.text is not None and \
                     field_month is not None and field_month.text is not None and \
                     field_day is not None and field_day.text is not None:
-                start_date = format_date_split(field_year.text, field_month.text, field_day.text)
-                end_date = format_date_split(field_year.text, field_month.text, field_day.text)
+                date = f"{field_day.text}. {field_month.text} {field_year.text}"
+                date_range = parse_date_range(f"{date}, {field_time.text}" if field_time is not None and
+                                              field_time.text is not None else date)
             else:
-                start_date = ""
-                end_date = ""
+                date_range = None
+
+            start_date, end_date = format_date_range(date_range)
 
             category = ""
             languages = [
@@ -140,43 +122,29 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Abs
                 location_city=location_city
             )
 
-            events.append(event)
-
-    return events
+            yield event
 
 
 class LfrCrawler(AbstractCrawler):
     """
     Crawls events posted on https://www.landesfrauenrat-berlin.de/veranstaltungen-in-berlin/
     """
+    name = "lfr"
 
     url = f"https://www.landesfrauenrat-berlin.de/veranstaltungen-in-berlin/"
 
-    def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
         """
-        Runs crawler
+        Downloads and parses the sites of the crawler
         :param logger:
         :param workspace_path:
-        :param content_path:
-        :param uploads_path:
         :param clean:
         :param quiet:
-        :return:
+        :return: events
         """
 
-        super().run(logger, workspace_path, content_path, uploads_path, clean, quiet)
-
         # Download overview site
-        download_site(logger, workspace_path, self.url, "lfr.html", clean, quiet)
-
-        # Parse overview site and iterate over events
-        for event in parse_html(logger, workspace_path, "lfr.html", clean, quiet):
-            # Generate image for event
-            generate_image(logger, workspace_path, uploads_path, event)
-
-            # Add image bucket URL
-            if event.image != "":
-                event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
+        download_site(logger, workspace_path, self.url, "lfr.html", clean, quiet, CACHE_TTL_LISTING)
 
-            # Generate content for event
-            generate_content(logger, content_path, event)
+        # Parse overview site
+        yield from parse_html(logger, workspace_path, "lfr.html", clean, quiet, self.parser)
@@ -0,0 +1,333 @@
+import re
+import time
+from collections import namedtuple
+
+Rule = namedtuple("Rule", ["pattern", "replacement", "flags", "literal"])
+
+# Number of rules of a pass whose patterns need to occur in a document for one scan with an alternation of them to be
+# faster than a str.replace per pattern. The regular expression engine stops at every character a pattern starts with,
+# which is slow for characters like "<" that are everywhere in html, while str.replace skips ahead much faster.
+COMBINED_SCAN_MIN_RULES = 3
+
+
+def regex_rule(pattern, replacement, flags=0):
+    """
+    Defines a rule that replaces all matches of a regular expression like re.sub
+    :param pattern:
+    :param replacement: replacement which may reference groups of the pattern
+    :param flags:
+    :return:
+    """
+    return Rule(pattern, replacement, flags, False)
+
+
+def literal_rule(pattern, replacement):
+    """
+    Defines a rule that replaces all occurrences of a string like str.replace
+    :param pattern:
+    :param replacement:
+    :return:
+    """
+    return Rule(pattern, replacement, 0, True)
+
+
+class RewriteProfile:
+    """
+    Collects time and hit counts per rule of a rewrite engine
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.seconds = 0.0
+        self.rule_hits = {}
+        self.rule_seconds = {}
+
+    def record_rule(self, rule, hits, seconds):
+        self.rule_hits[rule] = self.rule_hits.get(rule, 0) + hits
+        self.rule_seconds[rule] = self.rule_seconds.get(rule, 0.0) + seconds
+
+    def report(self):
+        """
+        Returns one line per rule, most expensive rules first
+        :return:
+        """
+        lines = [f"{self.documents} documents rewritten in {self.seconds * 1000:.2f} ms"]
+
+        for rule in sorted(self.rule_seconds, key=self.rule_seconds.get, reverse=True):
+            lines.append(f"{self.rule_seconds[rule] * 1000:8.2f} ms {self.rule_hits[rule]:6d} hits  {rule.pattern!r}")
+
+        return lines
+
+
+class RewritePass:
+    """
+    Applies a single rule, or consecutive literal rules that do not interact in one scan
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.regex = re.compile(rules[0].pattern, rules[0].flags) if not rules[0].literal else None
+        self.regexes = {}
+
+        # Text removed by a rule joins the text around it, which may form an occurrence of a following rule
+        self.removals = {index for index, rule in enumerate(rules[:-1]) if rule.literal and not rule.replacement}
+
+    def get_regex(self, indexes):
+        """
+        Returns one alternation of the patterns of some rules, the matched text tells which rule it belongs to
+        :param indexes: indexes of the rules
+        :return:
+        """
+        if indexes not in self.regexes:
+            self.regexes[indexes] = re.compile("|".join(re.escape(self.rules[index].pattern) for index in indexes))
+
+        return self.regexes[indexes]
+
+    def apply(self, value, hits=None):
+        """
+        Rewrites a value
+        :param value:
+        :param hits: optional list that counts the matches per rule
+        :return:
+        """
+        if len(self.rules) == 1:
+            rule = self.rules[0]
+
+            if rule.literal:
+                if hits is not None:
+                    hits[0] += value.count(rule.pattern)
+
+                return value.replace(rule.pattern, rule.replacement)
+
+            value, count = self.regex.subn(rule.replacement, value)
+
+            if hits is not None:
+                hits[0] += count
+
+            return value
+
+        # Searching for a string is much faster than scanning with a regular expression, so the scan only looks for
+        # the patterns that occur
+        indexes = tuple(index for index, rule in enumerate(self.rules) if rule.pattern in value)
+
+        if not indexes:
+            return value
+
+        if len(indexes) < COMBINED_SCAN_MIN_RULES:
+            result = value
+
+            for index in indexes:
+                rule = self.rules[index]
+
+                if hits is not None:
+                    hits[index] += result.count(rule.pattern)
+
+                result = result.replace(rule.pattern, rule.replacement)
+        else:
+            replacements = {self.rules[index].pattern: (index, self.rules[index].replacement) for index in indexes}
+
+            def replace(match):
+                index, replacement = replacements[match.group()]
+
+                if hits is not None:
+                    hits[index] += 1
+
+                return replacement
+
+            result = self.get_regex(indexes).sub(replace, value)
+
+        # An occurrence formed by a removal is left in the result, as no replacement contains the patterns following a
+        # removal, so the rules are applied one after another if there is one
+        removed = [index for index in indexes if index in self.removals]
+
+        if removed and any(rule.pattern in result for rule in self.rules[removed[0] + 1:]):
+            if hits is not None:
+                hits[:] = [0] * len(self.rules)
+
+            for index, rule in enumerate(self.rules):
+                if hits is not None:
+                    hits[index] += value.count(rule.pattern)
+
+                value = value.replace(rule.pattern, rule.replacement)
+
+            return value
+
+        return result
+
+
+class RewriteEngine:
+    """
+    Rewrites documents with an ordered list of rules in as few scans as possible
+
+    Rules are grouped into stages, and a later stage sees the output of the previous one. The rules of a stage are
+    compiled once into passes, where each run of consecutive literal rules whose patterns and replacements cannot
+    overlap is combined into a single scan with one alternation. Regular expressions keep a pass of their own, which is
+    a plain re.sub, as their matches may depend on the replacements of earlier rules.
+    """
+
+    def __init__(self, *stages):
+        self.stages = [list(stage) for stage in stages]
+        self.passes = [[RewritePass(rules) for rules in split_stage(stage)] for stage in self.stages]
+        self.profile = None
+
+    def start_profiling(self):
+        """
+        Starts collecting time and hit counts per rule
+        :return: profile
+        """
+        self.profile = RewriteProfile()
+        return self.profile
+
+    def stop_profiling(self):
+        """
+        Stops collecting time and hit counts per rule
+        :return: profile
+        """
+        profile, self.profile = self.profile, None
+        return profile
+
+    def rewrite(self, value):
+        """
+        Rewrites a value with all rules
+        :param value:
+        :return:
+        """
+        if self.profile is not None:
+            return self.rewrite_profiled(value, self.profile)
+
+        for stage_passes in self.passes:
+            for rewrite_pass in stage_passes:
+                value = rewrite_pass.apply(value)
+
+        return value
+
+    def rewrite_profiled(self, value, profile):
+        """
+        Rewrites a value with all rules and records time and hit counts per rule
+        :param value:
+        :param profile:
+        :return:
+        """
+        start = time.perf_counter()
+
+        for stage, stage_passes in zip(self.stages, self.passes):
+            # Time each rule as a standalone scan over the input of its stage
+            for rule in stage:
+                rule_start = time.perf_counter()
+                apply_rule(rule, value)
+                profile.record_rule(rule, 0, time.perf_counter() - rule_start)
+
+            for rewrite_pass in stage_passes:
+                hits = [0] * len(rewrite_pass.rules)
+                value = rewrite_pass.apply(value, hits)
+
+                for rule, rule_hits in zip(rewrite_pass.rules, hits):
+                    profile.record_rule(rule, rule_hits, 0.0)
+
+        profile.documents += 1
+        profile.seconds += time.perf_counter() - start
+        return value
+
+    def rewrite_sequential(self, value):
+        """
+        Rewrites a value by applying one rule after another
+        :param value:
+        :return:
+        """
+        for stage in self.stages:
+            for rule in stage:
+                value = apply_rule(rule, value)
+
+        return value
+
+    def verify(self, value):
+        """
+        Checks that the compiled passes produce the same result as applying one rule after another
+        :param value:
+        :return:
+        """
+        return self.rewrite(value) == self.rewrite_sequential(value)
+
+
+def apply_rule(rule, value):
+    """
+    Applies a single rule to a value
+    :param rule:
+    :param value:
+    :return:
+    """
+    if rule.literal:
+        return value.replace(rule.pattern, rule.replacement)
+    else:
+        return re.sub(rule.pattern, rule.replacement, value, flags=rule.flags)
+
+
+def split_stage(rules):
+    """
+    Splits the rules of a stage into passes
+
+    Consecutive literal rules are combined into one pass as long as a single scan gives the same result as applying
+    them one after another. Every regular expression gets a pass of its own.
+    :param rules:
+    :return:
+    """
+    passes = []
+
+    for rule in rules:
+        if passes and combinable(passes[-1], rule):
+            passes[-1].append(rule)
+        else:
+            passes.append([rule])
+
+    return passes
+
+
+def combinable(earlier_rules, later):
+    """
+    Checks if a rule can be applied in the same scan as a list of earlier rules
+
+    Occurrences of the patterns must not overlap each other or themselves, so that a scan finds the same occurrences
+    as applying the rules one after another, and replacements must not form an occurrence of a later pattern with the
+    text around them. Removals are checked when they are applied, as any text may come together where they remove
+    something, which requires that no replacement contains a pattern following a removal.
+    :param earlier_rules:
+    :param later:
+    :return:
+    """
+    if not later.literal or not later.pattern or overlaps_itself(later.pattern):
+        return False
+
+    removals = [index for index, earlier in enumerate(earlier_rules) if not earlier.replacement]
+
+    if removals and (later.pattern in later.replacement or
+                     any(earlier.pattern in later.replacement for earlier in earlier_rules[removals[0] + 1:])):
+        return False
+
+    return all(earlier.literal and not overlaps_itself(earlier.pattern) and
+               not overlaps(earlier.pattern, later.pattern) and not overlaps(later.pattern, earlier.pattern) and
+               (not earlier.replacement or not overlaps(earlier.replacement, later.pattern))
+               for earlier in earlier_rules)
+
+
+def overlaps(value, pattern):
+    """
+    Checks if a pattern may match text that includes at least one character of a value and text around it
+    :param value:
+    :param pattern:
+    :return:
+    """
+    if value in pattern or pattern in value:
+        return True
+
+    # The pattern starts within the value or ends within it
+    return any(value.endswith(pattern[:length]) or value.startswith(pattern[-length:])
+               for length in range(1, min(len(value), len(pattern))))
+
+
+def overlaps_itself(pattern):
+    """
+    Checks if two occurrences of a pattern may overlap, like "aa" does in "aaa"
+    :param pattern:
+    :return:
+    """
+    return any(pattern.endswith(pattern[:length]) for length in range(1, len(pattern)))
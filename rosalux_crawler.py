@@ -1,88 +1,92 @@
 import os
 import re
-import xml.etree.ElementTree as element_tree
-from typing import List
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service as ChromeService
+import time
+from typing import Iterator
+from urllib.parse import urlencode, urljoin
 
+import lxml.html
 import urllib3
 
-from abstract_crawler import AbstractCrawler, download_site, well_form, format_title, format_identifier, \
-    format_date_time, format_date_times, format_date, generate_content, generate_image, format_date_time_start, \
-    format_date_time_end
+from abstract_crawler import AbstractCrawler, CACHE_TTL_LISTING, download_site, download_ahead, http_get, \
+    is_cache_fresh, WELL_FORM_RULES, format_title, format_identifier, PARSER_ETREE, parse_content, read_section
 from abstract_event import AbstractEvent
+from crawl_archive import ARCHIVE_REPLAY, METHOD_BROWSER, get_archive
+from crawl_state import get_source_hash
+from date_parser import format_date_range, parse_date_range
+from rewrite_engine import RewriteEngine, literal_rule, regex_rule
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Ways of fetching search results
+FETCH_HTTP = "http"
+FETCH_BROWSER = "browser"
+
+# Place to search events for
+SEARCH_PLACE = "Berlin"
+
 
 class RosaluxEvent(AbstractEvent):
     """
     Represents an event posted on https://calendar.boell.de/
     """
-
-    def __init__(self, identifier, url, title, subtitle, description, image, image_bucket, start_date, end_date,
-                 category, languages, organizer, fees, contact_person, contact_phone, contact_mail, location_street,
-                 location_city):
-        source = "Rosa Luxemburg Stiftung"
-
-        super().__init__(identifier, source, url, title, subtitle, description, image, image_bucket, start_date,
-                         end_date, category, languages, organizer, fees, contact_person, contact_phone, contact_mail,
-                         location_street, location_city)
-
-
-def transform_html(workspace_path, html_file_name, xml_file_name):
+    __slots__ = ()
+
+    defaults = {"source": "Rosa Luxemburg Stiftung"}
+
+
+# Rules applied before and after the rules that make a document well-formed
+TRANSFORM_ENGINE = RewriteEngine([
+    literal_rule("<BLOCKQUOTE>", "<blockquote>"),
+    literal_rule("<HR>", ""),
+], WELL_FORM_RULES, [
+    regex_rule(r'id=c\d{5}', ""),
+    literal_rule("lang=AR-SA", ""),
+    literal_rule("dir=ltr", ""),
+    literal_rule("lang=AR-SY", ""),
+    literal_rule("dir=rtl", ""),
+    literal_rule("</A>", ""),
+    literal_rule("class=slider", ""),
+    literal_rule("class=slider__body", ""),
+    literal_rule("class=textmedia__text", ""),
+    literal_rule('class=""slider__header""', ''),
+])
+
+
+def transform_html(workspace_path, html_file_name, xml_file_name, parser=PARSER_ETREE):
     """
-    Transforms an html file into a well-formed xml file by removing tags and attributes
+    Transforms an html file into a tree of elements
     :param workspace_path:
     :param html_file_name:
-    :param xml_file_name:
-    :return:
+    :param xml_file_name: name of the xml file written if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
     """
-    with open(os.path.join(workspace_path, html_file_name), "r") as html_file:
-        content = " ".join(html_file.read().splitlines())
-        content = re.sub(r'.*<main', "<main", content)
-        content = re.sub(r'main>.*', "main>", content)
-        content = content.replace("<BLOCKQUOTE>", "<blockquote>")
-        content = content.replace("<HR>", "")
-
-        content = well_form(content)
-        content = re.sub(r'id=c\d{5}', "", content)
-        content = content.replace("lang=AR-SA", "")
-        content = content.replace("dir=ltr", "")
-        content = content.replace("lang=AR-SY", "")
-        content = content.replace("dir=rtl", "")
-        content = content.replace("</A>", "")
-        content = content.replace("class=slider", "")
-        content = content.replace("class=slider__body", "")
-        content = content.replace("class=textmedia__text", "")
-        content = content.replace('class=""slider__header""', '')
-    with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
-        xml_file.write(content)
-
-
-def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[RosaluxEvent]:
+    content = read_section(os.path.join(workspace_path, html_file_name), "<main", "main>")
+
+    return parse_content(workspace_path, content, TRANSFORM_ENGINE.rewrite, xml_file_name, parser)
+
+
+def parse_html(logger, workspace_path, html_file_name, clean, quiet, parser=PARSER_ETREE,
+               state=None) -> Iterator[RosaluxEvent]:
     """
-    Parses html file into a list of events
+    Parses html file into events, which are yielded as soon as they are parsed
     :param logger:
     :param workspace_path:
     :param html_file_name:
     :param clean:
     :param quiet:
+    :param parser: parsing backend
+    :param state: state of previous runs, used to skip parsing pages that did not change
     :return:
     """
     xml_file_name = re.sub('.html$', ".xml", html_file_name)
-    transform_html(workspace_path, html_file_name, xml_file_name)
-
-    root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
-
-    events = []
+    root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
 
     event_list = root.findall('.//div[@class="elasticsearch__list"]')
     if event_list:
 
-        # Parse page
+        # Collect detail pages
+        entries = []
         for event_view in root.findall('.//div[@class="elasticsearch__list"]')[0]:
             link_element = event_view.find('.//div[@class="teaser teaser--event"]/a')
 
@@ -92,148 +96,162 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Ros
                 identifier = format_identifier(re.sub(r'.*/', "", link))
                 url = f"https://rosalux.de{link}"
 
-                html_file_name = identifier + ".html"
-                xml_file_name = identifier + ".xml"
-
-                field_subtitle = event_view.find('.//p[@class="teaser__text"]')
-                field_category = event_view.find('.//b[@class="teaser__event-type"]')
-                field_title = field_category.tail.strip()
-
-                download_site(logger, workspace_path, url, html_file_name, clean, quiet)
-                transform_html(workspace_path, html_file_name, xml_file_name)
-
-                root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
-
-                field_image = root.find('.//div[@class="textmedia__image-liner"]/img')
-                field_date_time = root.findall('.//p[@class="news__meta-text"]').pop(1)
-                # field_spoken_language = root.findall('.//dl[@class="field--spoken-language"]/dd')
-                street = root.find('.//span[@itemprop="streetAddress"]')
-                postalCode = root.find('.//span[@itemprop="postalCode"]')
-                locality = root.find('.//span[@itemprop="addressLocality"]')
-                field_location = f"{street.text.strip()} {postalCode.text} {locality.text}"
-                field_organizer = "Rosa-Luxemburg-Stiftung"
-                # field_fee = root.find('.//div[@class="field--spoken-language"]/dd')
-                field_content = ""
-                for paragraph in root.find('.//div[@class="textmedia__text"]'):
-                    if paragraph.text is not None:
-                        field_content += f'{paragraph.text}\n'
-
-                title = format_title(field_title) if field_title is not None and field_title is not None else ""
-                subtitle = field_subtitle.text.strip() if field_subtitle is not None and field_subtitle.text is not None else ""
-                description = field_content.strip() if field_content is not None and field_content is not None else ""
-                image = field_image.attrib["src"].strip() if field_image is not None and \
-                                                             field_image.attrib["src"] is not None else ""
-                field_contact_name = root.find('.//div[@class="person__column person__column--first"]/h4')
-                field_contact_email = root.find(
-                    './/div[@class="person__column person__column--second"]/p[@class="person__info person__info--email"]/a')
-
-                if field_date_time is not None and field_date_time.text is not None:
-
-                    start_date_raw = field_date_time.text.strip().split("-")[0]
-                    end_date_raw = field_date_time.text.strip().split("-")[1].strip()
-                    start_date = format_date_time_start(start_date_raw.split(",")[0].split(".")[2],
-                                                        start_date_raw.split(",")[0].split(".")[1],
-                                                        start_date_raw.split(",")[0].split(".")[0],
-                                                        start_date_raw.split(",")[1], ":")
-                    if end_date_raw.__contains__(","):
-                        end_date = format_date_time_end(end_date_raw.split(",")[0].split(".")[2],
-                                                        end_date_raw.split(",")[0].split(".")[1],
-                                                        end_date_raw.split(",")[0].split(".")[0],
-                                                        end_date_raw.split(",")[1], ":")
-                    else:
-                        end_date = format_date_time_end(start_date_raw.split(",")[0].split(".")[2],
-                                                        start_date_raw.split(",")[0].split(".")[1],
-                                                        start_date_raw.split(",")[0].split(".")[0],
-                                                        end_date_raw, ":")
-
-                else:
-                    start_date = ""
-                    end_date = ""
-
-                category = field_category.text.strip() if field_category is not None and field_category.text is not None else ""
-
-                languages = []
-
-                # location = field_location.text.strip() if field_location is not None and field_location.text is not None
-                # else ""
-                organizer = field_organizer.strip() \
-                    if field_organizer is not None and field_organizer is not None else ""
-                fees = ""
-
-                contact_person = field_contact_name
-                contact_phone = ""
-                contact_mail = field_contact_email
-
-                location_street = street
-                location_city = locality
-
-                event = RosaluxEvent(
-                    identifier=identifier,
-                    url=url,
-                    title=title,
-                    subtitle=subtitle,
-                    description=description,
-                    image=image,
-                    image_bucket=None,
-                    start_date=start_date,
-                    end_date=end_date,
-                    category=category,
-                    languages=languages,
-                    organizer=organizer,
-                    fees=fees,
-                    contact_person=contact_person,
-                    contact_phone=contact_phone,
-                    contact_mail=contact_mail,
-                    location_street=location_street,
-                    location_city=location_city
-                )
-
-                events.append(event)
-            else:
-                pass
-
-    return events
+                entries.append((event_view, url, identifier))
+
+        # Parse page while detail pages are downloaded concurrently
+        for event_view, url, identifier in download_ahead(logger, workspace_path, entries,
+                                                          lambda entry: (entry[1], entry[2] + ".html"), clean, quiet):
+            html_file_name = identifier + ".html"
+            xml_file_name = identifier + ".xml"
+
+            # Reuse the event parsed in a previous run if neither the listing entry nor the detail page changed
+            html_hash = get_source_hash(os.path.join(workspace_path, html_file_name), event_view)
+            cached_event = state.get_event(identifier, html_hash, RosaluxEvent) \
+                if state is not None and not clean else None
+            if cached_event is not None:
+                yield cached_event
+                continue
+
+            field_subtitle = event_view.find('.//p[@class="teaser__text"]')
+            field_category = event_view.find('.//b[@class="teaser__event-type"]')
+            field_title = field_category.tail.strip()
+
+            root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
+
+            field_image = root.find('.//div[@class="textmedia__image-liner"]/img')
+            field_date_time = root.findall('.//p[@class="news__meta-text"]').pop(1)
+            # field_spoken_language = root.findall('.//dl[@class="field--spoken-language"]/dd')
+            street = root.find('.//span[@itemprop="streetAddress"]')
+            postalCode = root.find('.//span[@itemprop="postalCode"]')
+            locality = root.find('.//span[@itemprop="addressLocality"]')
+            field_location = f"{street.text.strip()} {postalCode.text} {locality.text}"
+            field_organizer = "Rosa-Luxemburg-Stiftung"
+            # field_fee = root.find('.//div[@class="field--spoken-language"]/dd')
+            field_content = ""
+            for paragraph in root.find('.//div[@class="textmedia__text"]'):
+                if paragraph.text is not None:
+                    field_content += f'{paragraph.text}\n'
+
+            title = format_title(field_title) if field_title is not None and field_title is not None else ""
+            subtitle = field_subtitle.text.strip() if field_subtitle is not None and field_subtitle.text is not None else ""
+            description = field_content.strip() if field_content is not None and field_content is not None else ""
+            image = field_image.attrib["src"].strip() if field_image is not None and \
+                                                         field_image.attrib["src"] is not None else ""
+            field_contact_name = root.find('.//div[@class="person__column person__column--first"]/h4')
+            field_contact_email = root.find(
+                './/div[@class="person__column person__column--second"]/p[@class="person__info person__info--email"]/a')
+
+            start_date, end_date = format_date_range(
+                parse_date_range(field_date_time.text if field_date_time is not None else None))
+
+            category = field_category.text.strip() if field_category is not None and field_category.text is not None else ""
+
+            languages = []
+
+            # location = field_location.text.strip() if field_location is not None and field_location.text is not None
+            # else ""
+            organizer = field_organizer.strip() \
+                if field_organizer is not None and field_organizer is not None else ""
+            fees = ""
+
+            contact_person = field_contact_name.text.strip() \
+                if field_contact_name is not None and field_contact_name.text is not None else ""
+            contact_phone = ""
+            contact_mail = field_contact_email.text.strip() \
+                if field_contact_email is not None and field_contact_email.text is not None else ""
+
+            location_street = street.text.strip() if street is not None and street.text is not None else ""
+            location_city = locality.text.strip() if locality is not None and locality.text is not None else ""
+
+            event = RosaluxEvent(
+                identifier=identifier,
+                url=url,
+                title=title,
+                subtitle=subtitle,
+                description=description,
+                image=image,
+                image_bucket=None,
+                start_date=start_date,
+                end_date=end_date,
+                category=category,
+                languages=languages,
+                organizer=organizer,
+                fees=fees,
+                contact_person=contact_person,
+                contact_phone=contact_phone,
+                contact_mail=contact_mail,
+                location_street=location_street,
+                location_city=location_city
+            )
+
+            if state is not None:
+                state.put_event(identifier, url, html_hash, event)
+
+            yield event
 
 
 def download_file_with_webdriver(logger, file_path, url, next_month):
     """
-    Downloads value of a given URL into a file
+    Downloads the search results for events in Berlin into a file using the shared browser session
     :param logger:
     :param file_path:
     :param url:
     :param next_month:
     :return:
     """
+    archive = get_archive()
+    # The pages of both months are rendered from the same URL, so they are recorded apart
+    archive_url = f"{url}#next-month" if next_month else url
+
     try:
-        op = webdriver.ChromeOptions()
-        op.add_argument('headless')
-        driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=op)
-        #driver = webdriver.Chrome(options=op)
-        # driver = webdriver.Chrome()
-        driver.get(url)
+        if archive is not None and archive.mode == ARCHIVE_REPLAY:
+            header, content = archive.find(METHOD_BROWSER, archive_url)
+
+            if header is None:
+                raise ValueError(f"{archive_url} has not been recorded")
+
+            with open(file_path, 'wb') as file:
+                file.write(content)
+            return
+
+        # Selenium is only needed when falling back to the browser, so crawling over HTTP works without it
+        from selenium.webdriver.common.by import By
+        from browser_session import get_browser, click, type_text, wait_for_replacement
+
+        start = time.perf_counter()
+        browser = get_browser()
+        browser.get(url)
         if next_month:
-            driver.find_element(By.CSS_SELECTOR, ".calendar__change-month-icon--next > use").click()
-        driver.find_element(By.ID, "elasticsearch-dynamic-id-1").click()
-        driver.find_element(By.ID, "control-tab-2").click()
-        driver.find_element(By.CSS_SELECTOR, "#tab-2 .checkbox:nth-child(2) > .checkbox__label").click()
-        driver.find_element(By.ID, "control-tab-1").click()
-        driver.find_element(By.ID, "elastic-search-place").click()
-        driver.find_element(By.ID, "elastic-search-place").send_keys("Berlin")
-        driver.find_element(By.CSS_SELECTOR, ".elasticsearch__form-submit").click()
-        data = driver.page_source
+            click(browser, (By.CSS_SELECTOR, ".calendar__change-month-icon--next > use"))
+        click(browser, (By.ID, "elasticsearch-dynamic-id-1"))
+        click(browser, (By.ID, "control-tab-2"))
+        click(browser, (By.CSS_SELECTOR, "#tab-2 .checkbox:nth-child(2) > .checkbox__label"))
+        click(browser, (By.ID, "control-tab-1"))
+        type_text(browser, (By.ID, "elastic-search-place"), "Berlin")
+
+        # Wait for the results of the search to replace the current ones
+        results = browser.find_elements(By.CSS_SELECTOR, ".elasticsearch__list")
+        click(browser, (By.CSS_SELECTOR, ".elasticsearch__form-submit"))
+        wait_for_replacement(browser, results[0] if results else None, (By.CSS_SELECTOR, ".elasticsearch__list"))
+
+        data = browser.page_source
         with open(file_path, 'w') as file:
             file.write(data)
-        driver.quit()
+
+        if archive is not None:
+            archive.record(METHOD_BROWSER, archive_url, 200, "OK", {"Content-Type": "text/html; charset=utf-8"},
+                           data.encode(), time.perf_counter() - start)
     except Exception as e:
         logger.log_line(f"✗️ Exception: {str(e)}")
         return None
 
 
-def download_site_with_webdriver(logger, results_path, url, file_name, clean, quiet, next_month):
+def download_site_with_webdriver(logger, results_path, url, file_name, clean, quiet, next_month,
+                                 ttl=CACHE_TTL_LISTING):
     file_path = os.path.join(results_path, file_name)
 
-    # Check if result needs to be generated
-    if clean or not os.path.exists(file_path):
+    # Check if result needs to be generated, always when recording or replaying
+    if clean or get_archive() is not None or not is_cache_fresh(file_path, None, ttl):
 
         download_file_with_webdriver(
             logger=logger,
@@ -248,53 +266,164 @@ def download_site_with_webdriver(logger, results_path, url, file_name, clean, qu
         logger.log_line(f"✓ Already exists {file_path}")
 
 
+def build_search_url(url, next_month):
+    """
+    Builds the URL the search form of a page submits when searching for events in Berlin
+    :param url: URL of the page with the search form
+    :param next_month: whether to search in the next month
+    :return: URL and the events the page lists before searching, or None and None if the form cannot be replayed as a
+    GET request
+    """
+    response = http_get(url)
+    response.raise_for_status()
+    tree = lxml.html.fromstring(response.content)
+
+    if next_month:
+        # Follow the link of the calendar to the next month
+        links = tree.xpath('//a[@href][descendant-or-self::*[contains(@class, "calendar__change-month-icon--next")]]')
+        return build_search_url(urljoin(url, links[0].get("href")), False) if links else (None, None)
+
+    places = tree.xpath('//input[@id="elastic-search-place"]')
+    forms = places[0].xpath("ancestor::form") if places else []
+
+    if not forms or (forms[0].method or "GET").upper() != "GET":
+        return None, None
+
+    place = places[0]
+    fields = [(name, value) for name, value in forms[0].form_values() if name != place.name]
+    fields.append((place.name, SEARCH_PLACE))
+
+    # Check the same event type as the browser does
+    for checkbox in tree.xpath('//*[@id="tab-2"]//*[contains(concat(" ", normalize-space(@class), " "), " checkbox ")]'
+                               '[count(preceding-sibling::*) = 1]//input[@type="checkbox"][@name]'):
+        if (checkbox.name, checkbox.get("value", "on")) not in fields:
+            fields.append((checkbox.name, checkbox.get("value", "on")))
+
+    action = urljoin(url, forms[0].get("action") or url)
+    return action + ("&" if "?" in action else "?") + urlencode(fields), get_search_results(tree)
+
+
+def get_search_results(tree):
+    """
+    Returns the links of the events listed on a page with search results
+    :param tree: root element of the page
+    :return: links, or None if the page has no list of search results
+    """
+    lists = tree.xpath('//*[contains(concat(" ", normalize-space(@class), " "), " elasticsearch__list ")]')
+    return [link.get("href") for link in lists[0].iter("a") if link.get("href")] if lists else None
+
+
+def has_search_results(file_path, unfiltered_results=None):
+    """
+    Checks if a downloaded site contains the results of the search for events in Berlin
+    :param file_path:
+    :param unfiltered_results: links of the events listed before searching, which a site ignoring the search lists
+    :return:
+    """
+    if not os.path.exists(file_path):
+        return False
+
+    with open(file_path, "rb") as file:
+        content = file.read()
+
+    if not content.strip():
+        return False
+
+    tree = lxml.html.fromstring(content)
+    results = get_search_results(tree)
+
+    if results is None:
+        return False
+
+    # Sites with search results show the place searched for in the form
+    places = tree.xpath('//input[@id="elastic-search-place"]/@value')
+    if places and places[0].strip() == SEARCH_PLACE:
+        return True
+
+    return results != unfiltered_results
+
+
+def download_site_with_http(logger, results_path, url, file_name, clean, quiet, next_month, ttl=CACHE_TTL_LISTING):
+    """
+    Downloads the search results for events in Berlin by replaying the search form as a plain HTTP request
+    :param logger:
+    :param results_path:
+    :param url:
+    :param file_name:
+    :param clean:
+    :param quiet:
+    :param next_month:
+    :param ttl: time in seconds after which an existing file is revalidated
+    :return: whether the downloaded site contains search results
+    """
+    try:
+        search_url, unfiltered_results = build_search_url(url, next_month)
+    except Exception as e:
+        logger.log_line(f"✗️ Exception: {str(e)}")
+        return False
+
+    if search_url is None:
+        return False
+
+    download_site(logger, results_path, search_url, file_name, clean, quiet, ttl)
+    return has_search_results(os.path.join(results_path, file_name), unfiltered_results)
+
+
 class RosaluxCrawler(AbstractCrawler):
     """
     Crawls events posted on https://www.rosalux.de/veranstaltungen
     """
+    name = "rosalux"
 
     url = "https://www.rosalux.de/veranstaltungen"
 
-    def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
+    # How search results are fetched, plain HTTP falls back to the browser if it does not give results
+    fetch_mode = FETCH_HTTP
+
+    @property
+    def uses_browser(self):
+        return self.fetch_mode == FETCH_BROWSER
+
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
         """
-        Runs crawler
+        Downloads and parses the sites of the crawler
         :param logger:
         :param workspace_path:
-        :param content_path:
-        :param uploads_path:
         :param clean:
         :param quiet:
-        :return:
+        :return: events
         """
 
-        super().run(logger, workspace_path, content_path, uploads_path, clean, quiet)
-
         # Download overview site for this month
-        download_site_with_webdriver(logger, workspace_path, self.url, "rosalux.html", clean, quiet, False)
+        self.download_search_results(logger, workspace_path, "rosalux.html", clean, quiet, False)
 
-        # Parse overview site and iterate over events
-        for event in parse_html(logger, workspace_path, "rosalux.html", clean, quiet):
-            # Generate image for event
-            generate_image(logger, workspace_path, uploads_path, event)
+        # Parse overview site
+        yield from parse_html(logger, workspace_path, "rosalux.html", clean, quiet, self.parser, self.state)
 
-            # Add image bucket URL
-            if event.image != "":
-                event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
+        # Download overview site for next month
+        self.download_search_results(logger, workspace_path, "rosalux-2.html", clean, quiet, True)
 
-            # Generate content for event
-            generate_content(logger, content_path, event)
+        # Parse overview site
+        yield from parse_html(logger, workspace_path, "rosalux-2.html", clean, quiet, self.parser, self.state)
 
-        # Download overview site for next month
-        download_site_with_webdriver(logger, workspace_path, self.url, "rosalux-2.html", clean, quiet, True)
+    def download_search_results(self, logger, workspace_path, file_name, clean, quiet, next_month):
+        """
+        Downloads the search results for events in Berlin using the fetch mode of the crawler
+        :param logger:
+        :param workspace_path:
+        :param file_name:
+        :param clean:
+        :param quiet:
+        :param next_month:
+        :return:
+        """
+        if self.fetch_mode == FETCH_HTTP:
+            if download_site_with_http(logger, workspace_path, self.url, file_name, clean, quiet, next_month):
+                return
 
-        # Parse overview site and iterate over events
-        for event in parse_html(logger, workspace_path, "rosalux-2.html", clean, quiet):
-            # Generate image for event
-            generate_image(logger, workspace_path, uploads_path, event)
+            logger.log_line(f"✗️ No search results via HTTP, falling back to browser for {file_name}")
 
-            # Add image bucket URL
-            if event.image != "":
-                event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
+            # The file written by the HTTP request must not count as fresh
+            clean = True
 
-            # Generate content for event
-            generate_content(logger, content_path, event)
+        download_site_with_webdriver(logger, workspace_path, self.url, file_name, clean, quiet, next_month)
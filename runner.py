@@ -0,0 +1,237 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from abstract_crawler import configure_images, sync_uploads
+from crawl_archive import ARCHIVE_RECORD, ARCHIVE_REPLAY, configure_archive
+from crawl_metrics import write_metrics
+
+# Crawlers by name with the module and class implementing them
+CRAWLERS = {
+    "berlin-de": ("berlin_de_crawler", "BerlinDeCrawler"),
+    "boell": ("boell_crawler", "BoellCrawler"),
+    "ffbiz": ("ffbiz_crawler", "FfbizCrawler"),
+    "lfr": ("lfr_crawler", "LfrCrawler"),
+    "rosalux": ("rosalux_crawler", "RosaluxCrawler"),
+    "urania": ("urania_crawler", "UraniaCrawler"),
+}
+
+
+class ConsoleLogger:
+    """
+    Prints log lines to the console
+    """
+
+    def log_line(self, message):
+        print(message, flush=True)
+
+
+class QueueLogger:
+    """
+    Sends log lines of a crawler to a queue that is shared across processes
+    """
+
+    def __init__(self, queue, name):
+        self.queue = queue
+        self.name = name
+
+    def log_line(self, message):
+        self.queue.put(f"[{self.name}] {message}")
+
+
+def load_crawler(name):
+    """
+    Creates a crawler by its name
+    :param name:
+    :return:
+    """
+    module_name, class_name = CRAWLERS[name]
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def get_image_workers(crawlers):
+    """
+    Returns the number of processes generating images per crawler, so that crawlers running in parallel share the
+    processors rather than each of them starting one process per processor
+    :param crawlers: number of crawlers running at the same time
+    :return:
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, crawlers))
+
+
+def run_crawler(name, log_queue, workspace_path, content_path, uploads_path, clean=False, quiet=False,
+                archive_path=None, archive_mode=None, collect_garbage=False, image_workers=None):
+    """
+    Runs a single crawler, which is meant to be called in a worker process
+    :param name:
+    :param log_queue: queue to send log lines to
+    :param workspace_path:
+    :param content_path:
+    :param uploads_path:
+    :param clean:
+    :param quiet:
+    :param archive_path: directory of an archive to record responses into or replay them from
+    :param archive_mode: ARCHIVE_RECORD or ARCHIVE_REPLAY
+    :param collect_garbage: whether to drop downloads that no event of the run references afterwards
+    :param image_workers: number of processes generating images, one per processor if None
+    :return: summary of the run
+    """
+    logger = QueueLogger(log_queue, name)
+    start = time.perf_counter()
+
+    try:
+        configure_archive(archive_path, archive_mode)
+        configure_images(workers=image_workers)
+
+        # Each crawler gets a workspace of its own so that files of parallel crawlers do not collide
+        crawler = load_crawler(name)
+        crawler_workspace_path = os.path.join(workspace_path, name)
+        summary = crawler.run(logger, crawler_workspace_path, content_path, uploads_path, clean, quiet)
+
+        if collect_garbage:
+            crawler.collect_garbage(logger, crawler_workspace_path)
+
+        return summary
+    except Exception as e:
+        logger.log_line(f"✗️ Exception: {str(e)}")
+        return {"events": 0, "files": 0, "seconds": time.perf_counter() - start, "error": str(e)}
+
+
+def forward_log_lines(log_queue, logger):
+    """
+    Passes log lines from a queue to a logger until it receives None
+    :param log_queue:
+    :param logger:
+    :return:
+    """
+    for message in iter(log_queue.get, None):
+        logger.log_line(message)
+
+
+def run_crawlers(logger, names, workspace_path, content_path, uploads_path, jobs=None, clean=False, quiet=False,
+                 archive_path=None, archive_mode=None, collect_garbage=False):
+    """
+    Runs crawlers in parallel, each one in a process of its own
+    :param logger:
+    :param names: names of the crawlers to run
+    :param workspace_path:
+    :param content_path:
+    :param uploads_path:
+    :param jobs: maximum number of crawlers running at the same time, all of them if None
+    :param clean:
+    :param quiet:
+    :param archive_path: directory of an archive to record responses into or replay them from
+    :param archive_mode: ARCHIVE_RECORD or ARCHIVE_REPLAY
+    :param collect_garbage: whether to drop downloads that no event of a run references afterwards
+    :return: summaries by crawler name
+    """
+    with multiprocessing.Manager() as manager:
+        log_queue = manager.Queue()
+        forwarder = threading.Thread(target=forward_log_lines, args=(log_queue, logger), daemon=True)
+        forwarder.start()
+
+        try:
+            crawlers = min(jobs or len(names), len(names))
+            image_workers = get_image_workers(crawlers)
+
+            with ProcessPoolExecutor(max_workers=crawlers) as executor:
+                futures = {name: executor.submit(run_crawler, name, log_queue, workspace_path, content_path,
+                                                 uploads_path, clean, quiet, archive_path, archive_mode,
+                                                 collect_garbage, image_workers) for name in names}
+                summaries = {name: future.result() for name, future in futures.items()}
+        finally:
+            log_queue.put(None)
+            forwarder.join()
+
+    return summaries
+
+
+def format_summary(summaries, seconds):
+    """
+    Formats the summaries of crawlers as a table
+    :param summaries: summaries by crawler name
+    :param seconds: wall time of all crawlers
+    :return: lines
+    """
+    lines = [f"{'crawler':<12} {'events':>8} {'files':>8} {'seconds':>10}"]
+
+    for name, summary in summaries.items():
+        status = f"  ✗️ {summary['error']}" if "error" in summary else ""
+        lines.append(f"{name:<12} {summary['events']:>8} {summary['files']:>8} {summary['seconds']:>10.2f}{status}")
+
+    lines.append(f"{'total':<12} {sum(summary['events'] for summary in summaries.values()):>8} "
+                 f"{sum(summary['files'] for summary in summaries.values()):>8} {seconds:>10.2f}")
+    return lines
+
+
+def main(args=None):
+    """
+    Runs crawlers selected on the command line and prints a summary
+    :param args: command line arguments, those of the process if None
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(description="Runs crawlers in parallel")
+    parser.add_argument("crawlers", nargs="*", metavar="crawler",
+                        help=f"crawlers to run, all of them if none are given ({', '.join(CRAWLERS)})")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="maximum number of crawlers running at once")
+    parser.add_argument("--workspace", default="workspace", help="path for downloaded sites")
+    parser.add_argument("--content", default="content", help="path for generated content")
+    parser.add_argument("--uploads", default="uploads", help="path for generated images")
+    parser.add_argument("--clean", action="store_true", help="download sites even if they are cached")
+    parser.add_argument("--quiet", action="store_true", help="log less")
+    parser.add_argument("--gc", action="store_true",
+                        help="drop stored downloads that no event of the run references afterwards")
+    parser.add_argument("--bucket", help="bucket to sync generated images into after the run, nothing is uploaded if "
+                                         "not given")
+    parser.add_argument("--project", help="Google Cloud project of the bucket")
+    parser.add_argument("--gcp-token", help="Google Cloud service account file relative to the crawlers")
+    parser.add_argument("--storage-endpoint", help="URL of a storage endpoint like a local emulator instead of the "
+                                                   "Google Cloud")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", metavar="ARCHIVE", help="record all responses into an archive directory")
+    archive_group.add_argument("--replay", metavar="ARCHIVE",
+                               help="serve all responses from an archive directory without network access")
+    arguments = parser.parse_args(args)
+
+    for name in arguments.crawlers:
+        if name not in CRAWLERS:
+            parser.error(f"unknown crawler {name}")
+
+    if arguments.bucket is not None and arguments.gcp_token is None and arguments.storage_endpoint is None:
+        parser.error("--bucket requires --gcp-token or --storage-endpoint")
+
+    logger = ConsoleLogger()
+    names = list(dict.fromkeys(arguments.crawlers)) or list(CRAWLERS)
+
+    archive_path = arguments.record or arguments.replay
+    archive_mode = ARCHIVE_RECORD if arguments.record else ARCHIVE_REPLAY if arguments.replay else None
+
+    start = time.perf_counter()
+    summaries = run_crawlers(logger, names, arguments.workspace, arguments.content, arguments.uploads,
+                             arguments.jobs, arguments.clean, arguments.quiet, archive_path, archive_mode, arguments.gc)
+
+    for line in format_summary(summaries, time.perf_counter() - start):
+        logger.log_line(line)
+
+    # Combine the metrics of all crawlers that finished their run, labelled by crawler
+    runs = [({"crawler": name}, summary["metrics"]) for name, summary in summaries.items() if "metrics" in summary]
+
+    if runs:
+        json_file_path, prometheus_file_path = write_metrics(arguments.workspace, runs)
+        logger.log_line(f"✓ Metrics {json_file_path} {prometheus_file_path}")
+
+    # Upload the images of all crawlers at once, skipping those the bucket already holds
+    upload_summary = {"failed": 0}
+    if arguments.bucket is not None:
+        upload_summary = sync_uploads(logger, arguments.gcp_token, arguments.uploads, arguments.project,
+                                      arguments.bucket, arguments.quiet, api_endpoint=arguments.storage_endpoint)
+
+    return 1 if any("error" in summary for summary in summaries.values()) or upload_summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
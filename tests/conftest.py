@@ -0,0 +1,98 @@
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+# The modules of the crawlers live in the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from abstract_crawler import BufferedLogger, configure_http, get_session
+from benchmark import FIXTURES_PATH, FixtureAdapter
+from runner import load_crawler
+
+
+class QueuedHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers requests with responses queued per path, repeating the last one, optionally after a delay per path
+    """
+
+    def do_GET(self):
+        time.sleep(self.server.delays.get(self.path, 0))
+        responses = self.server.responses.get(self.path, [(404, {}, b"not found")])
+        status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        self.server.requests.append((self.path, dict(self.headers)))
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """
+    Local HTTP server whose responses are set per path in its responses dictionary, and delays in seconds in its delays
+    dictionary
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), QueuedHandler)
+    server.responses = {}
+    server.delays = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fixture_adapter():
+    """
+    Adapter answering all requests of the shared session with fixtures, which is dropped afterwards
+    """
+    adapter = FixtureAdapter()
+    session = get_session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    yield adapter
+
+    # Build a new session with the default adapters for the next test
+    configure_http()
+
+
+@pytest.fixture
+def crawl_fixtures(tmp_path):
+    """
+    Function crawling the fixtures of a crawler offline into a new workspace, optionally with another parsing backend
+    or an adapter of its own answering the requests, which returns the events the crawler yields
+    """
+
+    def crawl(name, parser=None, adapter=None, fixtures_path=FIXTURES_PATH):
+        adapter = adapter if adapter is not None else FixtureAdapter()
+        adapter.add_routes(os.path.join(fixtures_path, name))
+        session = get_session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        crawler = load_crawler(name)
+        if parser is not None:
+            crawler.parser = parser
+
+        try:
+            return list(crawler.crawl(BufferedLogger(), tempfile.mkdtemp(dir=tmp_path), clean=True, quiet=True))
+        finally:
+            configure_http()
+
+    return crawl
@@ -0,0 +1,73 @@
+import os
+import re
+
+import pytest
+
+import benchmark
+from abstract_crawler import BufferedLogger, configure_http
+from benchmark import FixtureAdapter, get_url_pattern, record_fixtures, run_benchmarks
+from crawl_archive import ARCHIVE_RECORD, CrawlArchive
+from rosalux_crawler import FETCH_BROWSER, RosaluxCrawler
+
+
+class ArchivingFixtureAdapter(FixtureAdapter):
+    """
+    Answers requests with fixtures and records the responses into an archive, like the runner does with real responses
+    """
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.archive.record(request.method, request.url, response.status_code, response.reason, response.headers,
+                            response.content, 0.0)
+        return response
+
+
+def test_url_pattern_matches_other_dates():
+    pattern = get_url_pattern("https://example.org/search?q=a+b&date=2024-05-03T00%3A00")
+
+    assert re.fullmatch(pattern, "https://example.org/search?q=a+b&date=2026-10-18T00%3A00")
+    assert not re.fullmatch(pattern, "https://example.org/search?q=a+c&date=2026-10-18T00%3A00")
+
+
+@pytest.mark.parametrize("name", ["berlin-de", "rosalux"])
+def test_fixtures_are_recorded_from_archive(crawl_fixtures, tmp_path, name):
+    # Record a crawl of the current fixtures into an archive
+    archive_path = str(tmp_path / "archive")
+    archive = CrawlArchive(archive_path, ARCHIVE_RECORD)
+
+    try:
+        expected_events = crawl_fixtures(name, adapter=ArchivingFixtureAdapter(archive))
+    finally:
+        archive.close()
+
+    fixtures_path = str(tmp_path / "fixtures")
+    assert record_fixtures(BufferedLogger(), archive_path, name, fixtures_path) > len(expected_events)
+
+    # Crawl the fixtures recorded from the archive
+    adapter = FixtureAdapter()
+    events = crawl_fixtures(name, adapter=adapter, fixtures_path=fixtures_path)
+
+    assert events == expected_events
+    assert adapter.misses == []
+    assert os.path.exists(os.path.join(fixtures_path, name, "detail-0.html"))
+    assert os.path.exists(os.path.join(fixtures_path, name, "listing-0.html"))
+
+
+def test_crawlers_needing_browser_are_skipped(monkeypatch):
+    monkeypatch.setattr(benchmark, "browser_available", lambda: False)
+    monkeypatch.setattr(benchmark, "benchmark_images", lambda adapter, temporary_path, rounds: {})
+    monkeypatch.setattr(RosaluxCrawler, "fetch_mode", FETCH_BROWSER)
+
+    try:
+        results = run_benchmarks(BufferedLogger(), ["rosalux", "ffbiz"], rounds=1)
+    finally:
+        configure_http()
+
+    assert results["skipped"] == {"rosalux": "selenium is not installed"}
+    assert results["errors"] == {}
+    assert "ffbiz.parse_html" in results["stages"]
+    assert results["stages"]["ffbiz.transform_detail_html"]["items"] == 10
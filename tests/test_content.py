@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from abstract_crawler import BufferedLogger, ContentIndex, generate_content
+from abstract_event import AbstractEvent
+
+
+class SampleEvent(AbstractEvent):
+    defaults = {"source": "Sample", "organizer": "Sample"}
+
+
+def create_events():
+    return [
+        SampleEvent("sample-1", url="https://example.org/1", title="Kunst & Politik", start_date="2024-03-12",
+                    end_date="2024-03-12", languages=["de", "en"], fees=["5 EUR"]),
+        SampleEvent("sample-2", url="https://example.org/2", title='Say "hello" \\ goodbye',
+                    description="First line\nSecond line: a = b, [c]", start_date="2024-03-12T19:00:00.000",
+                    end_date="2024-03-12T21:00:00.000", contact_mail="mail@example.org",
+                    location_street="Straße 1", location_city="10115 Berlin"),
+    ]
+
+
+def get_modification_times(path):
+    return {file_name: os.stat(os.path.join(path, file_name)).st_mtime_ns for file_name in sorted(os.listdir(path))}
+
+
+def generate(content_path, index_file_path, events):
+    """
+    Generates the content files of events like a run does, with an index loaded from and saved into a file
+    :return: whether each file has been written and the number of files the index read
+    """
+    content_index = ContentIndex(str(content_path), str(index_file_path))
+    files = content_index.load()
+    written = [generate_content(BufferedLogger(), str(content_path), event, content_index) for event in events]
+    content_index.save()
+    return written, files
+
+
+def test_generating_again_leaves_files_and_index_untouched(crawl_fixtures, tmp_path):
+    content_path = tmp_path / "content"
+    content_path.mkdir()
+    index_file_path = tmp_path / "content-index.json"
+    events = crawl_fixtures("boell") + create_events()
+
+    assert generate(content_path, index_file_path, events) == ([True] * len(events), 0)
+    modification_times = get_modification_times(content_path)
+    index_modification_time = os.stat(index_file_path).st_mtime_ns
+
+    # Events crawled again only differ in the time they have been updated
+    for event in events:
+        event.updated = "2030-01-01T00:00:00.000"
+
+    assert generate(content_path, index_file_path, events) == ([False] * len(events), 0)
+    assert get_modification_times(content_path) == modification_times
+    assert os.stat(index_file_path).st_mtime_ns == index_modification_time
+
+    # The stored index matches the front matter read from the files again
+    stored_index = ContentIndex(str(content_path), str(index_file_path))
+    assert stored_index.load() == 0
+    scanned_index = ContentIndex(str(content_path))
+    assert scanned_index.load() == len(events)
+    assert stored_index.entries == scanned_index.entries
+
+    for event in events:
+        entry = stored_index.get(event.identifier)
+        assert entry["values"]["title"] == event.title
+        assert entry["values"].get("description", "") == event.description
+        assert entry["languages"] == event.languages
+        assert entry["location"].get("location_city", "") == event.location_city
+
+
+@pytest.mark.parametrize("indexed", [False, True], ids=["files", "index"])
+def test_only_changed_events_rewrite_their_files(tmp_path, indexed):
+    content_path = tmp_path / "content"
+    content_path.mkdir()
+    content_index = ContentIndex(str(content_path)) if indexed else None
+    unchanged_event, changed_event = create_events()
+    unchanged_event.updated = changed_event.updated = "2024-01-01T00:00:00.000"
+
+    for event in (unchanged_event, changed_event):
+        assert generate_content(BufferedLogger(), str(content_path), event, content_index)
+
+    unchanged_file_path = content_path / "sample-1.md"
+    changed_file_path = content_path / "sample-2.md"
+    unchanged_content = unchanged_file_path.read_bytes()
+    unchanged_modification_time = os.stat(unchanged_file_path).st_mtime_ns
+
+    # Both events are crawled again later, one of them with a new title
+    unchanged_event, changed_event = create_events()
+    unchanged_event.updated = changed_event.updated = "2024-02-01T00:00:00.000"
+    changed_event.title = "New title"
+
+    assert not generate_content(BufferedLogger(), str(content_path), unchanged_event, content_index)
+    assert generate_content(BufferedLogger(), str(content_path), changed_event, content_index)
+
+    assert unchanged_file_path.read_bytes() == unchanged_content
+    assert os.stat(unchanged_file_path).st_mtime_ns == unchanged_modification_time
+    assert 'title = "New title"' in changed_file_path.read_text()
+    assert 'updated = "2024-02-01T00:00:00.000"' in changed_file_path.read_text()
+    assert 'updated = "2024-01-01T00:00:00.000"' in unchanged_file_path.read_text()
+    assert sorted(os.listdir(content_path)) == ["sample-1.md", "sample-2.md"]
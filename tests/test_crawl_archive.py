@@ -0,0 +1,36 @@
+import datetime
+
+from abstract_crawler import configure_http, get_session
+from berlin_de_crawler import get_search_query
+from crawl_archive import ARCHIVE_RECORD, ARCHIVE_REPLAY, configure_archive, get_url_key
+
+
+def test_url_key_ignores_dates_in_query_only():
+    assert get_url_key("https://example.org/2024-03-12/?date=2024-03-12%2C2024-04-11&offset=0") == \
+        get_url_key("https://example.org/2024-03-12/?date=2026-10-18%2C2026-11-17&offset=0")
+    assert get_url_key("https://example.org/2024-03-12/") != get_url_key("https://example.org/2026-10-18/")
+    assert get_url_key("https://example.org/?date=2024-03-12&offset=0") != \
+        get_url_key("https://example.org/?date=2024-03-12&offset=20")
+
+
+def test_search_recorded_on_one_day_is_replayed_on_another(tmp_path, http_server):
+    recorded_time = datetime.datetime(2024, 3, 12, 9, 30)
+    replayed_time = recorded_time + datetime.timedelta(days=3)
+    recorded_path = "/tickets/suche/" + get_search_query(recorded_time)
+    http_server.responses[recorded_path] = [(200, {"Content-Type": "text/html"}, b"<html>results</html>")]
+
+    try:
+        configure_archive(str(tmp_path), ARCHIVE_RECORD)
+        configure_http()
+        assert get_session().get(http_server.url + recorded_path).content == b"<html>results</html>"
+
+        configure_archive(str(tmp_path), ARCHIVE_REPLAY)
+        configure_http()
+        response = get_session().get(http_server.url + "/tickets/suche/" + get_search_query(replayed_time))
+    finally:
+        configure_archive()
+        configure_http()
+
+    assert response.status_code == 200
+    assert response.content == b"<html>results</html>"
+    assert len(http_server.requests) == 1
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+
+from abstract_crawler import BufferedLogger
+from benchmark import FIXTURES_PATH
+from crawl_metrics import write_metrics
+from runner import load_crawler
+
+# Host the lfr crawler downloads its listing page from
+HOST = "www.landesfrauenrat-berlin.de"
+
+# Sample of the Prometheus text format with its name, labels and value
+PROMETHEUS_SAMPLE = re.compile(r'(\w+)\{(.*)\} (\S+)')
+
+
+def parse_prometheus(text):
+    """
+    Parses counters in the Prometheus text format
+    :param text:
+    :return: values by name and labels, and the names declared by TYPE lines with their types
+    """
+    values = {}
+    types = {}
+
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            name, metric_type = line[len("# TYPE "):].split(" ")
+            types[name] = metric_type
+        elif not line.startswith("#"):
+            name, label_text, value = PROMETHEUS_SAMPLE.fullmatch(line).groups()
+            labels = tuple(sorted(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', label_text)))
+            values[(name, labels)] = float(value)
+
+    return values, types
+
+
+def get_counter(values, name, **labels):
+    return values["counters"][[(counter["name"], counter["labels"]) for counter in values["counters"]]
+                              .index((name, labels))]["value"]
+
+
+def test_metrics_of_fixture_runs_are_written(fixture_adapter, tmp_path):
+    fixture_adapter.add_routes(os.path.join(FIXTURES_PATH, "lfr"))
+    workspace_path, content_path, uploads_path = (str(tmp_path / path) for path in ("workspace", "content", "uploads"))
+
+    # The second run finds the listing page fresh in its cache and all events unchanged
+    runs = []
+    for run in ("first", "second"):
+        summary = load_crawler("lfr").run(BufferedLogger(), workspace_path, content_path, uploads_path, quiet=True)
+        runs.append(({"crawler": "lfr", "run": run}, summary["metrics"]))
+
+    json_file_path, prometheus_file_path = write_metrics(str(tmp_path), runs)
+
+    with open(json_file_path, "r") as file:
+        first_run, second_run = json.load(file)["runs"]
+
+    with open(prometheus_file_path, "r") as file:
+        prometheus_values, prometheus_types = parse_prometheus(file.read())
+
+    events = summary["events"]
+    page_bytes = os.path.getsize(os.path.join(FIXTURES_PATH, "lfr", "listing.html"))
+
+    assert first_run["labels"] == {"crawler": "lfr", "run": "first"}
+    assert get_counter(first_run, "cache_results", host=HOST, result="miss") == 1
+    assert get_counter(first_run, "downloaded_bytes", host=HOST) == page_bytes
+    assert get_counter(first_run, "files", stage="content", result="written") == events
+    assert get_counter(second_run, "cache_results", host=HOST, result="hit") == 1
+    assert get_counter(second_run, "files", stage="content", result="skipped") == events
+    assert not any(counter["name"] == "downloaded_bytes" for counter in second_run["counters"])
+
+    assert prometheus_types["crawler_cache_results_total"] == "counter"
+    assert prometheus_values[("crawler_cache_results_total",
+                              (("crawler", "lfr"), ("host", HOST), ("result", "miss"), ("run", "first")))] == 1
+    assert prometheus_values[("crawler_cache_results_total",
+                              (("crawler", "lfr"), ("host", HOST), ("result", "hit"), ("run", "second")))] == 1
+    assert prometheus_values[("crawler_downloaded_bytes_total",
+                              (("crawler", "lfr"), ("host", HOST), ("run", "first")))] == page_bytes
+
+    # Both outputs hold the same counters
+    assert len(prometheus_values) == len(first_run["counters"]) + len(second_run["counters"])
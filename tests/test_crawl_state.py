@@ -0,0 +1,70 @@
+import sqlite3
+import time
+
+from abstract_event import AbstractEvent
+from crawl_state import CrawlState
+
+
+class SampleEvent(AbstractEvent):
+    defaults = {"source": "Sample", "organizer": "Sample"}
+
+
+def create_event():
+    return SampleEvent("sample-1", url="https://example.org/1", title="Title", start_date="2024-03-12",
+                       end_date="2024-03-12", languages=["de"])
+
+
+def test_event_round_trip_refreshes_updated(tmp_path):
+    event = create_event()
+    event.updated = "2000-01-01T00:00:00.000"
+
+    with CrawlState(str(tmp_path / "state.sqlite")) as state:
+        state.put_event(event.identifier, event.url, "hash", event)
+        cached_event = state.get_event(event.identifier, "hash", SampleEvent)
+
+        assert type(cached_event) is SampleEvent
+        assert cached_event == event
+        assert cached_event.languages == ["de"]
+        assert cached_event.updated != event.updated
+        assert state.get_event(event.identifier, "other hash", SampleEvent) is None
+
+
+def test_expired_event_is_parsed_again(tmp_path):
+    event = create_event()
+
+    with CrawlState(str(tmp_path / "state.sqlite")) as state:
+        state.put_event(event.identifier, event.url, "hash", event, expires_at=time.time() - 1)
+        assert state.get_event(event.identifier, "hash", SampleEvent) is None
+
+        state.put_event(event.identifier, event.url, "hash", event, expires_at=time.time() + 60)
+        assert state.get_event(event.identifier, "hash", SampleEvent) == event
+
+
+def test_database_of_an_older_version_is_started_afresh(tmp_path):
+    file_path = str(tmp_path / "state.sqlite")
+
+    with sqlite3.connect(file_path) as connection:
+        connection.execute("CREATE TABLE events (identifier TEXT PRIMARY KEY, html_hash TEXT, event BLOB)")
+        connection.execute("INSERT INTO events VALUES ('sample-1', 'hash', x'80')")
+
+    with CrawlState(file_path) as state:
+        assert state.get_event("sample-1", "hash", SampleEvent) is None
+
+
+def test_events_with_list_fields_are_hashable():
+    event = SampleEvent("sample-1", title="Title", languages=["de", "en"], fees=["5 EUR"])
+    same_event = SampleEvent("sample-1", title="Title", languages=("de", "en"), fees=["5 EUR"])
+    other_event = SampleEvent("sample-1", title="Title", languages=["de", "en"], fees=["7 EUR"])
+
+    assert event == same_event
+    assert hash(event) == hash(same_event)
+    assert event != other_event
+    assert event.key() == SampleEvent.from_json(event.to_json()).key()
+
+
+def test_events_are_deduplicated_in_sets_and_dicts():
+    events = [SampleEvent("sample-1", fees=["5 EUR"]), SampleEvent("sample-1", fees=["5 EUR"]),
+              SampleEvent("sample-1", fees=["7 EUR"]), SampleEvent("sample-2", fees="")]
+
+    assert len(set(events)) == 3
+    assert list({event: event.identifier for event in events}) == [events[0], events[2], events[3]]
@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+from date_parser import DATE_SAMPLES, DateRange, format_date_range, parse_date_range, parse_date_range_cached
+from runner import CRAWLERS
+
+# Values as they are read from the fixture pages by the crawlers with their ranges, which are synthetic but follow the
+# formats of the sites
+FIXTURE_VALUES = [
+    ("Mo, 3. Mai 2024, 19:30 Uhr",
+     DateRange(datetime.datetime(2024, 5, 3, 19, 30), datetime.datetime(2024, 5, 3, 19, 30))),
+    ("Laufzeit: seit März 2024", DateRange(datetime.date(2024, 3, 1), None)),
+    ("Mo, 08.05.2024 bis So, 08.08.2024", DateRange(datetime.date(2024, 5, 8), datetime.date(2024, 8, 8))),
+    ("Mo. 3. März 2024 19:00 - 21:00 Uhr",
+     DateRange(datetime.datetime(2024, 3, 3, 19), datetime.datetime(2024, 3, 3, 21))),
+    ("Di. 4. März 2024, 10.00 Uhr -  Mi. 5. März 2024, 16.00 Uhr",
+     DateRange(datetime.datetime(2024, 3, 4, 10), datetime.datetime(2024, 3, 5, 16))),
+    ("Mi. 5. März 2024 - Fr. 7. März 2024", DateRange(datetime.date(2024, 3, 5), datetime.date(2024, 3, 7))),
+    ("4. April 2024 um 17:00 Uhr", DateRange(datetime.datetime(2024, 4, 4, 17), datetime.datetime(2024, 4, 4, 17))),
+    ("7. April 2024", DateRange(datetime.date(2024, 4, 7), datetime.date(2024, 4, 7))),
+    ("3. Jun 2024, 17:00 - 19:00 Uhr", DateRange(datetime.datetime(2024, 6, 3, 17), datetime.datetime(2024, 6, 3, 19))),
+    ("03.06.2024, 18:00 - 04.06.2024, 14:00",
+     DateRange(datetime.datetime(2024, 6, 3, 18), datetime.datetime(2024, 6, 4, 14))),
+    ("04.06.2024, 19:00 - 21:00", DateRange(datetime.datetime(2024, 6, 4, 19), datetime.datetime(2024, 6, 4, 21))),
+]
+
+# Values with notes following the dates
+ANNOTATED_VALUES = [
+    ("Sa. 12.03.2022, 18 Uhr (Einlass 17:30)",
+     DateRange(datetime.datetime(2022, 3, 12, 18), datetime.datetime(2022, 3, 12, 18))),
+    ("Mo, 3. Mai 2024, 19:30 Uhr (ausverkauft)",
+     DateRange(datetime.datetime(2024, 5, 3, 19, 30), datetime.datetime(2024, 5, 3, 19, 30))),
+    ("4. April 2024 um 17:00 Uhr, Eintritt frei",
+     DateRange(datetime.datetime(2024, 4, 4, 17), datetime.datetime(2024, 4, 4, 17))),
+    ("04.06.2024, 19:00 - 21:00 (Einlass 18:30)",
+     DateRange(datetime.datetime(2024, 6, 4, 19), datetime.datetime(2024, 6, 4, 21))),
+    ("Mi. 5. März 2024 - Fr. 7. März 2024 jeweils ganztägig",
+     DateRange(datetime.date(2024, 3, 5), datetime.date(2024, 3, 7))),
+]
+
+
+@pytest.mark.parametrize("value, date_range", FIXTURE_VALUES + ANNOTATED_VALUES)
+def test_values_are_parsed(value, date_range):
+    assert parse_date_range(value) == date_range
+
+
+@pytest.mark.parametrize("value", ["", "nach Vereinbarung", "12.03.20245", "31.02.2024"])
+def test_values_without_dates_are_not_parsed(value):
+    assert parse_date_range(value) is None
+
+
+def test_samples_are_parsed_by_their_patterns():
+    for name, values in DATE_SAMPLES.items():
+        for value in values:
+            assert parse_date_range_cached(value)[0] == name, value
+
+
+@pytest.mark.parametrize("name", CRAWLERS)
+def test_fixture_events_have_dates(crawl_fixtures, name):
+    events = crawl_fixtures(name)
+
+    assert events
+    assert all(event.start_date and event.end_date for event in events)
+
+
+@pytest.mark.parametrize("date_range, midnight, values", [
+    (DateRange(datetime.date(2024, 5, 8), datetime.date(2024, 8, 8)), False, ("2024-05-08", "2024-08-08")),
+    (DateRange(datetime.date(2024, 5, 8), datetime.date(2024, 8, 8)), True,
+     ("2024-05-08T00:00:00.000", "2024-08-08T00:00:00.000")),
+    (DateRange(datetime.datetime(2024, 6, 3, 18), datetime.datetime(2024, 6, 4, 14)), False,
+     ("2024-06-03T18:00:00.000", "2024-06-04T14:00:00.000")),
+    (DateRange(datetime.datetime(2024, 6, 3, 18), datetime.datetime(2024, 6, 4, 14)), True,
+     ("2024-06-03T18:00:00.000", "2024-06-04T14:00:00.000")),
+    (None, True, ("", "")),
+])
+def test_ranges_are_formatted_like_stored_events(date_range, midnight, values):
+    assert format_date_range(date_range, midnight) == values
+
+
+@pytest.mark.parametrize("name, identifier, values", [
+    ("berlin-de", "frauen-in-der-wissenschaft", ("2024-05-08T00:00:00.000", "2024-08-08T00:00:00.000")),
+    ("boell", "gender-data-gap", ("2024-03-05", "2024-03-07")),
+    ("ffbiz", "intersektionaler-feminismus", ("2024-04-07", "2024-04-07")),
+])
+def test_dates_without_time_keep_the_format_of_their_crawler(crawl_fixtures, name, identifier, values):
+    event = next(event for event in crawl_fixtures(name) if event.identifier == identifier)
+
+    assert (event.start_date, event.end_date) == values
@@ -0,0 +1,148 @@
+import os
+import re
+
+import abstract_crawler
+from abstract_crawler import AbstractCrawler, CACHE_HIT, CACHE_MISS, CACHE_REVALIDATED, configure_http, \
+    download_cached, get_session, http_get
+
+
+class ListLogger:
+    def __init__(self):
+        self.lines = []
+
+    def log_line(self, message):
+        self.lines.append(message)
+
+
+def read_file(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+
+def test_download_is_revalidated_after_its_ttl(tmp_path, http_server):
+    http_server.responses["/page"] = [(200, {"ETag": '"1"'}, b"page"), (304, {"ETag": '"1"'}, b"")]
+    file_path = str(tmp_path / "page.html")
+    url = http_server.url + "/page"
+
+    assert download_cached(ListLogger(), file_path, url, 60) == CACHE_MISS
+    assert download_cached(ListLogger(), file_path, url, 60) == CACHE_HIT
+    assert download_cached(ListLogger(), file_path, url, 0) == CACHE_REVALIDATED
+    assert http_server.requests[-1][1]["If-None-Match"] == '"1"'
+    assert read_file(file_path) == b"page"
+
+
+def test_error_page_keeps_the_downloaded_page(tmp_path, http_server):
+    http_server.responses["/page"] = [(200, {}, b"page"), (404, {}, b"not found")]
+    file_path = str(tmp_path / "page.html")
+    url = http_server.url + "/page"
+    logger = ListLogger()
+
+    download_cached(logger, file_path, url, 60)
+    assert download_cached(logger, file_path, url, 0) == CACHE_MISS
+
+    assert read_file(file_path) == b"page"
+    assert any(line.startswith("✗️ HTTP 404") for line in logger.lines)
+
+
+def test_error_page_without_downloaded_page_is_not_cached(tmp_path, http_server):
+    http_server.responses["/page"] = [(404, {}, b"not found"), (200, {}, b"page")]
+    file_path = str(tmp_path / "page.html")
+    url = http_server.url + "/page"
+
+    download_cached(ListLogger(), file_path, url, 60)
+    assert os.path.exists(file_path)
+    assert download_cached(ListLogger(), file_path, url, 60) == CACHE_MISS
+    assert read_file(file_path) == b"page"
+
+
+def test_server_errors_are_retried(http_server, monkeypatch):
+    http_server.responses["/page"] = [(503, {}, b"busy"), (503, {}, b"busy"), (200, {}, b"page")]
+    monkeypatch.setattr(abstract_crawler, "RETRY_BACKOFF_FACTOR", 0)
+    configure_http()
+
+    try:
+        response = http_get(http_server.url + "/page")
+    finally:
+        monkeypatch.undo()
+        configure_http()
+
+    assert response.status_code == 200
+    assert response.content == b"page"
+    assert len(http_server.requests) == 3
+
+
+def test_session_is_shared_until_reconfigured():
+    session = get_session()
+
+    assert get_session() is session
+
+    configure_http()
+
+    assert get_session() is not session
+
+
+class ListingCrawler(AbstractCrawler):
+    """
+    Crawler yielding the items of a paginated listing, whose first page tells the number of pages
+    """
+    name = "listing"
+
+    def __init__(self, url):
+        self.url = url
+
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
+        for file_name in self.paginate(logger, workspace_path, self.url + "/page/0", "listing-{}.html", clean, quiet,
+                                       lambda file_path: get_page_urls(file_path, self.url)):
+            with open(os.path.join(workspace_path, file_name), "r") as file:
+                yield from re.findall(r'<li>(.*?)</li>', file.read())
+
+
+def get_page_urls(file_path, url):
+    with open(file_path, "r") as file:
+        pages = int(re.search(r'data-pages="(\d+)"', file.read()).group(1))
+
+    return [f"{url}/page/{page}" for page in range(1, pages)]
+
+
+def serve_listing(http_server, pages):
+    for page in range(pages):
+        items = "".join(f"<li>{page}-{item}</li>" for item in range(3))
+        http_server.responses[f"/page/{page}"] = [(200, {}, f'<ul data-pages="{pages}">{items}</ul>'.encode())]
+
+
+def test_pages_are_discovered_from_the_first_page(tmp_path, http_server):
+    serve_listing(http_server, 4)
+    logger = ListLogger()
+
+    file_names = list(ListingCrawler(http_server.url).paginate(
+        logger, str(tmp_path), http_server.url + "/page/0", "listing-{}.html", quiet=True,
+        page_urls=lambda file_path: get_page_urls(file_path, http_server.url), max_pages=3))
+
+    assert file_names == ["listing-0.html", "listing-1.html", "listing-2.html"]
+    assert sorted(path for path, _ in http_server.requests) == ["/page/0", "/page/1", "/page/2"]
+
+
+def test_events_are_yielded_in_page_order(tmp_path, http_server):
+    serve_listing(http_server, 4)
+    # The second page arrives last
+    http_server.delays["/page/1"] = 0.3
+
+    items = list(ListingCrawler(http_server.url).crawl(ListLogger(), str(tmp_path), quiet=True))
+
+    assert items == [f"{page}-{item}" for page in range(4) for item in range(3)]
+
+
+def test_page_failing_mid_pagination_is_skipped(tmp_path, http_server, monkeypatch):
+    serve_listing(http_server, 4)
+    http_server.responses["/page/2"] = [(503, {}, b"busy")]
+    monkeypatch.setattr(abstract_crawler, "RETRIES", 0)
+    configure_http()
+    logger = ListLogger()
+
+    try:
+        items = list(ListingCrawler(http_server.url).crawl(logger, str(tmp_path), quiet=True))
+    finally:
+        configure_http()
+
+    assert items == [f"{page}-{item}" for page in (0, 1, 3) for item in range(3)]
+    assert any(line.startswith("✗️ Exception") for line in logger.lines)
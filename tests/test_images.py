@@ -0,0 +1,94 @@
+import os
+import struct
+
+import cv2
+import numpy
+import pytest
+
+from abstract_crawler import BufferedLogger, IMAGE_ENCODED_DIRECTORY, decode_image, generate_image, \
+    get_image_source_path
+from abstract_event import AbstractEvent
+
+
+class SampleEvent(AbstractEvent):
+    defaults = {"source": "Sample", "organizer": "Sample"}
+
+
+def create_jpeg(width, height, orientation):
+    """
+    Creates a JPEG image whose left half is white and whose right half is black, with an EXIF orientation
+    :param width:
+    :param height:
+    :param orientation:
+    :return:
+    """
+    image = numpy.zeros((height, width, 3), numpy.uint8)
+    image[:, :width // 2] = 255
+    value = cv2.imencode(".jpg", image)[1].tobytes()
+
+    # Big endian TIFF header with a single IFD entry holding the orientation
+    tiff = b"MM\x00*" + struct.pack(">I", 8) + struct.pack(">H", 1) + \
+        struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack(">I", 0)
+    exif = b"Exif\x00\x00" + tiff
+    return value[:2] + b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif + value[2:]
+
+
+@pytest.mark.parametrize("width", [2000, 600], ids=["reduced", "full"])
+def test_decode_image_ignores_orientation(tmp_path, width):
+    file_path = tmp_path / "image.jpg"
+    file_path.write_bytes(create_jpeg(width, width // 2, 6))
+
+    image = decode_image(str(file_path), 480)
+
+    assert image.shape[:2] == (240, 480)
+    assert image[:, :10].mean() > 250
+    assert image[:, -10:].mean() < 5
+
+
+def create_plain_jpeg(value):
+    """
+    Creates a JPEG image of a single gray value
+    :param value:
+    :return:
+    """
+    return cv2.imencode(".jpg", numpy.full((300, 600, 3), value, numpy.uint8))[1].tobytes()
+
+
+def test_images_with_the_same_file_name_do_not_collide(tmp_path, http_server):
+    http_server.responses["/a/image.jpg"] = [(200, {"Content-Type": "image/jpeg"}, create_plain_jpeg(255))]
+    http_server.responses["/b/image.jpg"] = [(200, {"Content-Type": "image/jpeg"}, create_plain_jpeg(0))]
+    workspace_path, upload_path = str(tmp_path / "workspace"), str(tmp_path / "uploads")
+    os.makedirs(upload_path)
+
+    first_event = SampleEvent("first", image=http_server.url + "/a/image.jpg")
+    second_event = SampleEvent("second", image=http_server.url + "/b/image.jpg")
+
+    assert generate_image(BufferedLogger(), workspace_path, upload_path, first_event)
+    assert generate_image(BufferedLogger(), workspace_path, upload_path, second_event)
+
+    assert get_image_source_path(workspace_path, first_event.image) != \
+           get_image_source_path(workspace_path, second_event.image)
+    assert len(os.listdir(os.path.join(workspace_path, IMAGE_ENCODED_DIRECTORY))) == 2
+    assert cv2.imread(os.path.join(upload_path, "first.webp")).mean() > 250
+    assert cv2.imread(os.path.join(upload_path, "second.webp")).mean() < 5
+
+
+def test_cached_image_is_reused(tmp_path, http_server):
+    http_server.responses["/image.jpg"] = [(200, {"Content-Type": "image/jpeg"}, create_plain_jpeg(128))]
+    workspace_path, upload_path = str(tmp_path / "workspace"), str(tmp_path / "uploads")
+    os.makedirs(upload_path)
+
+    assert generate_image(BufferedLogger(), workspace_path, upload_path,
+                          SampleEvent("first", image=http_server.url + "/image.jpg"))
+    encoded_path = os.path.join(workspace_path, IMAGE_ENCODED_DIRECTORY)
+    encoded_file_names = os.listdir(encoded_path)
+    modification_time = os.stat(os.path.join(encoded_path, encoded_file_names[0])).st_mtime_ns
+
+    # Another event with the same image neither downloads nor encodes it again
+    assert generate_image(BufferedLogger(), workspace_path, upload_path,
+                          SampleEvent("second", image=http_server.url + "/image.jpg"))
+
+    assert len(http_server.requests) == 1
+    assert os.listdir(encoded_path) == encoded_file_names
+    assert os.stat(os.path.join(encoded_path, encoded_file_names[0])).st_mtime_ns == modification_time
+    assert os.path.samefile(os.path.join(upload_path, "first.webp"), os.path.join(upload_path, "second.webp"))
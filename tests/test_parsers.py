@@ -0,0 +1,41 @@
+import pytest
+
+from abstract_crawler import PARSER_ETREE, PARSER_LXML
+from runner import load_crawler
+
+# Crawlers with fixtures
+CRAWLERS = ["berlin-de", "boell", "ffbiz", "lfr", "rosalux", "urania"]
+
+# Crawlers whose pages hold entities or line breaks within texts, which the html parser of lxml decodes and splits
+# differently than the rules making pages well-formed do
+DIFFERING_CRAWLERS = ["berlin-de"]
+
+
+def get_values(events):
+    """
+    Returns the fields of events without the time they have been updated
+    :param events:
+    :return:
+    """
+    return [{key: value for key, value in event.to_dict().items() if key != "updated"} for event in events]
+
+
+@pytest.mark.parametrize("name", [name if name not in DIFFERING_CRAWLERS else
+                                  pytest.param(name, marks=pytest.mark.xfail(strict=True))
+                                  for name in CRAWLERS])
+def test_parsers_yield_same_events(crawl_fixtures, name):
+    etree_events = get_values(crawl_fixtures(name, PARSER_ETREE))
+    lxml_events = get_values(crawl_fixtures(name, PARSER_LXML))
+
+    assert etree_events
+    assert lxml_events == etree_events
+
+
+def test_berlin_de_keeps_texts_with_entities_and_line_breaks(crawl_fixtures):
+    event = next(event for event in crawl_fixtures("berlin-de") if event.identifier == "kunst-und-politik")
+
+    # Texts as berlin.de events have been published so far, which the lxml backend would change
+    assert load_crawler("berlin-de").parser == PARSER_ETREE
+    assert event.title == "Kunst & Politikndash; Teil 2"
+    assert event.subtitle == "Gespräch über"
+    assert event.description == "Erster Teil: Kunst & Öffentlichkeit.Zweiter Teil:"
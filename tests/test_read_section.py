@@ -0,0 +1,73 @@
+import glob
+import os
+import re
+
+import pytest
+
+from abstract_crawler import read_section
+from benchmark import FIXTURES_PATH
+
+# Fixture pages of the crawlers with the markers they cut sections of them with, and whether the end marker is part of
+# the section
+SECTIONS = [
+    ("berlin-de/listing-*.html", '<div class="ticketing-events"', '<div class="ticketing-pager"', False),
+    ("berlin-de/detail-*.html", '<div id="ems-main"', "<hr", False),
+    ("boell/*.html", "<main", "main>", True),
+    ("ffbiz/listing*.html", "<main", "main>", True),
+    ("ffbiz/detail-*.html", "<article>", "/article>", True),
+    ("lfr/*.html", "<body", "body>", True),
+    ("rosalux/*.html", "<main", "main>", True),
+    ("urania/*.html", "<main", "main>", True),
+]
+
+
+def read_section_with_regex(file_path, start_marker, end_marker, keep_end):
+    """
+    Cuts a section like the crawlers did before read_section, by joining all lines and removing everything before the
+    last start marker and from the first end marker on
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = " ".join(file.read().splitlines())
+
+    content = re.sub(".*" + re.escape(start_marker), start_marker.replace("\\", "\\\\"), content)
+    return re.sub(re.escape(end_marker) + ".*", end_marker.replace("\\", "\\\\") if keep_end else "", content)
+
+
+@pytest.mark.parametrize("pages, start_marker, end_marker, keep_end", SECTIONS)
+def test_sections_of_fixture_pages_match_regex(pages, start_marker, end_marker, keep_end):
+    file_paths = sorted(glob.glob(os.path.join(FIXTURES_PATH, pages)))
+    assert file_paths
+
+    for file_path in file_paths:
+        assert read_section(file_path, start_marker, end_marker, keep_end) == \
+               read_section_with_regex(file_path, start_marker, end_marker, keep_end), file_path
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    "<html>\n<main>a\nb</main>\n</html>",
+    "<html>\n<main>a\nb</main>",
+    "<main>a</main><main>b</main>\nc",
+    "no markers\nat all",
+    "no start\nmarker</main> after",
+    "<p>no end\n<main>marker",
+    "start at the end <main",
+    "end at the end <main>a</main>",
+    "end right after start <mainmain>",
+    "line break\n<main>before the end\nmain> marker",
+    "windows\r\nline\r\n<main>breaks\r\n</main>\r\n",
+    "old mac\rline\r<main>breaks\r</main>",
+    "Grüße <main>Straße – 😀\nÄrger</main> ü",
+    "ä<mainü\nö main>ß",
+    "<main> line separator\x0bvertical tab\x1cfile separator</main>",
+])
+@pytest.mark.parametrize("start_marker, end_marker, keep_end", [
+    ("<main", "main>", True),
+    ("<main", "main>", False),
+])
+def test_sections_match_regex(tmp_path, content, start_marker, end_marker, keep_end):
+    file_path = tmp_path / "page.html"
+    file_path.write_bytes(content.encode())
+
+    assert read_section(str(file_path), start_marker, end_marker, keep_end) == \
+           read_section_with_regex(str(file_path), start_marker, end_marker, keep_end)
@@ -0,0 +1,92 @@
+import glob
+import importlib
+import os
+import random
+
+import pytest
+
+from benchmark import FIXTURES_PATH
+from rewrite_engine import RewriteEngine, literal_rule, regex_rule
+
+# Engines of the crawlers by module and attribute
+ENGINES = [
+    ("abstract_crawler", "WELL_FORM_ENGINE"),
+    ("berlin_de_crawler", "TRANSFORM_ENGINE"),
+    ("berlin_de_crawler", "SUB_PAGE_TRANSFORM_ENGINE"),
+    ("boell_crawler", "TRANSFORM_ENGINE"),
+    ("rosalux_crawler", "TRANSFORM_ENGINE"),
+]
+
+PAGES = sorted(glob.glob(os.path.join(FIXTURES_PATH, "*", "*.html")))
+
+
+def load_engine(module_name, name):
+    return getattr(importlib.import_module(module_name), name)
+
+
+@pytest.mark.parametrize("module_name, name", ENGINES)
+def test_engine_matches_sequential_rules_on_fixture_pages(module_name, name):
+    engine = load_engine(module_name, name)
+
+    for file_path in PAGES:
+        with open(file_path, "r") as file:
+            content = " ".join(file.read().splitlines())
+
+        assert engine.rewrite(content) == engine.rewrite_sequential(content), file_path
+
+
+def test_combined_literal_rules_see_replacements_of_earlier_rules():
+    engine = RewriteEngine([literal_rule("<br>", "<br/>"), literal_rule("<br/>", "<br />"),
+                            literal_rule("<hr>", "<hr/>"), regex_rule(r"<hr/>", "<hr />")])
+
+    assert engine.verify("a<br>b<br/>c<hr>d")
+    assert engine.rewrite("a<br>b<br/>c<hr>d") == "a<br />b<br />c<hr />d"
+
+
+@pytest.mark.parametrize("module_name, name", ENGINES)
+def test_engine_combines_literal_rules(module_name, name):
+    engine = load_engine(module_name, name)
+
+    rules = sum(len(stage) for stage in engine.stages)
+    passes = sum(len(stage_passes) for stage_passes in engine.passes)
+
+    assert passes < rules
+    assert max(len(rewrite_pass.rules) for stage_passes in engine.passes for rewrite_pass in stage_passes) >= 3
+
+
+def test_combined_scan_sees_text_joined_by_removals():
+    engine = RewriteEngine([literal_rule("<x>", ""), literal_rule("a", "1"), literal_rule("bc", "2"),
+                            literal_rule("d", "3")])
+
+    assert len(engine.passes[0]) == 1
+    assert engine.rewrite("b<x>c a d") == engine.rewrite_sequential("b<x>c a d") == "2 1 3"
+    assert engine.rewrite("bc <x>a d") == "2 1 3"
+
+
+def test_combined_scan_matches_sequential_rules_on_random_rules():
+    generator = random.Random(0)
+
+    def text(length):
+        return "".join(generator.choice("ab<>") for _ in range(length))
+
+    for _ in range(500):
+        engine = RewriteEngine([literal_rule(text(generator.randint(1, 3)), text(generator.randint(0, 2)))
+                                for _ in range(generator.randint(2, 6))])
+
+        for _ in range(20):
+            value = text(generator.randint(0, 30))
+            assert engine.verify(value), (engine.stages, value)
+
+
+def test_profiling_counts_hits_per_rule():
+    rules = [literal_rule("<b>", ""), literal_rule("</b>", ""), literal_rule("<i>", ""), regex_rule(r"\s+", " ")]
+    engine = RewriteEngine(rules)
+
+    profile = engine.start_profiling()
+    assert engine.rewrite("<b>a</b>  <i>b</i> <b>c</b>") == "a b</i> c"
+    assert engine.stop_profiling() is profile
+
+    assert profile.documents == 1
+    assert [profile.rule_hits[rule] for rule in rules] == [2, 2, 1, 2]
+    assert len(profile.report()) == len(rules) + 1
+    assert engine.profile is None
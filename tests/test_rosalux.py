@@ -0,0 +1,106 @@
+import os
+import shutil
+
+import pytest
+
+import rosalux_crawler
+from abstract_crawler import BufferedLogger, get_session
+from benchmark import FIXTURES_PATH
+from rosalux_crawler import RosaluxCrawler
+
+ROSALUX_FIXTURES_PATH = os.path.join(FIXTURES_PATH, "rosalux")
+
+
+@pytest.fixture
+def browser_downloads(monkeypatch):
+    """
+    Replaces the browser with copying the listing fixtures, and records which listings have been requested from it
+    """
+    downloads = []
+
+    def download_site_with_webdriver(logger, results_path, url, file_name, clean, quiet, next_month):
+        downloads.append((file_name, next_month))
+        shutil.copy(os.path.join(ROSALUX_FIXTURES_PATH, f"listing-{2 if next_month else 1}.html"),
+                    os.path.join(results_path, file_name))
+
+    monkeypatch.setattr(rosalux_crawler, "download_site_with_webdriver", download_site_with_webdriver)
+    return downloads
+
+
+def crawl(tmp_path):
+    return list(RosaluxCrawler().crawl(BufferedLogger(), str(tmp_path), clean=True, quiet=True))
+
+
+def test_search_results_are_fetched_over_http(fixture_adapter, browser_downloads, tmp_path):
+    fixture_adapter.add_routes(ROSALUX_FIXTURES_PATH)
+
+    events = crawl(tmp_path)
+
+    assert len(events) == 12
+    assert browser_downloads == []
+    assert fixture_adapter.misses == []
+
+
+def test_search_url_replays_the_form_of_the_browser(fixture_adapter):
+    fixture_adapter.add_routes(ROSALUX_FIXTURES_PATH)
+
+    search_url, unfiltered_results = rosalux_crawler.build_search_url(RosaluxCrawler.url, False)
+    next_month_search_url, _ = rosalux_crawler.build_search_url(RosaluxCrawler.url, True)
+
+    assert search_url == \
+           "https://www.rosalux.de/veranstaltungen/suche?month=1&q=&place=Berlin&type%5B%5D=veranstaltung"
+    assert next_month_search_url.startswith("https://www.rosalux.de/veranstaltungen/suche?month=2&")
+    assert unfiltered_results == ["/veranstaltung/es_detail/2010/stadtteilgespraech-leipzig",
+                                  "/veranstaltung/es_detail/2011/seminar-hamburg",
+                                  "/veranstaltung/es_detail/2012/lesung-dresden"]
+
+
+def test_search_url_is_replayed_against_the_listing_pages(fixture_adapter):
+    # The listing fixtures are synthetic, modelled on the page the browser renders after searching
+    fixture_adapter.add_routes(ROSALUX_FIXTURES_PATH)
+
+    for next_month, listing in [(False, "listing-1.html"), (True, "listing-2.html")]:
+        search_url, _ = rosalux_crawler.build_search_url(RosaluxCrawler.url, next_month)
+
+        with open(os.path.join(ROSALUX_FIXTURES_PATH, listing), "rb") as file:
+            assert get_session().get(search_url).content == file.read()
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('<div class="elasticsearch__list"><a href="/a"></a></div>'
+     '<input id="elastic-search-place" value="Berlin">', True),
+    ('<div class="elasticsearch__list"><a href="/a"></a></div>', True),
+    ('<div class="elasticsearch__list"><a href="/b"></a></div>', False),
+    ('<div class="elasticsearch__list"><a href="/b"></a></div>'
+     '<input id="elastic-search-place" value="">', False),
+    ('<div class="teaser"><a href="/a"></a></div>', False),
+    ('', False),
+])
+def test_search_results_must_reflect_the_search(tmp_path, content, expected):
+    file_path = tmp_path / "rosalux.html"
+    file_path.write_text(f"<html><body>{content}</body></html>" if content else "")
+
+    assert rosalux_crawler.has_search_results(str(file_path), ["/b"]) == expected
+
+
+def test_browser_is_used_without_search_results(fixture_adapter, browser_downloads, tmp_path):
+    # The form pages are served, but the search answers with an error
+    fixture_adapter.add_routes(ROSALUX_FIXTURES_PATH)
+    fixture_adapter.routes = [route for route in fixture_adapter.routes if "suche" not in route[0].pattern]
+
+    events = crawl(tmp_path)
+
+    assert len(events) == 12
+    assert browser_downloads == [("rosalux.html", False), ("rosalux-2.html", True)]
+
+
+def test_browser_is_used_if_search_is_ignored(fixture_adapter, browser_downloads, tmp_path):
+    # The search answers with the unfiltered events of the page with the form
+    fixture_adapter.add_routes(ROSALUX_FIXTURES_PATH)
+    fixture_adapter.routes = [(pattern, file_path.replace("listing-", "form-")) for pattern, file_path in
+                              fixture_adapter.routes]
+
+    events = crawl(tmp_path)
+
+    assert len(events) == 12
+    assert browser_downloads == [("rosalux.html", False), ("rosalux-2.html", True)]
@@ -0,0 +1,47 @@
+import queue
+
+import pytest
+
+import abstract_crawler
+import runner
+from abstract_crawler import ImageProcessor, configure_images
+
+
+class RecordingCrawler:
+    """
+    Crawler that records the number of image processes it would start
+    """
+
+    def __init__(self):
+        self.image_workers = None
+
+    def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
+        with ImageProcessor(logger, workspace_path, uploads_path, quiet) as images:
+            self.image_workers = images.executor._max_workers
+
+        return {"events": 0, "files": 0, "seconds": 0.0}
+
+
+@pytest.fixture
+def image_workers():
+    workers = abstract_crawler.IMAGE_WORKERS
+    yield
+    configure_images(workers=workers)
+
+
+@pytest.mark.parametrize("cpus, crawlers, workers", [(8, 1, 8), (8, 3, 2), (8, 6, 1), (2, 6, 1), (None, 2, 1)])
+def test_crawlers_share_the_processors(monkeypatch, cpus, crawlers, workers):
+    monkeypatch.setattr(runner.os, "cpu_count", lambda: cpus)
+
+    assert runner.get_image_workers(crawlers) == workers
+
+
+def test_crawler_starts_the_image_workers_it_is_given(monkeypatch, tmp_path, image_workers):
+    crawler = RecordingCrawler()
+    monkeypatch.setattr(runner, "load_crawler", lambda name: crawler)
+
+    summary = runner.run_crawler("recording", queue.Queue(), str(tmp_path / "workspace"), str(tmp_path / "content"),
+                                 str(tmp_path / "uploads"), image_workers=3)
+
+    assert "error" not in summary
+    assert crawler.image_workers == 3
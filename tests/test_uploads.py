@@ -0,0 +1,235 @@
+import base64
+import email.parser
+import hashlib
+import http.server
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+import abstract_crawler
+import runner
+from abstract_crawler import BufferedLogger, get_md5_hash, sync_uploads
+
+
+class FakeBlob:
+    """
+    Blob of a fake bucket, which records its content when uploaded
+    """
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.md5_hash = None
+
+    def upload_from_filename(self, file_path, content_type=None):
+        with open(file_path, "rb") as file:
+            self.bucket.files[self.name] = file.read()
+
+        self.bucket.uploads.append(self.name)
+
+
+class FakeBucket:
+    """
+    Bucket keeping files in memory
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.uploads = []
+        self.storage_class = None
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeClient:
+    """
+    Storage client with a single bucket, which counts how often the bucket is listed
+    """
+
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+        self.listings = 0
+
+    def bucket(self, bucket_name):
+        return self.fake_bucket
+
+    def list_blobs(self, bucket):
+        self.listings += 1
+
+        blobs = []
+        for name, content in bucket.files.items():
+            blob = FakeBlob(bucket, name)
+            blob.md5_hash = base64.b64encode(hashlib.md5(content).digest()).decode()
+            blobs.append(blob)
+
+        return blobs
+
+
+class FakeStorageHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers the requests of the JSON API of Google Cloud Storage that listing a bucket and uploading files send, keeping
+    the files of all buckets in memory
+    """
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        self.server.requests.append(("GET", path))
+        bucket_name = path.split("/")[4]
+
+        # The client may fetch the metadata of the bucket before listing its files
+        if not path.endswith("/o"):
+            self.send_json(200, {"kind": "storage#bucket", "name": bucket_name})
+            return
+
+        items = [get_object(bucket_name, name, content)
+                 for name, content in sorted(self.server.buckets.get(bucket_name, {}).items())]
+        self.send_json(200, {"kind": "storage#objects", "items": items})
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        self.server.requests.append(("POST", path))
+        bucket_name = path.split("/")[5]
+
+        # Multipart uploads send the metadata and the content of a file as parts of one request
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        metadata_part, content_part = message.get_payload()
+        metadata = json.loads(metadata_part.get_payload(decode=True))
+        content = content_part.get_payload(decode=True)
+
+        if "md5Hash" in metadata and metadata["md5Hash"] != get_object(bucket_name, "", content)["md5Hash"]:
+            self.send_json(400, {"error": {"code": 400, "message": "Provided MD5 hash does not match"}})
+            return
+
+        self.server.buckets.setdefault(bucket_name, {})[metadata["name"]] = content
+        self.send_json(200, get_object(bucket_name, metadata["name"], content))
+
+    def send_json(self, status, value):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def get_object(bucket_name, name, content):
+    return {"kind": "storage#object", "bucket": bucket_name, "name": name, "size": str(len(content)),
+            "md5Hash": base64.b64encode(hashlib.md5(content).digest()).decode()}
+
+
+@pytest.fixture
+def storage_server():
+    """
+    Local HTTP server faking the storage endpoint, with the files of its buckets by bucket name and file name
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeStorageHandler)
+    server.buckets = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(abstract_crawler, "get_storage_client", lambda *args, **kwargs: client)
+    return client
+
+
+def write_uploads(uploads_path, files):
+    uploads_path.mkdir(exist_ok=True)
+
+    for file_name, content in files.items():
+        (uploads_path / file_name).write_bytes(content)
+
+
+def test_sync_uploads_only_changed_files(client, tmp_path):
+    uploads_path = tmp_path / "uploads"
+    write_uploads(uploads_path, {"a.webp": b"a", "b.webp": b"b", "c.webp.tmp": b"partial"})
+
+    summary = sync_uploads(BufferedLogger(), None, str(uploads_path), None, "bucket", quiet=True)
+
+    assert summary == {"uploaded": 2, "unchanged": 0, "failed": 0}
+    assert sorted(client.fake_bucket.uploads) == ["a.webp", "b.webp"]
+
+    # The manifest written by the first sync tells which files changed without listing the bucket again
+    client.fake_bucket.uploads.clear()
+    write_uploads(uploads_path, {"b.webp": b"changed", "d.webp": b"d"})
+
+    summary = sync_uploads(BufferedLogger(), None, str(uploads_path), None, "bucket", quiet=True)
+
+    assert summary == {"uploaded": 2, "unchanged": 1, "failed": 0}
+    assert sorted(client.fake_bucket.uploads) == ["b.webp", "d.webp"]
+    assert client.fake_bucket.files["b.webp"] == b"changed"
+    assert client.listings == 1
+
+    with open(str(uploads_path) + abstract_crawler.BUCKET_MANIFEST_SUFFIX, "r") as file:
+        manifest = json.load(file)
+
+    assert manifest["bucket"] == "bucket"
+    assert manifest["files"]["d.webp"] == get_md5_hash(str(uploads_path / "d.webp"))
+
+
+def test_sync_uploads_lists_bucket_without_manifest(client, tmp_path):
+    client.fake_bucket.files["a.webp"] = b"a"
+
+    uploads_path = tmp_path / "uploads"
+    write_uploads(uploads_path, {"a.webp": b"a", "b.webp": b"b"})
+
+    summary = sync_uploads(BufferedLogger(), None, str(uploads_path), None, "bucket", quiet=True)
+
+    assert summary == {"uploaded": 1, "unchanged": 1, "failed": 0}
+    assert client.fake_bucket.uploads == ["b.webp"]
+    assert client.listings == 1
+
+
+def test_runner_syncs_bucket(client, tmp_path, monkeypatch):
+    uploads_path = tmp_path / "uploads"
+    write_uploads(uploads_path, {"a.webp": b"a"})
+
+    monkeypatch.setattr(runner, "run_crawlers", lambda *args, **kwargs: {})
+
+    code = runner.main(["--workspace", str(tmp_path / "workspace"), "--uploads", str(uploads_path),
+                        "--bucket", "bucket", "--storage-endpoint", "http://localhost:4443"])
+
+    assert code == 0
+    assert client.fake_bucket.uploads == ["a.webp"]
+
+
+def test_sync_uploads_through_storage_endpoint(storage_server, tmp_path):
+    storage_server.buckets["images"] = {"a.webp": b"a"}
+    uploads_path = tmp_path / "uploads"
+    write_uploads(uploads_path, {"a.webp": b"a", "b.webp": b"b"})
+
+    summary = sync_uploads(BufferedLogger(), None, str(uploads_path), "project", "images", quiet=True,
+                           api_endpoint=storage_server.url)
+
+    assert summary == {"uploaded": 1, "unchanged": 1, "failed": 0}
+    assert storage_server.buckets["images"] == {"a.webp": b"a", "b.webp": b"b"}
+    assert storage_server.requests.count(("GET", "/storage/v1/b/images/o")) == 1
+    assert storage_server.requests.count(("POST", "/upload/storage/v1/b/images/o")) == 1
+
+    # Files changed after the manifest has been written are uploaded without listing the bucket again
+    storage_server.requests.clear()
+    write_uploads(uploads_path, {"a.webp": b"changed"})
+
+    summary = sync_uploads(BufferedLogger(), None, str(uploads_path), "project", "images", quiet=True,
+                           api_endpoint=storage_server.url)
+
+    assert summary == {"uploaded": 1, "unchanged": 1, "failed": 0}
+    assert storage_server.buckets["images"]["a.webp"] == b"changed"
+    assert ("GET", "/storage/v1/b/images/o") not in storage_server.requests
+    assert storage_server.requests.count(("POST", "/upload/storage/v1/b/images/o")) == 1
@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+from abstract_crawler import AbstractCrawler, CACHE_METADATA_SUFFIX, pack_workspace, restore_file
+from workspace_store import WorkspaceStore, configure_store, get_store
+
+
+def write_download(workspace_path, file_name, url, content):
+    """
+    Writes a file like it has been downloaded, together with its cache metadata
+    :param workspace_path:
+    :param file_name:
+    :param url:
+    :param content:
+    :return: file path
+    """
+    file_path = os.path.join(workspace_path, file_name)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, "wb") as file:
+        file.write(content)
+
+    with open(file_path + CACHE_METADATA_SUFFIX, "w") as file:
+        json.dump({"url": url, "fetched_at": 0}, file)
+
+    return file_path
+
+
+class FailingCrawler(AbstractCrawler):
+    name = "failing"
+
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
+        raise RuntimeError("site changed")
+
+
+class OtherCrawler(FailingCrawler):
+    name = "other"
+
+
+class ListLogger:
+    def __init__(self):
+        self.lines = []
+
+    def log_line(self, message):
+        self.lines.append(message)
+
+
+def test_pack_and_restore_round_trip(tmp_path):
+    workspace_path = str(tmp_path)
+    page_file_path = write_download(workspace_path, "page.html", "https://example.org/", b"<html>page</html>")
+    image_file_path = write_download(workspace_path, os.path.join("images", "a.jpg"), "https://example.org/a.jpg",
+                                     b"image")
+    debug_file_path = os.path.join(workspace_path, "page.xml")
+
+    with open(debug_file_path, "w") as file:
+        file.write("<xml/>")
+
+    with WorkspaceStore(workspace_path) as store:
+        assert pack_workspace(store, workspace_path, "failing") == (2, 22)
+
+    # Files without cache metadata are not downloads and stay where they are
+    assert not os.path.exists(page_file_path)
+    assert not os.path.exists(image_file_path)
+    assert os.path.exists(debug_file_path)
+
+    configure_store(workspace_path)
+
+    try:
+        assert restore_file(page_file_path)
+        assert restore_file(image_file_path)
+        assert not restore_file(os.path.join(workspace_path, "missing.html"))
+    finally:
+        configure_store(None)
+
+    with open(page_file_path, "rb") as file:
+        assert file.read() == b"<html>page</html>"
+
+
+def test_identical_files_share_a_blob_and_survive_collecting_garbage(tmp_path):
+    workspace_path = str(tmp_path)
+    write_download(workspace_path, "a.html", "https://example.org/a", b"same")
+    write_download(workspace_path, "b.html", "https://example.org/b", b"same")
+    write_download(workspace_path, "c.html", "https://example.org/c", b"other")
+
+    with WorkspaceStore(workspace_path) as store:
+        pack_workspace(store, workspace_path, "failing")
+        assert len(store.get_blob_hashes()) == 2
+
+        store.set_event_urls("failing", ["https://example.org/a"])
+
+    FailingCrawler().collect_garbage(ListLogger(), workspace_path)
+
+    with WorkspaceStore(workspace_path) as store:
+        assert len(store.get_blob_hashes()) == 1
+
+    assert os.path.exists(os.path.join(workspace_path, "a.html" + CACHE_METADATA_SUFFIX))
+    assert not os.path.exists(os.path.join(workspace_path, "b.html" + CACHE_METADATA_SUFFIX))
+    assert not os.path.exists(os.path.join(workspace_path, "c.html" + CACHE_METADATA_SUFFIX))
+
+
+def test_failed_run_leaves_no_store_configured(tmp_path):
+    with pytest.raises(RuntimeError):
+        FailingCrawler().run(ListLogger(), str(tmp_path / "workspace"), str(tmp_path / "content"),
+                             str(tmp_path / "uploads"))
+
+    assert get_store() is None
+
+
+def test_collecting_garbage_keeps_files_of_other_crawlers_in_the_same_workspace(tmp_path):
+    workspace_path = str(tmp_path)
+    write_download(workspace_path, "failing.html", "https://example.org/failing", b"failing")
+
+    with WorkspaceStore(workspace_path) as store:
+        pack_workspace(store, workspace_path, "failing")
+        store.set_event_urls("failing", ["https://example.org/failing"])
+
+    write_download(workspace_path, "other.html", "https://example.org/other", b"other")
+
+    with WorkspaceStore(workspace_path) as store:
+        pack_workspace(store, workspace_path, "other")
+        store.set_event_urls("other", ["https://example.org/other"])
+
+    OtherCrawler().collect_garbage(ListLogger(), workspace_path)
+    FailingCrawler().collect_garbage(ListLogger(), workspace_path)
+
+    with WorkspaceStore(workspace_path) as store:
+        assert len(store.get_blob_hashes()) == 2
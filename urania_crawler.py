@@ -1,13 +1,13 @@
 import os
 import re
-import xml.etree.ElementTree as element_tree
-from typing import List
+from typing import Iterator
 
 import urllib3
 
-from abstract_crawler import AbstractCrawler, download_site, well_form, format_identifier, format_title, \
-    generate_content, generate_image
+from abstract_crawler import AbstractCrawler, download_ahead, well_form, format_identifier, format_title, \
+    PARSER_ETREE, parse_content, read_section
 from abstract_event import AbstractEvent
+from crawl_state import get_source_hash
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -16,54 +16,45 @@ class UraniaEvent(AbstractEvent):
     """
     Represents an event posted on https://www.urania.de/
     """
+    __slots__ = ()
 
-    def __init__(self, identifier, url, title, subtitle, description, image, image_bucket, start_date, end_date,
-                 category, languages, fees, contact_person, contact_phone, contact_mail):
-        source = "Urania Berlin e.V."
-        organizer = "Urania Berlin e.V."
-        location_street = "An der Urania 17"
-        location_city = "10787 Berlin"
+    defaults = {
+        "source": "Urania Berlin e.V.",
+        "organizer": "Urania Berlin e.V.",
+        "location_street": "An der Urania 17",
+        "location_city": "10787 Berlin",
+    }
 
-        super().__init__(identifier, source, url, title, subtitle, description, image, image_bucket, start_date,
-                         end_date, category, languages, organizer, fees, contact_person, contact_phone,
-                         contact_mail, location_street, location_city)
 
-
-def transform_html(workspace_path, html_file_name, xml_file_name):
+def transform_html(workspace_path, html_file_name, xml_file_name, parser=PARSER_ETREE):
     """
-    Transforms an html file into a well-formed xml file by removing tags and attributes
+    Transforms an html file into a tree of elements
     :param workspace_path:
     :param html_file_name:
-    :param xml_file_name:
-    :return:
+    :param xml_file_name: name of the xml file written if persisting xml is enabled
+    :param parser: parsing backend
+    :return: root element
     """
-    with open(os.path.join(workspace_path, html_file_name), "r") as html_file:
-        content = " ".join(html_file.read().splitlines())
-        content = re.sub(r'.*<main', "<main", content)
-        content = re.sub(r'main>.*', "main>", content)
-
-        content = well_form(content)
+    content = read_section(os.path.join(workspace_path, html_file_name), "<main", "main>")
 
-    with open(os.path.join(workspace_path, xml_file_name), "w") as xml_file:
-        xml_file.write(content)
+    return parse_content(workspace_path, content, well_form, xml_file_name, parser)
 
 
-def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[UraniaEvent]:
+def parse_html(logger, workspace_path, html_file_name, clean, quiet, parser=PARSER_ETREE,
+               state=None) -> Iterator[UraniaEvent]:
     """
-    Parses html file into a list of events
+    Parses html file into events, which are yielded as soon as they are parsed
     :param logger:
     :param workspace_path:
     :param html_file_name:
     :param clean:
     :param quiet:
+    :param parser: parsing backend
+    :param state: state of previous runs, used to skip parsing pages that did not change
     :return:
     """
     xml_file_name = re.sub('.html$', ".xml", html_file_name)
-    transform_html(workspace_path, html_file_name, xml_file_name)
-
-    root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
-
-    events = []
+    root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
 
     feminist_teasers = []
 
@@ -77,15 +68,24 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Ura
                 if "feminist" in teaser_title or "feminist" in teaser_sub_title:
                     feminist_teasers.append(teaser)
     base_url = "https://www.urania.de"
-    for teaser in feminist_teasers:
-        link = teaser.find('.//a').attrib['href']
+    links = [teaser.find('.//a').attrib['href'] for teaser in feminist_teasers]
+
+    sites = {link: (f'{base_url}{link}', format_identifier(re.sub(r'.*/', "", link)) + ".html") for link in links}
+
+    # Parse page while detail pages are downloaded concurrently
+    for link in download_ahead(logger, workspace_path, links, sites.get, clean, quiet):
         identifier = format_identifier(re.sub(r'.*/', "", link))
         html_file_name = identifier + ".html"
         xml_file_name = identifier + ".xml"
-        download_site(logger, workspace_path, f'{base_url}{link}', html_file_name, clean, quiet)
-        transform_html(workspace_path, html_file_name, xml_file_name)
 
-        root = element_tree.parse(os.path.join(workspace_path, xml_file_name)).getroot()
+        # Reuse the event parsed in a previous run if neither the listing entry nor the detail page changed
+        html_hash = get_source_hash(os.path.join(workspace_path, html_file_name))
+        cached_event = state.get_event(identifier, html_hash, UraniaEvent) if state is not None and not clean else None
+        if cached_event is not None:
+            yield cached_event
+            continue
+
+        root = transform_html(workspace_path, html_file_name, xml_file_name, parser)
 
         field_image_url = root.find('.//div[@class="img"]').attrib['style']
         field_image_url = re.sub(r'.*url\(', "", field_image_url)
@@ -142,43 +142,31 @@ def parse_html(logger, workspace_path, html_file_name, clean, quiet) -> List[Ura
             contact_mail=contact_mail
         )
 
-        events.append(event)
+        if state is not None:
+            state.put_event(identifier, url, html_hash, event)
 
-    return events
+        yield event
 
 
 class UraniaCrawler(AbstractCrawler):
     """
     Crawls events posted on https://www.urania.de/
     """
+    name = "urania"
 
     url = f"https://www.urania.de/kalender"
 
-    def run(self, logger, workspace_path, content_path, uploads_path, clean=False, quiet=False):
+    def crawl(self, logger, workspace_path, clean=False, quiet=False):
         """
-        Runs crawler
+        Downloads and parses the sites of the crawler
         :param logger:
         :param workspace_path:
-        :param content_path:
-        :param uploads_path:
         :param clean:
         :param quiet:
-        :return:
+        :return: events
         """
 
-        super().run(logger, workspace_path, content_path, uploads_path, clean, quiet)
-
-        # Download overview site
-        download_site(logger, workspace_path, self.url, "urania.html", clean, quiet)
-
-        # Parse overview site and iterate over events
-        for event in parse_html(logger, workspace_path, "urania.html", clean, quiet):
-            # Generate image for event
-            generate_image(logger, workspace_path, uploads_path, event)
-
-            # Add image bucket URL
-            if event.image != "":
-                event.image_bucket = f"https://storage.googleapis.com/fem-readup.appspot.com/{event.identifier}.webp"
-
-            # Generate content for event
-            generate_content(logger, content_path, event)
+        # Download overview sites by following next links
+        for html_file_name in self.paginate(logger, workspace_path, self.url, "urania-{}.html", clean, quiet):
+            # Parse overview site
+            yield from parse_html(logger, workspace_path, html_file_name, clean, quiet, self.parser, self.state)
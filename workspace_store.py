@@ -0,0 +1,241 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Directory of the store within a workspace, which holds the index and the blobs
+STORE_DIRECTORY = "store"
+STORE_INDEX_FILE_NAME = "index.sqlite"
+STORE_BLOB_DIRECTORY = "blobs"
+
+# Level of the zlib compression of blobs, which trades a little size for much faster packing than the maximum
+STORE_COMPRESSION_LEVEL = 6
+
+# Workspace whose store downloads are restored from, or None if files are only kept loose
+STORE_WORKSPACE_PATH = None
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class WorkspaceStore:
+    """
+    Keeps downloaded files of a workspace compressed and addressed by their content
+
+    Every file is stored as a zlib compressed blob named after the SHA-256 hash of its content, so identical files are
+    stored only once. An index maps the names of files relative to the workspace and the URLs they have been downloaded
+    from to their blobs, along with the crawler that stored them. Files are restored into the workspace when a crawler
+    needs them again. Collecting garbage for a crawler drops the files it stored that no event of the latest run of any
+    crawler sharing the workspace references.
+    """
+
+    def __init__(self, workspace_path):
+        self.workspace_path = workspace_path
+        self.store_path = os.path.join(workspace_path, STORE_DIRECTORY)
+        self.blob_path = os.path.join(self.store_path, STORE_BLOB_DIRECTORY)
+        self.pid = os.getpid()
+
+        os.makedirs(self.blob_path, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(self.store_path, STORE_INDEX_FILE_NAME),
+                                          check_same_thread=False)
+        self.lock = threading.Lock()
+
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    file_name TEXT PRIMARY KEY,
+                    crawler TEXT,
+                    url TEXT,
+                    blob_hash TEXT,
+                    size INTEGER,
+                    stored_at REAL
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS event_urls (
+                    crawler TEXT,
+                    url TEXT,
+                    PRIMARY KEY (crawler, url)
+                )
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Stores all changes and closes the index
+        :return:
+        """
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def get_blob_file_path(self, blob_hash):
+        """
+        Returns the path of a blob, which is kept in a directory named after the first characters of its hash
+        :param blob_hash:
+        :return:
+        """
+        return os.path.join(self.blob_path, blob_hash[:2], blob_hash)
+
+    def put(self, file_name, crawler, url, content):
+        """
+        Stores the content of a file unless a file with the same content has been stored before
+        :param file_name: name of the file relative to the workspace
+        :param crawler: name of the crawler storing the file
+        :param url: URL the file has been downloaded from or None
+        :param content:
+        :return: hash of the blob
+        """
+        blob_hash = hashlib.sha256(content).hexdigest()
+        blob_file_path = self.get_blob_file_path(blob_hash)
+
+        if not os.path.exists(blob_file_path):
+            os.makedirs(os.path.dirname(blob_file_path), exist_ok=True)
+            temporary_file_path = f"{blob_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+            with open(temporary_file_path, 'wb') as file:
+                file.write(zlib.compress(content, STORE_COMPRESSION_LEVEL))
+
+            os.replace(temporary_file_path, blob_file_path)
+
+        with self.lock:
+            self.connection.execute("""
+                INSERT INTO entries (file_name, crawler, url, blob_hash, size, stored_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (file_name) DO UPDATE SET crawler = excluded.crawler, url = excluded.url,
+                    blob_hash = excluded.blob_hash, size = excluded.size, stored_at = excluded.stored_at
+            """, (file_name, crawler, url, blob_hash, len(content), time.time()))
+
+        return blob_hash
+
+    def restore(self, file_path):
+        """
+        Writes a stored file back into the workspace
+        :param file_path:
+        :return: whether the file has been stored
+        """
+        file_name = os.path.relpath(file_path, self.workspace_path)
+
+        with self.lock:
+            row = self.connection.execute("SELECT blob_hash FROM entries WHERE file_name = ?",
+                                          (file_name,)).fetchone()
+
+        if row is None:
+            return False
+
+        try:
+            with open(self.get_blob_file_path(row[0]), 'rb') as file:
+                content = zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            return False
+
+        temporary_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(temporary_file_path, 'wb') as file:
+            file.write(content)
+
+        os.replace(temporary_file_path, file_path)
+        return True
+
+    def set_event_urls(self, crawler, urls):
+        """
+        Replaces the URLs that events of the latest run of a crawler reference, whose files survive collecting garbage
+        :param crawler:
+        :param urls:
+        :return:
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM event_urls WHERE crawler = ?", (crawler,))
+            self.connection.executemany("INSERT OR IGNORE INTO event_urls (crawler, url) VALUES (?, ?)",
+                                        [(crawler, url) for url in urls if url])
+
+    def get_blob_hashes(self):
+        """
+        Returns the hashes of all blobs that stored files refer to
+        :return:
+        """
+        with self.lock:
+            return {row[0] for row in self.connection.execute("SELECT DISTINCT blob_hash FROM entries")}
+
+    def collect_garbage(self, crawler):
+        """
+        Drops files stored by a crawler that no current event references and the blobs no stored file refers to
+
+        Files of one crawler may be referenced by events of another one sharing the workspace, e.g. the same image, so
+        the events of all crawlers are taken into account.
+        :param crawler:
+        :return: names of the dropped files, number of deleted blobs and number of bytes freed
+        """
+        with self.lock, self.connection:
+            file_names = [row[0] for row in self.connection.execute("""
+                SELECT file_name FROM entries
+                WHERE crawler = ? AND (url IS NULL OR url NOT IN (SELECT url FROM event_urls))
+            """, (crawler,))]
+            self.connection.executemany("DELETE FROM entries WHERE file_name = ?",
+                                        [(file_name,) for file_name in file_names])
+
+        blob_hashes = self.get_blob_hashes()
+        blobs = 0
+        freed_bytes = 0
+
+        for directory in os.scandir(self.blob_path):
+            if not directory.is_dir():
+                continue
+
+            for entry in os.scandir(directory.path):
+                if entry.name not in blob_hashes:
+                    freed_bytes += entry.stat().st_size
+                    os.remove(entry.path)
+                    blobs += 1
+
+        return file_names, blobs, freed_bytes
+
+
+def configure_store(workspace_path=None):
+    """
+    Configures the workspace whose store downloads are restored from
+    :param workspace_path: workspace, or None to only use loose files
+    :return:
+    """
+    global STORE_WORKSPACE_PATH, _store
+
+    with _store_lock:
+        STORE_WORKSPACE_PATH = workspace_path
+
+        if _store is not None and _store.pid == os.getpid():
+            _store.close()
+
+        _store = None
+
+
+def get_store_settings():
+    """
+    Returns the settings of the store, e.g. to configure the same store in another process
+    :return: workspace path
+    """
+    return STORE_WORKSPACE_PATH,
+
+
+def get_store():
+    """
+    Returns the store of the configured workspace, which is shared by all threads of the current process
+    :return: store or None if no workspace is configured
+    """
+    global _store
+
+    with _store_lock:
+        if STORE_WORKSPACE_PATH is None:
+            return None
+
+        # Forked processes must not share the database connection of their parent
+        if _store is None or _store.pid != os.getpid():
+            _store = WorkspaceStore(STORE_WORKSPACE_PATH)
+
+        return _store